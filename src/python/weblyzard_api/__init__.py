@@ -1,17 +1,33 @@
 '''
 The webLyzard API package.
 
+JSON serialization (including objects providing a `__json__` method) is
+handled by :mod:`weblyzard_api.util.json_codec`.
+
+.. deprecated::
+   serializing objects providing a `__json__` method with :func:`json.dumps`
+   still works, but emits a :class:`DeprecationWarning` - use
+   :func:`weblyzard_api.util.json_codec.dumps` instead.
+
 .. codeauthor:: Albert Weichselbraun <weichselbraun@weblyzard.com>
 .. codeauthor:: Heinz-Peter Lang <lang@weblyzard.com>
 '''
 from __future__ import unicode_literals
 
+import warnings
+
 from json import JSONEncoder
 
 
 def _default(self, obj):
-    return getattr(obj.__class__, "__json__", _default.default)(obj)
+    to_json = getattr(obj.__class__, "__json__", None)
+    if to_json is None:
+        return _default.default(obj)
+    warnings.warn('Serializing %s objects with json.dumps is deprecated, use '
+                  'weblyzard_api.util.json_codec.dumps instead.'
+                  % obj.__class__.__name__, DeprecationWarning, stacklevel=2)
+    return to_json(obj)
 
 
 _default.default = JSONEncoder().default
-JSONEncoder.default = _default
\ No newline at end of file
+JSONEncoder.default = _default
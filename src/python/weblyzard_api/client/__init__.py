@@ -20,15 +20,22 @@ from builtins import object
 import traceback
 import logging
 import random
+import asyncio
 import json
 
 from urllib.parse import urlencode
+import urllib.error
 from six import string_types
-from json import dumps, loads
 from functools import partial
 from socket import setdefaulttimeout
+from concurrent.futures import ThreadPoolExecutor
 
-from weblyzard_api.util.http import Retrieve
+from weblyzard_api.util.http import Retrieve, HTTPPoolManager
+from weblyzard_api.util.async_http import AsyncRetrieve, AsyncHTTPPoolManager
+from weblyzard_api.client.server_selection import ServerSelector
+from weblyzard_api.util import json_codec
+from weblyzard_api.util.json_stream import iter_json_array, ObservedIterator
+from weblyzard_api.util.retry import RetryPolicy
 
 # set higher timeout values
 WS_DEFAULT_TIMEOUT = 900
@@ -50,7 +57,8 @@ class RESTClient(object):
     def __init__(self, service_url: str, user: str=None, password: str=None,
                  authentification_method: str='basic',
                  module_name: str='eWRT.REST',
-                 default_timeout: int=WS_DEFAULT_TIMEOUT):
+                 default_timeout: int=WS_DEFAULT_TIMEOUT,
+                 pool_manager: HTTPPoolManager=None):
         """ 
         :param service_url: the base url of the web service
         :param modul_name: the module name to add to the USER AGENT
@@ -60,6 +68,8 @@ class RESTClient(object):
         :param authentification_method: authentification method to use
                                         ('basic'*, 'digest').
         :param default_timeout: default request timeout
+        :param pool_manager: optional pool manager providing the keep-alive
+                             connections (default: shared module pool)
         """
         # remove superfluous slashes, if required
         self.service_url = service_url[:-1] if service_url.endswith("/") \
@@ -71,7 +81,8 @@ class RESTClient(object):
             default_timeout = WS_DEFAULT_TIMEOUT
 
         url_obj = Retrieve(module_name, sleep_time=0,
-                           default_timeout=default_timeout)
+                           default_timeout=default_timeout,
+                           pool_manager=pool_manager)
         self.retrieve = partial(url_obj.open,
                                 user=user,
                                 pwd=password,
@@ -81,7 +92,8 @@ class RESTClient(object):
     def _json_request(self, url: str, parameters: Dict=None,
                       parse_result: bool=True, return_plain: bool=False,
                       json_encode_arguments: bool=True,
-                      content_type: str='application/json'):
+                      content_type: str='application/json',
+                      stream: bool=False):
         """ Execute a given JSON request.
         :param url: the url to query
         :param parameters: optional parameters
@@ -91,19 +103,25 @@ class RESTClient(object):
         :param json_encode_arguments: whether to json encode the parameters
                                       (True*)
         :param content_type: one of 'application/json', 'application/xml'
+        :param stream: return an iterator which incrementally decodes the
+                       elements of the returned JSON array (False*)
         """
         if parameters:
             handle = self.retrieve(
                 url=url,
-                data=dumps(parameters) if json_encode_arguments else parameters,
+                data=(json_codec.dumps_bytes(parameters)
+                      if json_encode_arguments else parameters),
                 headers={'Content-Type': content_type})
         else:
             handle = self.retrieve(url)
 
+        if stream:
+            return iter_json_array(handle)
+
         if parse_result:
             response = handle.read()
             if response:
-                return response if return_plain else loads(response.decode('utf8'))
+                return response if return_plain else json_codec.loads(response)
             else:
                 # this will also return empty list, dicts ...
                 return response
@@ -136,7 +154,7 @@ class RESTClient(object):
     def execute(self, command: str, identifier: str=None, parameters: Dict=None,
                 parse_result: bool=True, return_plain: bool=False,
                 json_encode_arguments: bool=True, query_parameters: str=None,
-                content_type: str='application/json'):
+                content_type: str='application/json', stream: bool=False):
         """ Execute a given JSON command on the given web service
         :param command: the command to execute
         :param identifier: an optional identifier (e.g. batch_id, ...)
@@ -146,6 +164,7 @@ class RESTClient(object):
                              using json.load (False*)
         :param json_encode_arguments: whether to json encode the parameters
         :param query_parameters: optional query parameters
+        :param stream: incrementally decode the returned JSON array (False*)
         :rtype: the query result
         """
         url = self.get_request_url(self.service_url, command, identifier,
@@ -157,24 +176,136 @@ class RESTClient(object):
                                   parse_result=parse_result,
                                   return_plain=return_plain,
                                   json_encode_arguments=json_encode_arguments,
-                                  content_type=content_type)
+                                  content_type=content_type,
+                                  stream=stream)
+
+
+class AsyncRESTClient(RESTClient):
+    """
+    class:: AsyncRESTClient
+
+    asyncio variant of the :class:`RESTClient` - :meth:`execute` returns
+    an awaitable.
+    """
+
+    def __init__(self, service_url: str, user: str=None, password: str=None,
+                 authentification_method: str='basic',
+                 module_name: str='eWRT.REST',
+                 default_timeout: int=WS_DEFAULT_TIMEOUT,
+                 pool_manager: AsyncHTTPPoolManager=None):
+        """
+        :param service_url: the base url of the web service
+        :param modul_name: the module name to add to the USER AGENT
+                               description (optional)
+        :param user: username
+        :param password: password
+        :param authentification_method: authentification method to use
+                                        (only 'basic' is supported).
+        :param default_timeout: default request timeout
+        :param pool_manager: optional pool manager providing the keep-alive
+                             connections
+        """
+        self.service_url = service_url[:-1] if service_url.endswith("/") \
+            else service_url
+        self.user = user
+        self.password = password
+
+        if not default_timeout:
+            default_timeout = WS_DEFAULT_TIMEOUT
+
+        url_obj = AsyncRetrieve(module_name, default_timeout=default_timeout,
+                                pool_manager=pool_manager)
+        self.retrieve = partial(url_obj.open,
+                                user=user,
+                                pwd=password,
+                                authentification_method=authentification_method
+                                )
+
+    async def _json_request(self, url: str, parameters: Dict=None,
+                            parse_result: bool=True, return_plain: bool=False,
+                            json_encode_arguments: bool=True,
+                            content_type: str='application/json'):
+        """ Execute a given JSON request (see :meth:`RESTClient._json_request`)
+
+        .. remarks:
+           responses are always read completely, i.e. streaming is not
+           supported.
+        """
+        if parameters:
+            handle = await self.retrieve(
+                url=url,
+                data=(json_codec.dumps_bytes(parameters)
+                      if json_encode_arguments else parameters),
+                headers={'Content-Type': content_type})
+        else:
+            handle = await self.retrieve(url)
+
+        if parse_result:
+            response = handle.read()
+            if response:
+                return response if return_plain else json_codec.loads(response)
+            else:
+                # this will also return empty list, dicts ...
+                return response
+        return handle
+
+    async def execute(self, command: str, identifier: str=None,
+                      parameters: Dict=None, parse_result: bool=True,
+                      return_plain: bool=False,
+                      json_encode_arguments: bool=True,
+                      query_parameters: str=None,
+                      content_type: str='application/json'):
+        """ Execute a given JSON command (see :meth:`RESTClient.execute`) """
+        url = self.get_request_url(self.service_url, command, identifier,
+                                   query_parameters)
+
+        logger.debug(f'Requesting url {url}')
+
+        return await self._json_request(
+            url=url, parameters=parameters, parse_result=parse_result,
+            return_plain=return_plain,
+            json_encode_arguments=json_encode_arguments,
+            content_type=content_type)
 
 
 class MultiRESTClient(object):
     """ Allow multiple URLs for access REST services """
     MAX_BATCH_SIZE = 500
     URL_PATH: str = ''
+    REST_CLIENT_CLASS = RESTClient
+    POOL_MANAGER_CLASS = HTTPPoolManager
+    # retry policy used by service methods which retry failed requests
+    RETRY_POLICY = RetryPolicy()
 
     def __init__(self, service_urls, user=None, password=None,
-                 default_timeout=WS_DEFAULT_TIMEOUT, use_random_server=True):
-
+                 default_timeout=WS_DEFAULT_TIMEOUT, use_random_server=True,
+                 pool_size=None, use_server_selection=True):
+        """
+        :param service_urls: a service url or a list of service urls
+        :param user: optional username
+        :param password: optional password
+        :param default_timeout: default request timeout
+        :param use_random_server: shuffle the service urls
+        :param pool_size: number of keep-alive connections retained per
+                          host; if not set the clients use the shared
+                          default pool.
+        :param use_server_selection: send requests to the service with the
+                          best latency, error rate and load and skip failing
+                          services (see :mod:`server_selection`); otherwise
+                          the services are always tried in the same order.
+        """
         self._service_urls = self.fix_urls(service_urls, user, password)
 
         if use_random_server:
             random.shuffle(self._service_urls)
 
+        self.pool_manager = self.POOL_MANAGER_CLASS(pool_size) \
+            if pool_size else None
         self.clients = self._connect_clients(self._service_urls,
-                                             default_timeout=default_timeout)
+                                             default_timeout=default_timeout,
+                                             pool_manager=self.pool_manager)
+        self.selector = ServerSelector(self.clients) \
+            if use_server_selection else None
 
     def is_online(self):
         try:
@@ -219,7 +350,8 @@ class MultiRESTClient(object):
 
     @classmethod
     def _connect_clients(cls, service_urls, user=None, password=None,
-                         default_timeout=WS_DEFAULT_TIMEOUT):
+                         default_timeout=WS_DEFAULT_TIMEOUT,
+                         pool_manager=None):
 
         clients = {}
 
@@ -240,10 +372,12 @@ class MultiRESTClient(object):
                         if user is None and password is None:
                             url_i, user, password = Retrieve.get_user_password(url_i)
 
-                        clients[i] = RESTClient(service_url=url_i,
+                        clients[i] = cls.REST_CLIENT_CLASS(
+                                                service_url=url_i,
                                                 user=user,
                                                 password=password,
-                                                default_timeout=default_timeout)
+                                                default_timeout=default_timeout,
+                                                pool_manager=pool_manager)
                     return clients
             else:
 
@@ -251,17 +385,20 @@ class MultiRESTClient(object):
                     url, user, password = Retrieve.get_user_password(url)
 
                 # append to end
-                clients[len(clients)] = RESTClient(service_url=url,
+                clients[len(clients)] = cls.REST_CLIENT_CLASS(
+                                                   service_url=url,
                                                    user=user,
                                                    password=password,
-                                                   default_timeout=default_timeout)
+                                                   default_timeout=default_timeout,
+                                                   pool_manager=pool_manager)
         return clients
 
     def request(self, path: str, parameters: Dict=None, source_id: int=None,
                 parse_result: bool=True, return_plain: bool=False,
                 json_encode_arguments: bool=True,
                 query_parameters: str=None, content_type: str='application/json',
-                execute_all_services: bool=False, pass_through_exceptions=()):
+                execute_all_services: bool=False, pass_through_exceptions=(),
+                stream: bool=False):
         """ Execute a given JSON request.
         :param path: the path to query
         :param parameters: optional parameters
@@ -271,29 +408,26 @@ class MultiRESTClient(object):
             set to True, if the client shall pass through all exceptions
         :param return_plain: whether to return the result without prior
                              deserialization using json.load (False*)
+        :param stream: return an iterator yielding the elements of the
+                       returned JSON array one by one, rather than the
+                       deserialized list (False*)
         """
         response = None
         errors = []
 
-        clients = []
-        if source_id is not None and source_id > 0:
-            client_id = source_id % len(self.clients)
-            if client_id in self.clients:
-                clients = [self.clients[client_id]]
-
-        if not len(clients):
-            clients = self.clients.values()
-
-        for client in clients:
+        clients = self._get_request_clients(source_id, execute_all_services)
+        for key, client in clients:
             try:
-                response = client.execute(
+                response = self._execute(
+                    key, client,
                     command=path,
                     parameters=parameters,
                     parse_result=parse_result,
                     return_plain=return_plain,
                     json_encode_arguments=json_encode_arguments,
                     query_parameters=query_parameters,
-                    content_type=content_type)
+                    content_type=content_type,
+                    stream=stream)
 
                 if not execute_all_services:
                     break
@@ -308,7 +442,7 @@ class MultiRESTClient(object):
                     logger.warning(msg, exc_info=True)
                     errors.append(msg)
 
-        if len(errors) == len(self.clients):
+        if len(errors) == len(clients):
             print ('\n'.join(errors))
             raise Exception('Could not make request to path %s: %s' % (
                 path,
@@ -316,6 +450,77 @@ class MultiRESTClient(object):
 
         return response
 
+    def _get_request_clients(self, source_id=None, execute_all_services=False):
+        """ :returns: a list of (key, client) tuples in the order in which
+                      the clients should be tried """
+        if source_id is not None and source_id > 0:
+            client_id = source_id % len(self.clients)
+            if client_id in self.clients:
+                return [(client_id, self.clients[client_id])]
+
+        if self.selector is None or execute_all_services:
+            return list(self.clients.items())
+        return [(key, self.clients[key])
+                for key in self.selector.order(self.clients)]
+
+    def _record_outcome(self, key, start_time, error=None):
+        """ updates the statistics of the given client """
+        # HTTP errors other than server errors do not indicate
+        # a problem with the service itself
+        if error is None or (isinstance(error, urllib.error.HTTPError)
+                             and error.code < 500):
+            self.selector.success(key, start_time)
+        else:
+            self.selector.failure(key, start_time)
+
+    def _record_stream_outcome(self, key, start_time, error):
+        """ updates the statistics of the given client once a streamed
+            response has been consumed """
+        if isinstance(error, GeneratorExit):
+            # the stream has been closed early
+            self.selector.cancel(key)
+        else:
+            self._record_outcome(key, start_time, error)
+
+    def _execute(self, key, client, **kwargs):
+        """ executes a request with the given client and updates the
+            client's statistics (for streamed responses, once the stream
+            has been consumed) """
+        if self.selector is None:
+            return client.execute(**kwargs)
+
+        start_time = self.selector.start(key)
+        try:
+            result = client.execute(**kwargs)
+        except Exception as e:
+            self._record_outcome(key, start_time, e)
+            raise
+        if kwargs.get('stream'):
+            return ObservedIterator(result, partial(
+                self._record_stream_outcome, key, start_time))
+        self._record_outcome(key, start_time)
+        return result
+
+    def get_service_statistics(self):
+        """ :returns: the latency, error rate, number of requests in flight
+                      and circuit breaker state of every service """
+        if self.selector is None:
+            return {}
+        statistics = self.selector.get_statistics()
+        return {client.service_url: statistics[key]
+                for key, client in self.clients.items()}
+
+    def get_retry_policy(self, wait_time: float=None,
+                         max_retry_delay: float=None,
+                         max_retry_attempts: int=None) -> RetryPolicy:
+        """ :param wait_time: optional deadline for all attempts
+            :param max_retry_delay: optional maximum delay between attempts
+            :param max_retry_attempts: optional maximum number of attempts
+            :returns: the client's RETRY_POLICY with the given overrides """
+        return self.RETRY_POLICY.replace(deadline=wait_time,
+                                         max_delay=max_retry_delay,
+                                         max_attempts=max_retry_attempts)
+
     def get_service_urls(self):
         """ """
         return [client.service_url for client in self.clients.values()]
@@ -326,3 +531,219 @@ class MultiRESTClient(object):
         for i in range(0, len(documents), batch_size):
             yield documents[i:i + batch_size]
 
+    def _get_batch_clients(self, batch_number):
+        """ :returns: a list of (key, client) tuples in the order in which
+                      the clients should be tried for the given batch -
+                      the batches are spread across the available services """
+        clients = self._get_request_clients()
+        offset = batch_number % len(clients)
+        return clients[offset:] + clients[:offset]
+
+    def _execute_batch(self, batch_number, path, batch, request_parameters):
+        """ Executes a single batch, starting with the batch's designated
+            service and retrying the remaining services on failure.
+        """
+        errors = []
+        for key, client in self._get_batch_clients(batch_number):
+            try:
+                return self._execute(key, client, command=path,
+                                     parameters=batch, **request_parameters)
+            except Exception as e:
+                msg = 'Could not execute batch %d on %s %s, error %s' % (
+                    batch_number, client.service_url, path, e)
+                logger.warning(msg)
+                errors.append(msg)
+
+        raise Exception('Could not make request to path %s: %s' % (
+            path,
+            '\n'.join(errors)))
+
+    def dispatch_batches(self, path: str, documents: List, batch_size: int=None,
+                         max_workers: int=None, parse_result: bool=True,
+                         return_plain: bool=False,
+                         json_encode_arguments: bool=True,
+                         query_parameters: str=None,
+                         content_type: str='application/json') -> List:
+        """ Splits the documents into batches and sends them concurrently to
+            all configured services. Batches that fail are retried on the
+            remaining services.
+
+        :param path: the path to query
+        :param documents: the list of documents to submit
+        :param batch_size: the batch size (default: MAX_BATCH_SIZE)
+        :param max_workers: maximum number of concurrent requests
+                            (default: the number of services)
+        :returns: a list containing the response for every batch in the
+                  order of the input documents
+        """
+        batches = list(self.get_document_batch(documents, batch_size))
+        if not batches:
+            return []
+
+        request_parameters = {'parse_result': parse_result,
+                              'return_plain': return_plain,
+                              'json_encode_arguments': json_encode_arguments,
+                              'query_parameters': query_parameters,
+                              'content_type': content_type}
+        max_workers = min(max_workers or len(self.clients), len(batches))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self._execute_batch, batch_number, path,
+                                       batch, request_parameters)
+                       for batch_number, batch in enumerate(batches)]
+            return [future.result() for future in futures]
+
+
+class AsyncMultiRESTClient(MultiRESTClient):
+    """ asyncio variant of the :class:`MultiRESTClient`
+
+    :meth:`request` follows the contract of :meth:`MultiRESTClient.request`
+    but returns an awaitable. Requests with `execute_all_services=True` are
+    sent to all services concurrently.
+
+    .. note:: Service clients
+
+       Subclassing this class together with a service client (e.g.
+       ``class AsyncJeremia(AsyncMultiRESTClient, Jeremia)``) turns all
+       service methods that directly return :meth:`request` into
+       coroutines; methods post-processing the response need to be
+       overwritten.
+    """
+    REST_CLIENT_CLASS = AsyncRESTClient
+    POOL_MANAGER_CLASS = AsyncHTTPPoolManager
+
+    async def is_online(self):
+        try:
+            await self.request('status')
+            return True
+        except:
+            return False
+
+    async def request(self, path: str, parameters: Dict=None,
+                      source_id: int=None, parse_result: bool=True,
+                      return_plain: bool=False,
+                      json_encode_arguments: bool=True,
+                      query_parameters: str=None,
+                      content_type: str='application/json',
+                      execute_all_services: bool=False,
+                      pass_through_exceptions=()):
+        """ Execute a given JSON request.
+        :param path: the path to query
+        :param parameters: optional parameters
+        :param parse_result:
+        :param source_id: optional source_id param
+        :param execute_all_services: send the request concurrently to all
+            services and return the last service's response
+        :param pass_through_exceptions:
+            set to True, if the client shall pass through all exceptions
+        :param return_plain: whether to return the result without prior
+                             deserialization using json.load (False*)
+        """
+        clients = self._get_request_clients(source_id, execute_all_services)
+
+        def execute(key, client):
+            return self._execute(key, client,
+                                 command=path,
+                                 parameters=parameters,
+                                 parse_result=parse_result,
+                                 return_plain=return_plain,
+                                 json_encode_arguments=json_encode_arguments,
+                                 query_parameters=query_parameters,
+                                 content_type=content_type)
+
+        response = None
+        errors = []
+        if execute_all_services:
+            results = await asyncio.gather(
+                *[execute(key, client) for key, client in clients],
+                return_exceptions=True)
+        else:
+            results = []
+            for key, client in clients:
+                try:
+                    results.append(await execute(key, client))
+                    break
+                except Exception as e:
+                    results.append(e)
+                    if pass_through_exceptions:
+                        raise e
+
+        for (_, client), result in zip(clients, results):
+            if isinstance(result, Exception):
+                if pass_through_exceptions:
+                    raise result
+                msg = 'Could not execute %s %s, error %s' % (
+                    client.service_url, path, result)
+                logger.warning(msg)
+                errors.append(msg)
+            else:
+                response = result
+
+        if len(errors) == len(clients):
+            raise Exception('Could not make request to path %s: %s' % (
+                path,
+                '\n'.join(errors)))
+
+        return response
+
+    async def _execute(self, key, client, **kwargs):
+        if self.selector is None:
+            return await client.execute(**kwargs)
+
+        start_time = self.selector.start(key)
+        try:
+            result = await client.execute(**kwargs)
+        except asyncio.CancelledError:
+            self.selector.cancel(key)
+            raise
+        except Exception as e:
+            self._record_outcome(key, start_time, e)
+            raise
+        self._record_outcome(key, start_time)
+        return result
+
+    async def _execute_batch(self, batch_number, path, batch,
+                             request_parameters):
+        errors = []
+        for key, client in self._get_batch_clients(batch_number):
+            try:
+                return await self._execute(key, client, command=path,
+                                           parameters=batch,
+                                           **request_parameters)
+            except Exception as e:
+                msg = 'Could not execute batch %d on %s %s, error %s' % (
+                    batch_number, client.service_url, path, e)
+                logger.warning(msg)
+                errors.append(msg)
+
+        raise Exception('Could not make request to path %s: %s' % (
+            path,
+            '\n'.join(errors)))
+
+    async def dispatch_batches(self, path: str, documents: List,
+                               batch_size: int=None, max_workers: int=None,
+                               parse_result: bool=True,
+                               return_plain: bool=False,
+                               json_encode_arguments: bool=True,
+                               query_parameters: str=None,
+                               content_type: str='application/json') -> List:
+        """ see :meth:`MultiRESTClient.dispatch_batches`
+
+        :param max_workers: maximum number of batches in flight
+                            (default: the number of services)
+        """
+        batches = list(self.get_document_batch(documents, batch_size))
+        request_parameters = {'parse_result': parse_result,
+                              'return_plain': return_plain,
+                              'json_encode_arguments': json_encode_arguments,
+                              'query_parameters': query_parameters,
+                              'content_type': content_type}
+        semaphore = asyncio.Semaphore(max_workers or len(self.clients))
+
+        async def execute(batch_number, batch):
+            async with semaphore:
+                return await self._execute_batch(batch_number, path, batch,
+                                                 request_parameters)
+
+        return list(await asyncio.gather(
+            *[execute(batch_number, batch)
+              for batch_number, batch in enumerate(batches)]))
@@ -0,0 +1,220 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+Client-side adaptive concurrency control (backpressure) for web services
+which process requests in a bounded worker pool (e.g. Jeremia).
+
+The :class:`AdaptiveConcurrencyLimiter` limits the number of concurrent
+requests of all threads (or asyncio tasks) sharing it. The limit follows
+an AIMD (additive increase, multiplicative decrease) scheme:
+
+ * every successful request increases the limit by 1/limit, i.e. by one
+   per round of requests;
+ * responses signalling an overloaded service (429, 502, 503, 504),
+   timeouts and latencies well above the observed baseline decrease the
+   limit by `backoff_factor` - at most once per round of requests.
+'''
+import asyncio
+import socket
+import threading
+import urllib.error
+
+from collections import deque
+from functools import partial
+from time import time
+
+from weblyzard_api.util.json_stream import ObservedIterator
+
+import logging
+logger = logging.getLogger(__name__)
+
+SUCCESS = 'success'
+OVERLOADED = 'overloaded'
+FAILED = 'failed'
+
+# HTTP status codes indicating that the service is overloaded
+HTTP_OVERLOAD_STATUS_CODES = (429, 502, 503, 504)
+
+DEFAULT_INITIAL_LIMIT = 4
+DEFAULT_MIN_LIMIT = 1
+DEFAULT_MAX_LIMIT = 64
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_LATENCY_TOLERANCE = 3.
+# relative increase of the latency baseline per request, which allows the
+# baseline to adapt to slower services
+BASELINE_DRIFT = 0.01
+
+
+def classify_exception(e: Exception) -> str:
+    ''' :returns: OVERLOADED, if the exception indicates an overloaded
+                  service and FAILED otherwise '''
+    if isinstance(e, urllib.error.HTTPError):
+        return OVERLOADED if e.code in HTTP_OVERLOAD_STATUS_CODES else FAILED
+    if isinstance(e, urllib.error.URLError):
+        e = e.reason
+    if isinstance(e, (socket.timeout, asyncio.TimeoutError)):
+        return OVERLOADED
+    return FAILED
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveConcurrencyLimiter(object):
+    ''' Thread-safe AIMD concurrency limiter.
+
+        usage::
+
+            limiter = AdaptiveConcurrencyLimiter()
+            result = limiter.call(client.request, 'submit_documents', docs)
+    '''
+
+    def __init__(self, initial_limit: int=DEFAULT_INITIAL_LIMIT,
+                 min_limit: int=DEFAULT_MIN_LIMIT,
+                 max_limit: int=DEFAULT_MAX_LIMIT,
+                 backoff_factor: float=DEFAULT_BACKOFF_FACTOR,
+                 latency_tolerance: float=DEFAULT_LATENCY_TOLERANCE):
+        '''
+        :param initial_limit: the initial number of concurrent requests
+        :param min_limit: the minimum number of concurrent requests
+        :param max_limit: the maximum number of concurrent requests
+        :param backoff_factor: factor applied to the limit on overload
+        :param latency_tolerance: latencies exceeding the baseline latency
+                                  by this factor are considered as overload
+                                  (None disables latency based backoff)
+        '''
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_factor = backoff_factor
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.baseline_latency = None
+        self._last_decrease = 0.
+        self._condition = threading.Condition()
+        self._async_waiters = deque()
+
+    def _has_capacity(self):
+        return self.in_flight < max(int(self.limit), self.min_limit)
+
+    def acquire(self, timeout: float=None) -> float:
+        ''' blocks until a request may be sent
+        :param timeout: optional maximum number of seconds to wait
+        :returns: the request's start time (required for :meth:`release`)
+        :raises TimeoutError: if the timeout expired
+        '''
+        with self._condition:
+            if not self._condition.wait_for(self._has_capacity, timeout):
+                raise TimeoutError('No request slot available.')
+            self.in_flight += 1
+        return time()
+
+    async def acquire_async(self) -> float:
+        ''' awaitable variant of :meth:`acquire` '''
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self._has_capacity():
+                    self.in_flight += 1
+                    return time()
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            await future
+
+    def release(self, start_time: float, outcome: str=SUCCESS):
+        ''' registers the completion of a request and adapts the limit
+        :param start_time: the start time returned by :meth:`acquire`
+        :param outcome: SUCCESS, OVERLOADED or FAILED (FAILED does not
+                        change the limit)
+        '''
+        now = time()
+        latency = now - start_time
+        with self._condition:
+            self.in_flight -= 1
+            if outcome == SUCCESS:
+                if self._is_congested(latency):
+                    outcome = OVERLOADED
+                else:
+                    self.limit = min(self.max_limit,
+                                     self.limit + 1. / self.limit)
+
+            # decrease only once for requests sent within the same round
+            if outcome == OVERLOADED and start_time >= self._last_decrease:
+                self.limit = max(self.min_limit,
+                                 self.limit * self.backoff_factor)
+                self._last_decrease = now
+                logger.debug('Reducing concurrency limit to %.2f', self.limit)
+
+            self._condition.notify_all()
+            while self._async_waiters:
+                loop, future = self._async_waiters.popleft()
+                loop.call_soon_threadsafe(_wake, future)
+
+    def _is_congested(self, latency):
+        if self.latency_tolerance is None:
+            return False
+        if self.baseline_latency is None:
+            self.baseline_latency = latency
+            return False
+        congested = latency > self.latency_tolerance * self.baseline_latency
+        self.baseline_latency = min(latency,
+                                    self.baseline_latency * (1 + BASELINE_DRIFT))
+        return congested
+
+    def call(self, fn, *args, **kwargs):
+        ''' calls fn once a request slot is available '''
+        start_time = self.acquire()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.release(start_time, classify_exception(e))
+            raise
+        self.release(start_time)
+        return result
+
+    def call_stream(self, fn, *args, **kwargs):
+        ''' calls fn, which returns an iterator (e.g. a streamed response),
+            once a request slot is available. The slot is only released
+            once the iterator has been exhausted, failed or closed. '''
+        start_time = self.acquire()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.release(start_time, classify_exception(e))
+            raise
+        return ObservedIterator(result, partial(self._release_stream,
+                                                start_time))
+
+    def _release_stream(self, start_time, error):
+        if error is None:
+            self.release(start_time)
+        elif isinstance(error, GeneratorExit):
+            # closed early - the latency is not representative
+            self.release(start_time, FAILED)
+        else:
+            self.release(start_time, classify_exception(error))
+
+    async def call_async(self, fn, *args, **kwargs):
+        ''' awaits the coroutine function fn once a request slot is
+            available '''
+        start_time = await self.acquire_async()
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            self.release(start_time, FAILED)
+            raise
+        except Exception as e:
+            self.release(start_time, classify_exception(e))
+            raise
+        self.release(start_time)
+        return result
+
+    def get_statistics(self):
+        ''' :returns: the current limit, requests in flight and baseline
+                      latency '''
+        with self._condition:
+            return {'limit': self.limit,
+                    'in_flight': self.in_flight,
+                    'baseline_latency': self.baseline_latency}
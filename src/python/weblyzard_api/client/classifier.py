@@ -14,7 +14,7 @@ import unittest
 
 from sys import argv
 
-from weblyzard_api.client import MultiRESTClient
+from weblyzard_api.client import MultiRESTClient, AsyncMultiRESTClient
 from weblyzard_api.util.module_path import get_resource
 
 from weblyzard_api.client import (
@@ -114,6 +114,29 @@ class Classifier(MultiRESTClient):
                             + request_type + classifier_profile, learn_request)
 
 
+class AsyncClassifier(AsyncMultiRESTClient, Classifier):
+    '''
+    asyncio variant of the :class:`Classifier` - all service methods
+    return awaitables.
+    '''
+
+    async def classify_v2(self, classifier_profile, weblyzard_xml,
+                          search_agents=None, num_results=1):
+        '''
+        see :meth:`Classifier.classify_v2`
+        '''
+        classifier_request = {'xml_document': weblyzard_xml,
+                              'numOfResults': num_results, }
+        if search_agents is not None:
+            classifier_request['searchAgents'] = search_agents
+
+        classification_list = await self.request(
+            self.CLASSIFIER_WS_BASE_PATH + '2/classify/' + classifier_profile,
+            classifier_request)
+        return {entry['searchagent']: entry['classification']
+                for entry in classification_list}
+
+
 class TestClassifier(unittest.TestCase):
 
     get_search_agent_ids = staticmethod(lambda search_agents: [sa['id']
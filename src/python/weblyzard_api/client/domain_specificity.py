@@ -68,14 +68,14 @@ class DomainSpecificity(MultiRESTClient):
                              for domain specificity.
         :param documents: a list of dictionaries containing the document
         :param is_case_sensitive: case sensitive or not
+        :param batch_size: the number of documents per request; batches are
+                           distributed among all configured services
         :returns: dict (profilename: (content_id, dom_spec))  
         '''
         found_tags = {}
-        for document_batch in self.get_document_batch(documents=documents,
-                                                      batch_size=batch_size):
-            result = self.request('parse_documents/%s/%s' %
-                                  (matview_name, is_case_sensitive),
-                                  document_batch)
+        for result in self.dispatch_batches('parse_documents/%s/%s' %
+                                            (matview_name, is_case_sensitive),
+                                            documents, batch_size=batch_size):
             if result:
                 found_tags.update(result[matview_name])
 
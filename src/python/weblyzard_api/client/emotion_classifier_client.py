@@ -7,9 +7,10 @@ Created on April 15, 2021
 '''
 import logging
 
-from weblyzard_api.client import MultiRESTClient
+from weblyzard_api.client import MultiRESTClient, AsyncMultiRESTClient
 from weblyzard_api.client import (
     WEBLYZARD_API_URL, WEBLYZARD_API_USER, WEBLYZARD_API_PASS)
+from weblyzard_api.util.retry import RetryPolicy
 
 SERVER_URL_PATH = '/rest/emotions/document'
 
@@ -20,6 +21,10 @@ logger = logging.getLogger(__name__)
 class EmotionClassifierClient(MultiRESTClient):
     URL_PATH = '/'.join(SERVER_URL_PATH.split('/')[:-1])
     DEFAULT_EMOTIONAL_CATEGORIES = 'glove_lemmatized'
+    # failed requests are retried once without delay, whatever the error
+    EMOTIONS_RETRY_POLICY = RetryPolicy(
+        max_attempts=2, base_delay=0, retryable_status_codes=range(600),
+        retryable_exceptions=(Exception,))
 
     def __init__(self, url=WEBLYZARD_API_URL, usr=WEBLYZARD_API_USER,
                  pwd=WEBLYZARD_API_PASS, default_timeout=None):
@@ -45,28 +50,48 @@ class EmotionClassifierClient(MultiRESTClient):
             ocurred, it is also contained in the dict with the 'error' key.
         :rtype: dict
         '''
-        result = None
-        retrycount = 1
-        retries = 0
-        while retries <= retrycount:
-            retries += 1
-            try:
-                result = self.request('document',
-                                      parameters={'format': content_format,
-                                                  'content': content,
-                                                  'emotional_categories': emotional_categories},
-                                      return_plain=False)
-                break
-            except Exception as e:
-                if retries <= retrycount:
-                    pass  # silently retry
-                else:
-                    msg = f'Request to emotions webservice ' \
-                          f'failed {retries} times, latest error was {e}'
-                    logger.warning(msg, exc_info=True)
-                    result = {
-                        'error': msg}
-        return result
+        try:
+            return self.EMOTIONS_RETRY_POLICY.call(
+                self.request, **self._get_emotions_request(
+                    content, content_format, emotional_categories))
+        except Exception as e:
+            return self._get_emotions_error(e)
+
+    @staticmethod
+    def _get_emotions_request(content, content_format, emotional_categories):
+        ''' :returns: the request arguments of :meth:`get_emotions` '''
+        return {'path': 'document',
+                'parameters': {'format': content_format,
+                               'content': content,
+                               'emotional_categories': emotional_categories},
+                'return_plain': False}
+
+    @classmethod
+    def _get_emotions_error(cls, e):
+        ''' :returns: the result of :meth:`get_emotions` if all attempts
+                      failed '''
+        msg = f'Request to emotions webservice ' \
+              f'failed {cls.EMOTIONS_RETRY_POLICY.max_attempts} times, ' \
+              f'latest error was {e}'
+        logger.warning(msg, exc_info=True)
+        return {'error': msg}
 
     def status(self):
         return self.request('config')
+
+
+class AsyncEmotionClassifierClient(AsyncMultiRESTClient,
+                                   EmotionClassifierClient):
+    ''' asyncio variant of the :class:`EmotionClassifierClient` '''
+
+    async def get_emotions(self, content, content_format,
+                           emotional_categories=EmotionClassifierClient.DEFAULT_EMOTIONAL_CATEGORIES):
+        '''
+        see :meth:`EmotionClassifierClient.get_emotions`
+        '''
+        try:
+            return await self.EMOTIONS_RETRY_POLICY.call_async(
+                self.request, **self._get_emotions_request(
+                    content, content_format, emotional_categories))
+        except Exception as e:
+            return self._get_emotions_error(e)
@@ -14,13 +14,14 @@ import io
 import json
 import os
 import socket
-import time
 import logging
 
 from SPARQLWrapper import SPARQLWrapper, JSON
+from SPARQLWrapper.SPARQLExceptions import EndPointInternalError
 import rdflib.term
 
 from weblyzard_api.client.rdf import PREFIXES, NAMESPACES
+from weblyzard_api.util.retry import RetryPolicy, RETRYABLE_EXCEPTIONS
 
 logger = logging.getLogger(__name__)
 
@@ -67,27 +68,11 @@ class FusekiWrapper(object):
         if self.debug_:
             print(string_)
 
-    def _retry_with_backoff(decorated):  # @NoSelf
-
-        def decorator(*args, **kwargs):
-            max_retries = 8  # 2^(max_retries+1) seconds until error
-            num_retries = 0
-            retry_delay = 1
-            success = False
-            while (not success) and num_retries < max_retries:
-                try:
-                    return decorated(*args, **kwargs)
-                    success = True
-                except Exception as e:
-                    logger.warning(
-                        f'retrying {decorated.__name__} in {retry_delay} seconds...')
-                    time.sleep(retry_delay)
-                    num_retries = num_retries + 1
-                    retry_delay = retry_delay * 2
-            # last try without catching the exception
-            return decorated(*args, **kwargs)
-
-        return decorator
+    # retries failed queries and updates with exponential backoff
+    # (for up to 2^(max_attempts) seconds); malformed queries are not retried
+    _retry_with_backoff = RetryPolicy(
+        max_attempts=9, base_delay=1., max_delay=128.,
+        retryable_exceptions=RETRYABLE_EXCEPTIONS + (EndPointInternalError,))
 
     def fix_uri(self, o):
         '''
@@ -6,13 +6,11 @@
 """
 from __future__ import unicode_literals
 
-import urllib.error
-
 from future import standard_library
-from time import sleep, time
-from random import random
 
-from weblyzard_api.client import MultiRESTClient
+from weblyzard_api.client import MultiRESTClient, AsyncMultiRESTClient
+from weblyzard_api.client.backpressure import AdaptiveConcurrencyLimiter
+from weblyzard_api.util.retry import RetryPolicy
 from weblyzard_api.model.xml_content import XMLContent
 from weblyzard_api.client import (
     WEBLYZARD_API_URL, WEBLYZARD_API_USER, WEBLYZARD_API_PASS)
@@ -23,8 +21,8 @@ import logging
 logger = logging.getLogger(__name__)
 
 # number of seconds to wait if the web service is occupied
-# - we stop once either DEFAULT_MAX_RETRY_DELAY or DEFAULT_MAX_RETRY_ATTEMPTS is reached
-# . DEFAULT_WAIT_TIME should therefore amount to DEFAULT_MAX_RETRY_DELAY/2 * DEFAULT_MAX_RETRY_ATTEMPTS
+# - we stop once either DEFAULT_WAIT_TIME or DEFAULT_MAX_RETRY_ATTEMPTS is reached
+# - the delay between retries grows exponentially up to DEFAULT_MAX_RETRY_DELAY
 DEFAULT_WAIT_TIME = 20 * 60
 DEFAULT_MAX_RETRY_DELAY = 20
 DEFAULT_MAX_RETRY_ATTEMPTS = 120
@@ -70,6 +68,9 @@ class Jeremia(MultiRESTClient):
             pprint(result)
     '''
     URL_PATH = 'jeremia/rest'
+    RETRY_POLICY = RetryPolicy(max_attempts=DEFAULT_MAX_RETRY_ATTEMPTS,
+                               max_delay=DEFAULT_MAX_RETRY_DELAY,
+                               deadline=DEFAULT_WAIT_TIME)
     ATTRIBUTE_MAPPING = {'content_id': 'id',
                          'title': 'title',
                          'sentences': 'sentence',
@@ -80,58 +81,55 @@ class Jeremia(MultiRESTClient):
                                            'md5sum': 'id'}}
 
     def __init__(self, url=WEBLYZARD_API_URL, usr=WEBLYZARD_API_USER,
-                 pwd=WEBLYZARD_API_PASS, default_timeout=None):
+                 pwd=WEBLYZARD_API_PASS, default_timeout=None,
+                 concurrency_limiter: AdaptiveConcurrencyLimiter=None):
         '''
         :param url: URL of the jeremia web service
         :param usr: optional user name
         :param pwd: optional password
+        :param concurrency_limiter: optional
+                    :class:`~weblyzard_api.client.backpressure.AdaptiveConcurrencyLimiter`
+                    which limits the number of concurrent
+                    :meth:`submit_documents` requests (e.g. shared between
+                    several clients)
         '''
         MultiRESTClient.__init__(self, service_urls=url,
                                  default_timeout=default_timeout,
                                  user=usr, password=pwd)
+        self.concurrency_limiter = concurrency_limiter or \
+            AdaptiveConcurrencyLimiter()
 
     def submit_document(self, document, source_id:int=None,
-                        wait_time=DEFAULT_WAIT_TIME,
-                        max_retry_delay=DEFAULT_MAX_RETRY_DELAY,
-                        max_retry_attempts=DEFAULT_MAX_RETRY_ATTEMPTS):
+                        wait_time=None, max_retry_delay=None,
+                        max_retry_attempts=None):
         '''
         processes a single document with jeremia (annotates a single document)
 
         :param document: the document to be processed
+        :param wait_time: optional deadline (see :attr:`RETRY_POLICY`)
+        :param max_retry_delay: optional maximum delay between retries
+        :param max_retry_attempts: optional maximum number of attempts
         '''
-
-        # wait until the web service has available threads for processing
-        # the request
-        attempts = 0
-        start_time = time()
-        while time() - start_time < wait_time and attempts < max_retry_attempts:
-
-            # submit the request
-            try:
-                logger.debug('Submit_document: %s', document)
-                result = self.request(path='submit_document',
-                                      source_id=source_id,
-                                      parameters=document,
-                                      pass_through_exceptions=True)
-                return result
-            except (urllib.error.HTTPError, urllib.error.URLError) as e:
-                logger.warning('Submit_document failed... Sleeping before retry...')
-                sleep(max_retry_delay * random())
-                attempts = attempts + 1
-
-        # this access most certainly causes an exception since the
-        # requests above have failed.
-        return self.request(path='submit_document', source_id=source_id,
-                            parameters=document)
+        logger.debug('Submit_document: %s', document)
+        retry_policy = self.get_retry_policy(wait_time, max_retry_delay,
+                                             max_retry_attempts)
+        return retry_policy.call(self.request, path='submit_document',
+                                 source_id=source_id, parameters=document,
+                                 pass_through_exceptions=True)
 
     def submit_documents(self, documents, source_id=-1,
                          double_sentence_threshold=10,
-                         wait_time=DEFAULT_WAIT_TIME,
-                         max_retry_delay=DEFAULT_MAX_RETRY_DELAY,
-                         max_retry_attempts=DEFAULT_MAX_RETRY_ATTEMPTS):
+                         wait_time=None, max_retry_delay=None,
+                         max_retry_attempts=None, stream=False):
         '''
         :param batch_id: batch_id to use for the given submission
         :param documents: a list of dictionaries containing the document
+        :param wait_time: optional deadline (see :attr:`RETRY_POLICY`)
+        :param max_retry_delay: optional maximum delay between retries
+        :param max_retry_attempts: optional maximum number of attempts
+        :param stream: return an iterator which decodes the annotated
+                       documents one by one, rather than a list; the
+                       iterator needs to be consumed or closed
         '''
         if not documents:
             raise ValueError('Cannot process an empty document list')
@@ -139,32 +137,16 @@ class Jeremia(MultiRESTClient):
         request = 'submit_documents/%s/%d' % (source_id,
                                               double_sentence_threshold)
 
-        # wait until the web service has available threads for processing
-        # the request
-        attempts = 0
-        start_time = time()
-        while time() - start_time < wait_time and attempts < max_retry_attempts:
-            # wait until threads are available
-            while self.has_queued_threads(source_id=source_id) and time() - start_time < wait_time:
-                sleep(max_retry_delay * random())
-
-            # submit the request
-            # - here we need to check for a 502 and 503 error in
-            #   case that has_queued_threads has not been
-            #   up to date.
-            try:
-                result = self.request(path=request, source_id=source_id,
-                                      parameters=documents,
-                                      pass_through_exceptions=True)
-                return result
-            except (urllib.error.HTTPError, urllib.error.URLError) as e:
-                logger.warning(f'will retry (num_attempts:{attempts}) due to {e}')
-                attempts = attempts + 1
-
-        # this access most certainly causes an exception since the
-        # requests above have failed.
-        return self.request(path=request, source_id=source_id,
-                            parameters=documents)
+        # the concurrency limiter adapts the number of concurrent requests
+        # to the web service's load (502 and 503 responses, latency);
+        # streamed responses keep their slot until they have been consumed
+        retry_policy = self.get_retry_policy(wait_time, max_retry_delay,
+                                             max_retry_attempts)
+        call = self.concurrency_limiter.call_stream if stream \
+            else self.concurrency_limiter.call
+        return retry_policy.call(
+            call, self.request, path=request, source_id=source_id,
+            parameters=documents, pass_through_exceptions=True, stream=stream)
 
     def status(self):
         '''
@@ -236,3 +218,82 @@ class Jeremia(MultiRESTClient):
         except Exception as e:
             result = True
         return result
+
+
+class AsyncJeremia(AsyncMultiRESTClient, Jeremia):
+    '''
+    asyncio variant of the :class:`Jeremia` client - all service methods
+    return awaitables.
+
+    .. note:: Example usage
+
+        .. code-block:: python
+
+            client = AsyncJeremia()
+            results = await asyncio.gather(
+                *[client.submit_documents(batch) for batch in batches])
+    '''
+
+    async def submit_document(self, document, source_id:int=None,
+                              wait_time=None, max_retry_delay=None,
+                              max_retry_attempts=None):
+        '''
+        processes a single document with jeremia (annotates a single document)
+
+        :param document: the document to be processed
+        '''
+        logger.debug('Submit_document: %s', document)
+        retry_policy = self.get_retry_policy(wait_time, max_retry_delay,
+                                             max_retry_attempts)
+        return await retry_policy.call_async(
+            self.request, path='submit_document', source_id=source_id,
+            parameters=document, pass_through_exceptions=True)
+
+    async def submit_documents(self, documents, source_id=-1,
+                               double_sentence_threshold=10,
+                               wait_time=None, max_retry_delay=None,
+                               max_retry_attempts=None):
+        '''
+        :param documents: a list of dictionaries containing the document
+        '''
+        if not documents:
+            raise ValueError('Cannot process an empty document list')
+
+        request = 'submit_documents/%s/%d' % (source_id,
+                                              double_sentence_threshold)
+
+        retry_policy = self.get_retry_policy(wait_time, max_retry_delay,
+                                             max_retry_attempts)
+        return await retry_policy.call_async(
+            self.concurrency_limiter.call_async, self.request, path=request,
+            source_id=source_id, parameters=documents,
+            pass_through_exceptions=True)
+
+    async def get_xml_doc(self, text, content_id='1'):
+        '''
+        Processes text and returns a XMLContent object.
+
+        :param text: the text to process
+        :param content_id: optional content id
+        '''
+        batch = [{'id': content_id,
+                  'title': '',
+                  'body': text,
+                  'format': 'text/plain'}]
+
+        results = await self.submit_documents(batch)
+        return XMLContent(results[0]['xml_content'])
+
+    async def has_queued_threads(self, source_id:int=None):
+        '''
+        :param source_id: source id
+        :returns:
+            True if Jeremia still has queued (i.e. unprocessed) threads or
+            False otherwise.
+        '''
+        try:
+            result = await self.request('has_queued_threads',
+                                        source_id=source_id)
+        except Exception as e:
+            result = True
+        return result
@@ -8,12 +8,9 @@ from __future__ import unicode_literals
 from future import standard_library
 standard_library.install_aliases()
 
-import urllib.request, urllib.error, urllib.parse
-
-from time import sleep, time
-from random import random
-
 from weblyzard_api.client import MultiRESTClient
+from weblyzard_api.client.backpressure import AdaptiveConcurrencyLimiter
+from weblyzard_api.util.retry import RetryPolicy
 
 from weblyzard_api.model.xml_content import XMLContent
 from weblyzard_api.client import (
@@ -23,8 +20,8 @@ import logging
 logger = logging.getLogger(__name__)
 
 # number of seconds to wait if the web service is occupied
-# - we stop once either DEFAULT_MAX_RETRY_DELAY or DEFAULT_MAX_RETRY_ATTEMPTS is reached
-# . DEFAULT_WAIT_TIME should therefore amount to DEFAULT_MAX_RETRY_DELAY/2 * DEFAULT_MAX_RETRY_ATTEMPTS
+# - we stop once either DEFAULT_WAIT_TIME or DEFAULT_MAX_RETRY_ATTEMPTS is reached
+# - the delay between retries grows exponentially up to DEFAULT_MAX_RETRY_DELAY
 DEFAULT_WAIT_TIME = 20 * 60
 DEFAULT_MAX_RETRY_DELAY = 20
 DEFAULT_MAX_RETRY_ATTEMPTS = 120
@@ -70,6 +67,9 @@ class JeremiaNg(MultiRESTClient):
             pprint(result)
     """
     URL_PATH = 'rest'
+    RETRY_POLICY = RetryPolicy(max_attempts=DEFAULT_MAX_RETRY_ATTEMPTS,
+                               max_delay=DEFAULT_MAX_RETRY_DELAY,
+                               deadline=DEFAULT_WAIT_TIME)
     ATTRIBUTE_MAPPING = {'content_id': 'id',
                          'title': 'title',
                          'sentences': 'sentence',
@@ -80,14 +80,22 @@ class JeremiaNg(MultiRESTClient):
                                            'md5sum': 'id'}}
 
     def __init__(self, url=WEBLYZARD_API_URL, usr=WEBLYZARD_API_USER,
-                 pwd=WEBLYZARD_API_PASS, default_timeout=None):
+                 pwd=WEBLYZARD_API_PASS, default_timeout=None,
+                 concurrency_limiter: AdaptiveConcurrencyLimiter=None):
         """
         :param url: URL of the jeremia web service
         :param usr: optional user name
         :param pwd: optional password
+        :param concurrency_limiter: optional
+                    :class:`~weblyzard_api.client.backpressure.AdaptiveConcurrencyLimiter`
+                    which limits the number of concurrent
+                    :meth:`submit_documents` requests (e.g. shared between
+                    several clients)
         """
         MultiRESTClient.__init__(self, service_urls=url, user=usr, password=pwd,
                                  default_timeout=default_timeout)
+        self.concurrency_limiter = concurrency_limiter or \
+            AdaptiveConcurrencyLimiter()
 
     def submit_document(self, document):
         """ Process a single document with jeremia (annotates a single document)
@@ -97,17 +105,16 @@ class JeremiaNg(MultiRESTClient):
 
     def submit_documents(self, documents, source_id=-1,
                          double_sentence_threshold=10,
-                         wait_time=DEFAULT_WAIT_TIME,
-                         max_retry_delay=DEFAULT_MAX_RETRY_DELAY,
-                         max_retry_attempts=DEFAULT_MAX_RETRY_ATTEMPTS):
+                         wait_time=None, max_retry_delay=None,
+                         max_retry_attempts=None):
         """ Batch submit documents to the Jeremia Web Service. Supports retry
         with backoff mechanism.
         :param documents: a list of dictionaries containing the document
         :param source_id:
         :param double_sentence_threshold:
-        :param wait_time:
-        :param max_retry_delay:
-        :param max_retry_attempts:
+        :param wait_time: optional deadline (see :attr:`RETRY_POLICY`)
+        :param max_retry_delay: optional maximum delay between retries
+        :param max_retry_attempts: optional maximum number of attempts
         """
         if not documents:
             raise ValueError('Cannot process an empty document list')
@@ -115,27 +122,13 @@ class JeremiaNg(MultiRESTClient):
         request = 'submit_documents/%s/%d' % (source_id,
                                               double_sentence_threshold)
 
-        # wait until the web service has available threads for processing
-        # the request
-        attempts = 0
-        start_time = time()
-        while time() - start_time < wait_time and attempts < max_retry_attempts:
-
-            # submit the request
-            # - here we need to check for a 502 and 503 error in
-            #   case that has_queued_threads has not been
-            #   up to date.
-            try:
-                result = self.request(request, documents,
-                                      pass_through_exceptions=True)
-                return result
-            except (urllib.error.HTTPError, urllib.error.URLError) as e:
-                sleep(max_retry_delay * random())
-                attempts = attempts + 1
-
-        # this access most certainly causes an exception since the
-        # requests above have failed.
-        return self.request(request, documents)
+        # the concurrency limiter adapts the number of concurrent requests
+        # to the web service's load (502 and 503 responses, latency)
+        retry_policy = self.get_retry_policy(wait_time, max_retry_delay,
+                                             max_retry_attempts)
+        return retry_policy.call(self.concurrency_limiter.call, self.request,
+                                 request, documents,
+                                 pass_through_exceptions=True)
 
     def status(self):
         """
@@ -7,6 +7,7 @@
 from __future__ import unicode_literals
 
 from weblyzard_api.client import MultiRESTClient
+from weblyzard_api.model.bulk import BulkConverter
 from weblyzard_api.model.xml_content import XMLContent
 from weblyzard_api.client import (
     WEBLYZARD_API_URL, WEBLYZARD_API_USER, WEBLYZARD_API_PASS)
@@ -47,14 +48,18 @@ class Jesaja(MultiRESTClient):
                                  default_timeout=default_timeout)
 
     @classmethod
-    def get_documents(cls, xml_content_dict):
+    def get_documents(cls, xml_content_dict, processes=1):
         ''' 
         converts a list of weblyzard xml files to the 
         json format required by the jesaja web service.
+
+        :param processes: the number of processes used for the conversion
+                          (see :class:`~weblyzard_api.model.bulk.BulkConverter`)
         '''
         if not isinstance(xml_content_dict, list):
             xml_content_dict = [xml_content_dict]
-        return [cls.convert_document(xml) for xml in xml_content_dict]
+        return BulkConverter(cls.convert_document,
+                             processes=processes).map(xml_content_dict)
 
     @classmethod
     def convert_document(cls, xml):
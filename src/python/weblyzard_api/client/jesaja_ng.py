@@ -7,10 +7,14 @@
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from weblyzard_api.client import MultiRESTClient
+import logging
+
+from weblyzard_api.client import MultiRESTClient, AsyncMultiRESTClient
 from weblyzard_api.client import (
     WEBLYZARD_API_URL, WEBLYZARD_API_USER, WEBLYZARD_API_PASS)
 
+logger = logging.getLogger(__name__)
+
 
 class JesajaNg(MultiRESTClient):
     '''
@@ -109,6 +113,14 @@ class JesajaNg(MultiRESTClient):
             raise Exception(
                 'Cannot compute keywords - unknown profile_name {}'.format(profile_name))
 
+        return self.request(
+            self._get_keyword_annotations_endpoint(profile_name, num_keywords,
+                                                   add_ngrams),
+            documents)
+
+    @staticmethod
+    def _get_keyword_annotations_endpoint(profile_name, num_keywords,
+                                          add_ngrams):
         endpoint = f'get_nek_annotations/{profile_name}'
         if num_keywords is not None and int(num_keywords) > 0:
             endpoint = f'{endpoint}?num_keywords={num_keywords}'
@@ -117,8 +129,7 @@ class JesajaNg(MultiRESTClient):
             if '?' in endpoint:
                 separator = '&'
             endpoint = f'{endpoint}{separator}add_ngrams=false'
-
-        return self.request(endpoint, documents)
+        return endpoint
 
     def get_keywords(self, profile_name, documents):
         '''
@@ -142,7 +153,7 @@ class JesajaNg(MultiRESTClient):
 
     def remove_matview_profile(self, profile_name):
         if not self.has_profile(profile_name):
-            print('No profile {} found'.format(profile_name))
+            logger.warning('No profile %s found', profile_name)
             return
         return self.request('remove_profile/{}'.format(profile_name),
                             return_plain=True)
@@ -150,10 +161,13 @@ class JesajaNg(MultiRESTClient):
     def get_corpus_size(self, profile_name):
         available_completed_shards = self.request(
             'list_shards/complete/{}'.format(profile_name))
-        total = 0
-        for shard in available_completed_shards[profile_name]:
-            total = total + shard['wordCount']
-        return total
+        return self._get_word_count(available_completed_shards, profile_name)
+
+    @staticmethod
+    def _get_word_count(available_completed_shards, profile_name):
+        ''' :returns: the number of words in the profile's completed shards '''
+        return sum(shard['wordCount']
+                   for shard in available_completed_shards[profile_name])
 
     def list_profiles(self):
         return self.request('list_profiles')
@@ -200,3 +214,54 @@ class JesajaNg(MultiRESTClient):
             return self.request('rotate_shard')
         else:
             return self.request('rotate_shard/{}'.format(profile_name))
+
+
+class AsyncJesajaNg(AsyncMultiRESTClient, JesajaNg):
+    '''
+    asyncio variant of the :class:`JesajaNg` client - all service methods
+    return awaitables.
+    '''
+
+    async def get_keyword_annotations(self, profile_name, documents,
+                                      num_keywords:int=None, add_ngrams=True):
+        '''
+        see :meth:`JesajaNg.get_keyword_annotations`
+        '''
+        if not await self.has_profile(profile_name):
+            raise Exception(
+                'Cannot compute keywords - unknown profile_name {}'.format(profile_name))
+
+        return await self.request(
+            self._get_keyword_annotations_endpoint(profile_name, num_keywords,
+                                                   add_ngrams),
+            documents)
+
+    async def get_keywords(self, profile_name, documents):
+        '''
+        see :meth:`JesajaNg.get_keywords`
+        '''
+        if not await self.has_profile(profile_name):
+            raise Exception(
+                'Cannot compute keywords - unknown profile_name {}'.format(profile_name))
+        return await self.request('get_keywords/{}'.format(profile_name),
+                                  documents)
+
+    async def has_profile(self, profile_name):
+        return profile_name in await self.list_profiles()
+
+    async def has_corpus(self, profile_name):
+        available_completed_shards = await self.request(
+            'list_shards/complete/{}'.format(profile_name))
+        return len(available_completed_shards[profile_name]) > 0
+
+    async def remove_matview_profile(self, profile_name):
+        if not await self.has_profile(profile_name):
+            logger.warning('No profile %s found', profile_name)
+            return
+        return await self.request('remove_profile/{}'.format(profile_name),
+                                  return_plain=True)
+
+    async def get_corpus_size(self, profile_name):
+        available_completed_shards = await self.request(
+            'list_shards/complete/{}'.format(profile_name))
+        return self._get_word_count(available_completed_shards, profile_name)
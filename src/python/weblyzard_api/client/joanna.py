@@ -11,10 +11,8 @@ standard_library.install_aliases()
 import json
 import urllib.request, urllib.error
 
-from random import random
-from time import sleep
-
 from weblyzard_api.client import MultiRESTClient
+from weblyzard_api.util.retry import RetryPolicy
 
 import logging
 logger = logging.getLogger(__name__)
@@ -90,6 +88,8 @@ class Joanna(object):
     Example usage:
         jo = Joanna(url="http://localhost:8080")
     """
+    RETRY_POLICY = RetryPolicy(max_attempts=DEFAULT_MAX_RETRY_ATTEMPTS,
+                               max_delay=DEFAULT_MAX_RETRY_DELAY)
 
     def __init__(self, url, default_timeout=None):
         self.url = url
@@ -139,8 +139,6 @@ class Joanna(object):
          for finer control of the connection codes for retries
              result: {hash:boolean, ..}
         """
-        max_retry_delay = DEFAULT_MAX_RETRY_DELAY
-        max_retry_attempts = DEFAULT_MAX_RETRY_ATTEMPTS
         nilsimsa_threshold = int(nilsimsa_threshold)
         if daysBack is None:
             daysBack = DAYS_BACK_DEFAULT
@@ -161,12 +159,9 @@ class Joanna(object):
         req = PostRequest(self.url + '/' + request_url,
                           contentIds_nilsimsa_dict)
 
-        attempts = 0
-        conn_code = -1
-
-        while attempts < max_retry_attempts and conn_code != 204:
+        # retries LOADED/LOADING responses and temporary errors
+        for attempt in self.RETRY_POLICY.attempts():
             conn = req.request()
-            conn_code = conn.code
             if conn.code == 200:
                 logger.info('successful request')
                 data = conn.read()
@@ -176,9 +171,7 @@ class Joanna(object):
                 elif data == "LOADING":
                     logger.info("Nilsimsas loading from db. \
                     Sending request again for results..")
-                    sleep(2)
                 else:
-                    attempts = max_retry_attempts
                     json_data = json.loads(data)
                     for content_id, h in contentIds_nilsimsa_dict.items():
                         if h not in json_data:
@@ -186,7 +179,8 @@ class Joanna(object):
                     return json_data
             elif conn.code == 204:
                 data = conn.read()
-                logger.info('No content found attempts %s %s', attempts, data)
+                logger.info('No content found attempts %s %s', attempt, data)
+                return
             elif conn.code == 400:
                 logger.error('Bad request.. 404 error')
                 data = conn.read()
@@ -194,9 +188,11 @@ class Joanna(object):
             elif conn.code == 500:
                 data = conn.read()
                 logger.error(
-                    'Server failure: attempts %d %s', attempts, data)
-            sleep(max_retry_delay * random())
-            attempts += 1
+                    'Server failure: attempts %d %s', attempt, data)
+
+            if conn.code != 200 and \
+                    not self.RETRY_POLICY.is_retryable_status(conn.code):
+                return
 
     def reload_source_nilsimsa(self, sourceId, portal_db, daysBack=20):
         if daysBack is None:
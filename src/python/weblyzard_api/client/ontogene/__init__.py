@@ -9,6 +9,7 @@ import requests
 import json
 
 from weblyzard_api.client import OGER_API_URL
+from weblyzard_api.util import json_codec
 
 logger = logging.getLogger(__name__)
 
@@ -86,7 +87,8 @@ class OgerClient(object):
             in case something went wrong.
         '''
         url = '/'.join([self.url, self.ANNOTATE_PATH])
-        r = requests.post(url=url, data=json.dumps(weblyzard_document),
+        r = requests.post(url=url, data=json.dumps(weblyzard_document,
+                                                   default=json_codec.default),
                           timeout=self.service_timeout)
         if r.status_code == 200:
             return json.loads(r.content)
@@ -5,9 +5,12 @@
 '''
 from __future__ import unicode_literals
 
+from functools import partial
+
 from weblyzard_api.util.http import Retrieve
-from weblyzard_api.client import MultiRESTClient
+from weblyzard_api.client import MultiRESTClient, AsyncMultiRESTClient
 
+from weblyzard_api.model.bulk import BulkConverter
 from weblyzard_api.model.xml_content import XMLContent
 from weblyzard_api.client import (WEBLYZARD_API_URL, WEBLYZARD_API_USER,
                                   WEBLYZARD_API_PASS)
@@ -102,6 +105,18 @@ class Recognize(MultiRESTClient):
                            ignore_non_sentence=False,
                            add_titles_to_sentences=True)
 
+    @classmethod
+    def convert_documents(cls, xml_documents, version='0.4', processes=1):
+        ''' converts a list of XML strings or XMLContent objects (see
+            :meth:`convert_document`)
+
+        :param processes: the number of processes used for the conversion
+                          (see :class:`~weblyzard_api.model.bulk.BulkConverter`)
+        :returns: the list of converted documents
+        '''
+        return BulkConverter(partial(cls.convert_document, version=version),
+                             processes=processes).map(xml_documents)
+
     def list_profiles(self):
         ''' :returns: a list of all pre-loaded profiles
 
@@ -148,17 +163,8 @@ class Recognize(MultiRESTClient):
 
     def extract_geo_location(self, text, language='en'):
         ''' convenience method to extract a GEO location from free text '''
-        profile_names = ['%s.geo.500000.ng' % language]
-        for profile_name in profile_names:
-            self.add_profile(profile_name)
-        return self.request(path='search',
-                            parameters=text,
-                            query_parameters={'profileNames': profile_names,
-                                              'rescore': 1,
-                                              'buckets': 1,
-                                              'limit': 1,
-                                              'wt': 'compact',
-                                              'debug': False})
+        return self.search_text(['%s.geo.500000.ng' % language], text,
+                                output_format='compact')
 
     def search_text(self, profile_names, text, debug=False, max_entities=1,
                     buckets=1, limit=1, output_format='minimal'):
@@ -176,21 +182,12 @@ class Recognize(MultiRESTClient):
             *'minimal'*, 'annie')
         :rtype: the tagged text
         '''
-        assert output_format in self.OUTPUT_FORMATS
-        if isinstance(profile_names, str):
-            profile_names = (profile_names,)
-
+        profile_names, request = self._prepare_search_text(
+            profile_names, text, debug, max_entities, buckets, limit,
+            output_format)
         for profile_name in profile_names:
             self.add_profile(profile_name)
-
-        return self.request(path='search',
-                            parameters=text,
-                            query_parameters={'profileNames': profile_names,
-                                              'rescore': max_entities,
-                                              'buckets': buckets,
-                                              'limit': limit,
-                                              'wt': output_format,
-                                              'debug': debug})
+        return self.request(**request)
 
     def search_document(self, profile_names, document, debug=False,
                         max_entities=1, buckets=1, limit=1,
@@ -223,42 +220,23 @@ class Recognize(MultiRESTClient):
 
             http://localhost:8080/recognize/searchXml/ofwi.people
         '''
-        assert output_format in self.OUTPUT_FORMATS
-        if not document:
+        profile_names, request = self._prepare_search_document(
+            profile_names, document, debug, max_entities, buckets, limit,
+            output_format)
+        if request is None:
             return
-        if isinstance(profile_names, str):
-            profile_names = [profile_names, ]
 
-        for profile_name in profile_names:
+        # profiles which cannot be loaded are removed from the request
+        for profile_name in list(profile_names):
             try:
                 self.add_profile(profile_name)
             except Exception:
-                profile_names.remove(profile_name)
-                msg = 'Could not load profile %s, skipping' % profile_name
-                logger.warning(msg)
-
-        content_type = 'application/json'
-
-        if 'content_id' in document:
-            search_command = 'search'
-        elif 'id' in document:
-            search_command = 'searchXml'
-        else:
-            raise ValueError("Unsupported input format.")
-
-        return self.request(path=search_command,
-                            parameters=document,
-                            content_type=content_type,
-                            query_parameters={'profileNames': profile_names,
-                                              'rescore': max_entities,
-                                              'buckets': buckets,
-                                              'limit': limit,
-                                              'wt': output_format,
-                                              'debug': debug})
+                self._skip_profile(profile_names, profile_name)
+        return self.request(**request)
 
     def search_documents(self, profile_names, doc_list, debug=False,
                          max_entities=1, buckets=1, limit=1,
-                         output_format='compact'):
+                         output_format='compact', stream=False):
         '''
         :param profile_names: a list of profile names
         :param doc_list: a list of documents to analyze (see example below)         
@@ -269,6 +247,8 @@ class Recognize(MultiRESTClient):
         :param limit: only return that many results
         :param output_format: the output format to use ('standard', \
             *'minimal'*, 'annie')
+        :param stream: return an iterator which decodes the results one by \
+            one, rather than a list
         :rtype: the tagged dictionary
 
         .. note:: Example document
@@ -283,12 +263,115 @@ class Recognize(MultiRESTClient):
               (XMLContent('<?xml version="1.0"...').as_list(),
                XMLContent('<?xml version="1.0"...').as_list(),)
          '''
-        assert output_format in self.OUTPUT_FORMATS
-        if not doc_list or len(doc_list) == 0:
+        profile_names, request = self._prepare_search_documents(
+            profile_names, doc_list, debug, max_entities, buckets, limit,
+            output_format)
+        if request is None:
             return
+
+        for profile_name in profile_names:
+            self.add_profile(profile_name)
+        return self.request(stream=stream, **request)
+
+    @staticmethod
+    def _get_search_parameters(profile_names, debug, max_entities,
+                               buckets, limit, output_format):
+        ''' :returns: the query parameters of a search request '''
+        return {'profileNames': profile_names,
+                'rescore': max_entities,
+                'buckets': buckets,
+                'limit': limit,
+                'wt': output_format,
+                'debug': debug}
+
+    @classmethod
+    def _prepare_search_text(cls, profile_names, text, debug, max_entities,
+                             buckets, limit, output_format):
+        ''' :returns: a tuple (profiles to load, request arguments) for
+                      :meth:`search_text` '''
+        assert output_format in cls.OUTPUT_FORMATS
+        if isinstance(profile_names, str):
+            profile_names = (profile_names,)
+
+        return profile_names, {
+            'path': 'search',
+            'parameters': text,
+            'query_parameters': cls._get_search_parameters(
+                profile_names, debug, max_entities, buckets, limit,
+                output_format)}
+
+    @classmethod
+    def _prepare_search_document(cls, profile_names, document, debug,
+                                 max_entities, buckets, limit, output_format):
+        ''' :returns: a tuple (profiles to load, request arguments) for
+                      :meth:`search_document`; the request arguments are
+                      None if there is nothing to search. The request
+                      shares the list of profiles, i.e. profiles removed
+                      from it are not searched. '''
+        assert output_format in cls.OUTPUT_FORMATS
+        if not document:
+            return (), None
+        profile_names = [profile_names] if isinstance(profile_names, str) \
+            else list(profile_names)
+
+        if 'content_id' in document:
+            search_command = 'search'
+        elif 'id' in document:
+            search_command = 'searchXml'
+        else:
+            raise ValueError("Unsupported input format.")
+
+        return profile_names, {
+            'path': search_command,
+            'parameters': document,
+            'content_type': 'application/json',
+            'query_parameters': cls._get_search_parameters(
+                profile_names, debug, max_entities, buckets, limit,
+                output_format)}
+
+    @staticmethod
+    def _skip_profile(profile_names, profile_name):
+        ''' removes a profile which could not be loaded from the request '''
+        profile_names.remove(profile_name)
+        logger.warning('Could not load profile %s, skipping', profile_name)
+
+    @classmethod
+    def _prepare_search_documents(cls, profile_names, doc_list, debug,
+                                  max_entities, buckets, limit,
+                                  output_format):
+        ''' :returns: a tuple (profiles to load, request arguments) for
+                      :meth:`search_documents`; the request arguments are
+                      None if there is nothing to search. '''
+        assert output_format in cls.OUTPUT_FORMATS
+        if not doc_list or len(doc_list) == 0:
+            return (), None
         if isinstance(profile_names, str):
             profile_names = (profile_names,)
 
+        content_type = 'application/json'
+        if len(doc_list) and isinstance(doc_list[0], str):
+            content_type = 'application/xml'
+
+#         if 'content_id' in doc_list[0]:
+#             search_command = 'searchDocuments'
+
+        if 'id' in doc_list[0]:
+            search_command = 'searchXmlDocuments'
+        else:
+            raise ValueError("Unsupported input format.")
+
+        return cls._get_required_profiles(profile_names, doc_list), {
+            'path': search_command,
+            'parameters': doc_list,
+            'content_type': content_type,
+            'query_parameters': cls._get_search_parameters(
+                profile_names, debug, max_entities, buckets, limit,
+                output_format)}
+
+    @staticmethod
+    def _get_required_profiles(profile_names, doc_list):
+        ''' :returns: the set of profiles required for searching the
+                      given documents '''
         profiles_to_add = []
         for profile_name in profile_names:
             for lang in SUPPORTED_LANGS:
@@ -314,32 +397,7 @@ class Recognize(MultiRESTClient):
                 for profile_name in profile_names:
                     profiles_to_add.append(profile_name)
 
-        # add required profiles
-        for profile_name in set(profiles_to_add):
-            self.add_profile(profile_name)
-
-        content_type = 'application/json'
-        if len(doc_list) and isinstance(doc_list[0], str):
-            content_type = 'application/xml'
-
-#         if 'content_id' in doc_list[0]:
-#             search_command = 'searchDocuments'
-
-        if 'id' in doc_list[0]:
-            search_command = 'searchXmlDocuments'
-        else:
-            raise ValueError("Unsupported input format.")
-
-        return self.request(path=search_command,
-                            parameters=doc_list,
-                            content_type=content_type,
-                            query_parameters={
-                                'profileNames': profile_names,
-                                'rescore': max_entities,
-                                'buckets': buckets,
-                                'limit': limit,
-                                'wt': output_format,
-                                'debug': debug})
+        return set(profiles_to_add)
 
     def get_focus(self, profile_names, doc_list, max_results=1):
         '''
@@ -353,24 +411,36 @@ class Recognize(MultiRESTClient):
 
            http://localhost:8080/recognize/focus?profiles=ofwi.people&profiles=ofwi.organizations.context
         '''
+        profile_names, request = self._prepare_get_focus(
+            profile_names, doc_list, max_results)
+        if request is None:
+            return
+
+        # add missing profiles
+        for profile_name in profile_names:
+            self.add_profile(profile_name)
+        return self.request(**request)
+
+    @staticmethod
+    def _prepare_get_focus(profile_names, doc_list, max_results):
+        ''' :returns: a tuple (profiles to load, request arguments) for
+                      :meth:`get_focus`; the request arguments are None if
+                      there are no documents. '''
         if isinstance(profile_names, str):
             profile_names = (profile_names,)
 
         if not doc_list:
-            return
+            return (), None
         elif 'id' not in doc_list[0]:
             raise ValueError('Unsupported input format.')
 
-        # add missing profiles
-        for profile_name in profile_names:
-            self.add_profile(profile_name)
-
-        return self.request(path='focusDocuments',
-                            parameters=doc_list,
-                            query_parameters={'profiles': profile_names,
-                                              'rescore': max_results,
-                                              'buckets': max_results,
-                                              'limit': max_results})
+        return profile_names, {'path': 'focusDocuments',
+                               'parameters': doc_list,
+                               'query_parameters': {
+                                   'profiles': profile_names,
+                                   'rescore': max_results,
+                                   'buckets': max_results,
+                                   'limit': max_results}}
 
     def status(self):
         '''
@@ -383,3 +453,81 @@ class Recognize(MultiRESTClient):
         :returns: the version of the Recognize web service.
         '''
         return self.request(path='version', return_plain=True)
+
+
+class AsyncRecognize(AsyncMultiRESTClient, Recognize):
+    '''
+    asyncio variant of the :class:`Recognize` client - all service methods
+    return awaitables.
+    '''
+
+    async def add_profile(self, profile_name, force=False):
+        ''' pre-loads the given profile (see :meth:`Recognize.add_profile`)
+        '''
+        if profile_name.startswith(INTERNAL_PROFILE_PREFIX):
+            return
+
+        profile_exists = profile_name in self.profile_cache and not force
+        if not profile_exists:
+            profile_exists = profile_name in await self.list_profiles() \
+                and not force
+
+        if profile_exists and not profile_name in self.profile_cache:
+            self.profile_cache.append(profile_name)
+
+        if not profile_exists:
+            self.profile_cache.append(profile_name)  # only try to add once
+            return await self.request('add_profile/%s' % profile_name)
+
+    async def search_text(self, profile_names, text, debug=False,
+                          max_entities=1, buckets=1, limit=1,
+                          output_format='minimal'):
+        ''' see :meth:`Recognize.search_text` '''
+        profile_names, request = self._prepare_search_text(
+            profile_names, text, debug, max_entities, buckets, limit,
+            output_format)
+        for profile_name in profile_names:
+            await self.add_profile(profile_name)
+        return await self.request(**request)
+
+    async def search_document(self, profile_names, document, debug=False,
+                              max_entities=1, buckets=1, limit=1,
+                              output_format='minimal'):
+        ''' see :meth:`Recognize.search_document` '''
+        profile_names, request = self._prepare_search_document(
+            profile_names, document, debug, max_entities, buckets, limit,
+            output_format)
+        if request is None:
+            return
+
+        for profile_name in list(profile_names):
+            try:
+                await self.add_profile(profile_name)
+            except Exception:
+                self._skip_profile(profile_names, profile_name)
+        return await self.request(**request)
+
+    async def search_documents(self, profile_names, doc_list, debug=False,
+                               max_entities=1, buckets=1, limit=1,
+                               output_format='compact'):
+        ''' see :meth:`Recognize.search_documents` '''
+        profile_names, request = self._prepare_search_documents(
+            profile_names, doc_list, debug, max_entities, buckets, limit,
+            output_format)
+        if request is None:
+            return
+
+        for profile_name in profile_names:
+            await self.add_profile(profile_name)
+        return await self.request(**request)
+
+    async def get_focus(self, profile_names, doc_list, max_results=1):
+        ''' see :meth:`Recognize.get_focus` '''
+        profile_names, request = self._prepare_get_focus(
+            profile_names, doc_list, max_results)
+        if request is None:
+            return
+
+        for profile_name in profile_names:
+            await self.add_profile(profile_name)
+        return await self.request(**request)
@@ -5,12 +5,9 @@
 """
 from __future__ import unicode_literals
 
-import urllib.error
-
-from time import sleep, time
-from random import random
-
 from weblyzard_api.client import MultiRESTClient
+from weblyzard_api.client.backpressure import AdaptiveConcurrencyLimiter
+from weblyzard_api.util.retry import RetryPolicy
 from weblyzard_api.client import (WEBLYZARD_API_URL, WEBLYZARD_API_USER,
                                   WEBLYZARD_API_PASS)
 
@@ -18,8 +15,8 @@ import logging
 logger = logging.getLogger(__name__)
 
 # number of seconds to wait if the web service is occupied
-# - we stop once either DEFAULT_MAX_RETRY_DELAY or DEFAULT_MAX_RETRY_ATTEMPTS is reached
-# . DEFAULT_WAIT_TIME should therefore amount to DEFAULT_MAX_RETRY_DELAY/2 * DEFAULT_MAX_RETRY_ATTEMPTS
+# - we stop once either DEFAULT_WAIT_TIME or DEFAULT_MAX_RETRY_ATTEMPTS is reached
+# - the delay between retries grows exponentially up to DEFAULT_MAX_RETRY_DELAY
 DEFAULT_WAIT_TIME = 20 * 60
 DEFAULT_MAX_RETRY_DELAY = 20
 DEFAULT_MAX_RETRY_ATTEMPTS = 120
@@ -38,6 +35,9 @@ class Recognize(MultiRESTClient):
         * :func:`search_document` for document dictionaries.
     """
     URL_PATH = 'rest/'
+    RETRY_POLICY = RetryPolicy(max_attempts=DEFAULT_MAX_RETRY_ATTEMPTS,
+                               max_delay=DEFAULT_MAX_RETRY_DELAY,
+                               deadline=DEFAULT_WAIT_TIME)
     ATTRIBUTE_MAPPING = {'content_id': 'id',
                          'lang': 'lang',
                          'format': 'format',
@@ -52,14 +52,22 @@ class Recognize(MultiRESTClient):
                                            'dependency': 'dependency'}}
 
     def __init__(self, url=WEBLYZARD_API_URL, usr=WEBLYZARD_API_USER,
-                 pwd=WEBLYZARD_API_PASS, default_timeout=None):
+                 pwd=WEBLYZARD_API_PASS, default_timeout=None,
+                 concurrency_limiter: AdaptiveConcurrencyLimiter=None):
         """
         :param url: URL of the jeremia web service
         :param usr: optional user name
         :param pwd: optional password
+        :param concurrency_limiter: optional
+                    :class:`~weblyzard_api.client.backpressure.AdaptiveConcurrencyLimiter`
+                    which limits the number of concurrent
+                    :meth:`search_documents` requests (e.g. shared between
+                    several clients)
         """
         MultiRESTClient.__init__(self, service_urls=url, user=usr, password=pwd,
                                  default_timeout=default_timeout)
+        self.concurrency_limiter = concurrency_limiter or \
+            AdaptiveConcurrencyLimiter()
         self.profile_cache = []
 
     def status(self):
@@ -180,14 +188,16 @@ class Recognize(MultiRESTClient):
                                               })
 
     def search_documents(self, profile_name, document_list, limit,
-                         wait_time=DEFAULT_WAIT_TIME,
-                         max_retry_delay=DEFAULT_MAX_RETRY_DELAY,
-                         max_retry_attempts=DEFAULT_MAX_RETRY_ATTEMPTS):
+                         wait_time=None, max_retry_delay=None,
+                         max_retry_attempts=None):
         """
         Search the given document for entities specified in the given profiles.
         :param profile_name: the profile to search in
         :param document_list: a list of documents to search in
         :param limit: maximum number of results to return
+        :param wait_time: optional deadline (see :attr:`RETRY_POLICY`)
+        :param max_retry_delay: optional maximum delay between retries
+        :param max_retry_attempts: optional maximum number of attempts
         :rtype: the tagged text
         """
         if not document_list:
@@ -196,31 +206,14 @@ class Recognize(MultiRESTClient):
         content_type = 'application/json'
         search_command = 'search_documents'
 
-        # wait until the web service has available threads for processing
-        # the request
-        attempts = 0
-        start_time = time()
-        while time() - start_time < wait_time and attempts < max_retry_attempts:
-
-            # submit the request
-            # - here we need to check for a 502 and 503 error in
-            #   case that has_queued_threads has not been
-            #   up to date.
-            try:
-                result = self.request(path=search_command,
-                            parameters=document_list,
-                            content_type=content_type,
-                            query_parameters={'profileName': profile_name,
-                                              'limit': limit
-                                              })
-                return result
-            except (urllib.error.HTTPError, urllib.error.URLError) as e:
-                sleep(max_retry_delay * random())
-                attempts = attempts + 1
-
-        return self.request(path=search_command,
-                            parameters=document_list,
-                            content_type=content_type,
-                            query_parameters={'profileName': profile_name,
-                                              'limit': limit
-                                              })
+        # the concurrency limiter adapts the number of concurrent requests
+        # to the web service's load (502 and 503 responses, latency)
+        retry_policy = self.get_retry_policy(wait_time, max_retry_delay,
+                                             max_retry_attempts)
+        return retry_policy.call(
+            self.concurrency_limiter.call, self.request, path=search_command,
+            parameters=document_list,
+            content_type=content_type,
+            query_parameters={'profileName': profile_name,
+                              'limit': limit},
+            pass_through_exceptions=True)
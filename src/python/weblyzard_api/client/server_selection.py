@@ -0,0 +1,184 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+Health-aware selection of the web service used by the
+:class:`weblyzard_api.client.MultiRESTClient`.
+
+Every service keeps track of its
+ * latency (exponentially weighted moving average),
+ * error rate (exponentially weighted moving average) and
+ * number of requests in flight.
+
+Services that fail repeatedly are put behind a circuit breaker - they do
+not receive any requests for `reset_timeout` seconds, after which they are
+tried first by the next request (probe request, half-open state). A
+successful probe closes the circuit again.
+'''
+from threading import Lock
+from time import time
+
+CIRCUIT_CLOSED = 'closed'
+CIRCUIT_OPEN = 'open'
+CIRCUIT_HALF_OPEN = 'half-open'
+
+DEFAULT_EWMA_ALPHA = 0.3
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_TIMEOUT = 30  # in seconds
+
+
+class ServiceStatistics(object):
+    ''' request statistics of a single service '''
+
+    __slots__ = ('latency', 'error_rate', 'in_flight', 'requests', 'failures',
+                 'consecutive_failures', 'state', 'opened_at')
+
+    def __init__(self):
+        self.latency = None
+        self.error_rate = 0.
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.state = CIRCUIT_CLOSED
+        self.opened_at = None
+
+    def score(self):
+        ''' :returns: the expected cost of sending a request to the
+                      service (lower is better) '''
+        # services without measurements are tried first
+        latency = self.latency or 0.
+        return latency * (1 + self.in_flight) * (1 + 4 * self.error_rate)
+
+    def as_dict(self):
+        return {'latency': self.latency,
+                'error_rate': self.error_rate,
+                'in_flight': self.in_flight,
+                'requests': self.requests,
+                'failures': self.failures,
+                'state': self.state}
+
+
+class ServerSelector(object):
+    ''' Orders services by their expected performance and maintains a
+        circuit breaker per service.
+
+        usage::
+
+            for key in selector.order(keys):
+                start_time = selector.start(key)
+                try:
+                    result = ...
+                    selector.success(key, start_time)
+                    break
+                except Exception:
+                    selector.failure(key, start_time)
+    '''
+
+    def __init__(self, keys=(), alpha: float=DEFAULT_EWMA_ALPHA,
+                 failure_threshold: int=DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float=DEFAULT_RESET_TIMEOUT):
+        '''
+        :param keys: the keys of the services to track
+        :param alpha: the smoothing factor of the moving averages
+        :param failure_threshold: number of consecutive failures which
+                                  open the circuit
+        :param reset_timeout: seconds after which an open circuit allows
+                              a probe request
+        '''
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._stats = {key: ServiceStatistics() for key in keys}
+        self._lock = Lock()
+
+    def _get(self, key):
+        try:
+            return self._stats[key]
+        except KeyError:
+            return self._stats.setdefault(key, ServiceStatistics())
+
+    def order(self, keys):
+        ''' :returns: the given service keys ordered by preference
+
+        Services with an open circuit are skipped, unless their reset
+        timeout has expired or no other service is available. Services
+        whose reset timeout has expired come first, so that they are
+        probed even if the other services keep succeeding.
+        '''
+        now = time()
+        with self._lock:
+            probes, available, unavailable = [], [], []
+            for key in keys:
+                stats = self._get(key)
+                if stats.state == CIRCUIT_CLOSED:
+                    available.append(key)
+                elif stats.state == CIRCUIT_OPEN and \
+                        now - stats.opened_at >= self.reset_timeout:
+                    probes.append(key)
+                else:
+                    # open or a probe request is in flight
+                    unavailable.append(key)
+
+            # stable sort - ties keep the configured order
+            available.sort(key=lambda key: self._stats[key].score())
+            unavailable.sort(key=lambda key: self._stats[key].opened_at or 0.)
+            return probes + available if probes or available else unavailable
+
+    def start(self, key) -> float:
+        ''' registers a request to the given service
+        :returns: the request's start time '''
+        now = time()
+        with self._lock:
+            stats = self._get(key)
+            stats.in_flight += 1
+            if stats.state == CIRCUIT_OPEN and \
+                    now - stats.opened_at >= self.reset_timeout:
+                # this request probes the service
+                stats.state = CIRCUIT_HALF_OPEN
+        return now
+
+    def success(self, key, start_time: float):
+        ''' registers the successful completion of a request '''
+        latency = time() - start_time
+        with self._lock:
+            stats = self._get(key)
+            stats.in_flight -= 1
+            stats.requests += 1
+            stats.latency = latency if stats.latency is None else \
+                self.alpha * latency + (1 - self.alpha) * stats.latency
+            stats.error_rate = (1 - self.alpha) * stats.error_rate
+            stats.consecutive_failures = 0
+            stats.state = CIRCUIT_CLOSED
+            stats.opened_at = None
+
+    def failure(self, key, start_time: float):
+        ''' registers a failed request '''
+        # the time spent on failed requests (e.g. timeouts) counts as well
+        latency = time() - start_time
+        with self._lock:
+            stats = self._get(key)
+            stats.in_flight -= 1
+            stats.latency = latency if stats.latency is None else \
+                self.alpha * latency + (1 - self.alpha) * stats.latency
+            stats.requests += 1
+            stats.failures += 1
+            stats.error_rate = self.alpha + (1 - self.alpha) * stats.error_rate
+            stats.consecutive_failures += 1
+            if stats.state == CIRCUIT_HALF_OPEN or \
+                    stats.consecutive_failures >= self.failure_threshold:
+                stats.state = CIRCUIT_OPEN
+                stats.opened_at = time()
+
+    def cancel(self, key):
+        ''' registers a request that has been cancelled before completion '''
+        with self._lock:
+            stats = self._get(key)
+            stats.in_flight -= 1
+            # allow another probe request
+            if stats.state == CIRCUIT_HALF_OPEN:
+                stats.state = CIRCUIT_OPEN
+
+    def get_statistics(self):
+        ''' :returns: a dictionary with the statistics of every service '''
+        with self._lock:
+            return {key: stats.as_dict() for key, stats in self._stats.items()}
@@ -1,8 +1,10 @@
 from weblyzard_api.client import MultiRESTClient
+from weblyzard_api.util.retry import RetryPolicy
 
 
 class TextQualityClient(MultiRESTClient):
     TEXT_QUALITY_PATH = '/1.0/text_quality'
+    RETRY_POLICY = RetryPolicy(max_attempts=2)
 
     def __init__(self, url):
         MultiRESTClient.__init__(self, service_urls=url)
@@ -19,29 +21,18 @@ class TextQualityClient(MultiRESTClient):
         (types are "addition", "contrast", "emphasis", and "order")
         """
 
-        result = None
-        retrycount = 1
-        retries = 0
-        while retries <= retrycount:
-            retries += 1
-            try:
-                result = self.request(
-                    self.TEXT_QUALITY_PATH,
-                    parameters={
-                        'passive': fetch_passive,
-                        'body': body,
-                        'transition_words': fetch_transition_words
-                    }
-                )
-                break
-            except Exception as e:
-                if retries <= retrycount:
-                    pass  # silently retry
-                else:
-                    result = {
-                        'error': 'Request to text quality '
-                                 'webservice timed out %d times' % retries}
-        return result
+        try:
+            return self.RETRY_POLICY.call(
+                self.request, self.TEXT_QUALITY_PATH,
+                parameters={
+                    'passive': fetch_passive,
+                    'body': body,
+                    'transition_words': fetch_transition_words
+                },
+                pass_through_exceptions=True)
+        except Exception as e:
+            return {'error': 'Request to text quality webservice '
+                             'failed: %s' % e}
 
     def get_sentences_count_from_text(self, body: str):
         if body:
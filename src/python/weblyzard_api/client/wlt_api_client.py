@@ -13,6 +13,8 @@ import requests
 
 from typing import List, Dict
 
+from weblyzard_api.util import json_codec
+
 import logging
 logger = logging.getLogger(__name__)
 
@@ -224,7 +226,7 @@ class WltSearchRestApiClient(WltApiClient):
         data = dict(sources=sources, query=query, count=num_keywords,
                     associations=num_associations,
                     fields=fields)
-        data = json.dumps(data)
+        data = json.dumps(data, default=json_codec.default)
         headers = {'Authorization': 'Bearer %s' % auth_token,
                    'Content-Type': 'application/json'}
         url = '/'.join([self.base_url, self.KEYWORD_ENDPOINT])
@@ -268,7 +270,7 @@ class WltMesaApiClient(WltApiClient):
         """ """
         if auth_token is None:
             auth_token = self.auth_token
-        data = json.dumps(data)
+        data = json.dumps(data, default=json_codec.default)
         headers = {'Authorization': 'Bearer %s' % auth_token,
                    'Content-Type': 'application/json'}
         url = '/'.join([self.base_url, self.ENDPOINT])
@@ -12,13 +12,17 @@ from builtins import str
 from builtins import object
 import json
 import hashlib
+import inspect
 import logging
 
+from array import array
 from collections import namedtuple
+from operator import itemgetter
 
 from weblyzard_api.model.parsers.xml_2005 import XML2005
 from weblyzard_api.model.parsers.xml_2013 import XML2013
 from weblyzard_api.model.parsers.xml_deprecated import XMLDeprecated
+from weblyzard_api.util import json_codec
 
 LabeledDependency = namedtuple("LabeledDependency", "parent pos label")
 
@@ -27,6 +31,8 @@ logger = logging.getLogger(__name__)
 
 class CharSpan(object):
 
+    __slots__ = ('span_type', 'start', 'end')
+
     SPAN_TYPE = 'CharSpan'
 
     DICT_MAPPING = {'span_type': 'span_type',
@@ -45,6 +51,26 @@ class CharSpan(object):
     def to_dict(self):
         return {k: getattr(self, v) for k, v in self.DICT_MAPPING.items()}
 
+    @classmethod
+    def get_attribute_names(cls):
+        ''' :returns: the names of the span's attributes (in the order of
+                      their definition) '''
+        names = cls.__dict__.get('_attribute_names')
+        if names is None:
+            names = tuple(name for klass in reversed(cls.__mro__)
+                          for name in klass.__dict__.get('__slots__', ()))
+            cls._attribute_names = names
+        return names
+
+    def get_attributes(self):
+        ''' :returns: a dictionary of the span's attributes (i.e. the
+                      equivalent of `__dict__` for slot-based objects) '''
+        result = {name: getattr(self, name)
+                  for name in self.get_attribute_names()}
+        # subclasses without __slots__
+        result.update(getattr(self, '__dict__', {}))
+        return result
+
     def __eq__(self, other):
         if not isinstance(other, CharSpan):
             # don't attempt to compare against unrelated types
@@ -75,6 +101,8 @@ class CharSpan(object):
 
 class TokenCharSpan(CharSpan):
 
+    __slots__ = ('pos', 'dependency')
+
     SPAN_TYPE = 'TokenCharSpan'
 
     DICT_MAPPING = {'@type': 'span_type',
@@ -106,6 +134,8 @@ class TokenCharSpan(CharSpan):
 
 class SentenceCharSpan(CharSpan):
 
+    __slots__ = ('md5sum', 'sem_orient', 'significance', 'emotions')
+
     SPAN_TYPE = 'SentenceCharSpan'
 
     DICT_MAPPING = {'@type': 'span_type',
@@ -139,6 +169,8 @@ class SentenceCharSpan(CharSpan):
 
 class MultiplierCharSpan(CharSpan):
 
+    __slots__ = ('value', )
+
     SPAN_TYPE = 'MultiplierCharSpan'
 
     DICT_MAPPING = {'@type': 'span_type',
@@ -155,6 +187,8 @@ class MultiplierCharSpan(CharSpan):
 
 class SentimentCharSpan(CharSpan):
 
+    __slots__ = ('value', 'modality')
+
     SPAN_TYPE = 'SentimentCharSpan'
 
     DICT_MAPPING = {'@type': 'span_type',
@@ -172,6 +206,8 @@ class SentimentCharSpan(CharSpan):
 
 class NerCharSpan(CharSpan):
 
+    __slots__ = ('label', )
+
     SPAN_TYPE = 'NamedEntityCharSpan'
 
     DICT_MAPPING = {'@type': 'span_type',
@@ -188,6 +224,8 @@ class NerCharSpan(CharSpan):
 
 class LayoutCharSpan(CharSpan):
 
+    __slots__ = ('layout', 'title', 'level')
+
     SPAN_TYPE = 'LayoutCharSpan'
 
     DICT_MAPPING = {'@type': 'span_type',
@@ -214,19 +252,26 @@ class SpanFactory(object):
         'LayoutCharSpan': LayoutCharSpan
     }
 
-    @classmethod
-    def new_span(cls, span):
-        if isinstance(span, CharSpan):
-            return span
+    # (span type, keys) -> decoder for spans with the given layout
+    _DECODERS = {}
 
-        span_type = None
+    @classmethod
+    def get_span_type(cls, span):
+        ''' :returns: the span type of a span dictionary or None '''
         if '@type' in span:
-            span_type = span['@type']
+            return span['@type']
         elif 'span_type' in span:
-            span_type = span['span_type']
+            return span['span_type']
         elif 'dep' in span:
-            span_type = 'TokenCharSpan'  # TODO: workaround until text_tagger gets fixed
+            return 'TokenCharSpan'  # TODO: workaround until text_tagger gets fixed
+        return None
 
+    @classmethod
+    def new_span(cls, span):
+        if isinstance(span, CharSpan):
+            return span
+
+        span_type = cls.get_span_type(span)
         if span_type is not None and span_type in cls.SPAN_TYPE_TO_CLASS:
             try:
                 return cls.SPAN_TYPE_TO_CLASS[span_type].from_dict(span)
@@ -238,6 +283,72 @@ class SpanFactory(object):
         result = CharSpan.from_dict(span)
         return result
 
+    @classmethod
+    def new_spans(cls, spans):
+        '''
+        Bulk variant of :meth:`new_span` for a whole partition. Spans are
+        decoded by positional constructor calls which are prepared once
+        per span type and key layout.
+        :param spans: a list of span dictionaries and/or CharSpans
+        :returns: the list of CharSpans
+        '''
+        decoders = cls._DECODERS
+        result = []
+        append = result.append
+        last_layout = decoder = None
+        for span in spans:
+            if isinstance(span, CharSpan):
+                append(span)
+                continue
+            layout = (cls.get_span_type(span), tuple(span))
+            if layout != last_layout:
+                try:
+                    decoder = decoders[layout]
+                except KeyError:
+                    decoder = decoders.setdefault(
+                        layout, cls._get_decoder(*layout))
+                last_layout = layout
+            append(decoder(span) if decoder else cls.new_span(span))
+        return result
+
+    @classmethod
+    def _get_decoder(cls, span_type, keys):
+        '''
+        :returns: a function creating spans of the given type from
+                  dictionaries with the given keys or None, if these spans
+                  require the generic (and validating) :meth:`new_span`
+        '''
+        span_class = cls.SPAN_TYPE_TO_CLASS.get(span_type, CharSpan)
+        parameters = list(inspect.signature(
+            span_class.__init__).parameters.values())[1:]
+        names = [p.name for p in parameters]
+        positions = []
+        for key in keys:
+            name = span_class.DICT_MAPPING.get(key, key)
+            if name == 'span_type':
+                positions.append(None)
+            elif name in names:
+                positions.append(names.index(name))
+            else:
+                return None
+        # the span key providing each argument - missing arguments are taken
+        # from `defaults` (their tuple keys never clash with span keys)
+        arguments = {position: key for key, position in zip(keys, positions)
+                     if position is not None}
+        defaults = {}
+        for position, parameter in enumerate(parameters):
+            if position not in arguments:
+                if parameter.default is inspect.Parameter.empty:
+                    return None
+                arguments[position] = (None, position)
+                defaults[(None, position)] = parameter.default
+        get_arguments = itemgetter(*[arguments[position]
+                                     for position in range(len(parameters))])
+
+        def decode(span):
+            return span_class(*get_arguments({**defaults, **span}))
+        return decode
+
 #         if '@type' in span:
 #             span['span_type'] = span['@type']
 #             del span['@type']
@@ -344,6 +455,29 @@ class Sentence(object):
         self.is_title = is_title
         self.dependency = dependency
         self.emotions = emotions
+        # parsed representations of the pos, token and dependency strings
+        self._cache = {}
+
+    def _get_cached(self, name, parse, *sources):
+        '''
+        :param name: the name of the cached representation
+        :param parse: function computing the representation from the sources
+        :param sources: the attributes the representation is derived from
+        :returns: the cached representation, which is recomputed if any of
+                  the source attributes has been replaced since
+        '''
+        try:
+            cached_sources, result = self._cache[name]
+            if all(a is b for a, b in zip(cached_sources, sources)):
+                return result
+        except KeyError:
+            pass
+        except AttributeError:
+            # unpickled sentences from previous versions
+            self._cache = {}
+        result = parse(*sources)
+        self._cache[name] = (sources, result)
+        return result
 
     def as_dict(self):
         '''
@@ -358,6 +492,9 @@ class Sentence(object):
     def set_sentence(self, new_sentence):
         self.value = new_sentence
 
+    def _parse_pos_tags(self, pos):
+        return tuple(pos.strip().split(self.ITEM_DELIMITER)) if pos else None
+
     def get_pos_tags(self):
         '''
         Get the POS Tags as list.
@@ -366,10 +503,8 @@ class Sentence(object):
         >>> sentence.get_pos_tags()
         ['PRP', 'ADV', 'NN']
         '''
-        if self.pos:
-            return self.pos.strip().split(self.ITEM_DELIMITER)
-        else:
-            return None
+        pos_tags = self._get_cached('pos', self._parse_pos_tags, self.pos)
+        return list(pos_tags) if pos_tags is not None else None
 
     def set_pos_tags(self, new_pos_tags):
         if isinstance(new_pos_tags, list):
@@ -402,14 +537,17 @@ class Sentence(object):
     def set_pos_tags_string(self, new_value):
         self.pos = new_value
 
-    def get_tokens(self):
+    def _parse_tokens(self, token, value):
         '''
-        :returns: an iterator providing the sentence's tokens 
+        :returns: a tuple of the tokens and an array of their (start, end)
+                  offsets within the sentence
         '''
-        if not self.token:
-            return
-        correction_offset = int(self.token.split(',')[0] or 0)
-        for token_pos in self.token.split(self.ITEM_DELIMITER):
+        tokens, offsets = [], array('i')
+        if not token:
+            return tuple(tokens), offsets
+        sentence = str(value)
+        correction_offset = int(token.split(',')[0] or 0)
+        for token_pos in token.split(self.ITEM_DELIMITER):
             token_indices = token_pos.split(self.TOKEN_DELIMITER)
             try:
                 start, end = [int(i) - correction_offset for i \
@@ -417,20 +555,40 @@ class Sentence(object):
             except ValueError as e:
                 # occasionally there appear to be missing spaces in token
                 # strings
-                logger.warn('Error parsing tokens for sentence {}; token '
-                            'string was {}; individual token identifier '
-                            'was {}. Original error was: {}'.format(
-                    self.value, self.token, token_pos, e
-                ), exc_info=True)
+                logger.warning('Error parsing tokens for sentence %s; token '
+                               'string was %s; individual token identifier '
+                               'was %s. Original error was: %s', value, token,
+                               token_pos, e, exc_info=True)
                 token_indices = [int(tok) for tok in token_indices]
                 start, end = token_indices[0], token_indices[-1]
-            res = str(self.sentence)[start:end]
+            res = sentence[start:end]
             # de- and encoding sometimes leads to index errors with double-width
             # characters - here we attempt to detect such cases and correct
-            if res.strip() != res:
-                correction_offset += len(res) - len(res.strip())
-                res = res.strip()
-            yield res
+            stripped = res.strip()
+            if stripped != res:
+                correction_offset += len(res) - len(stripped)
+                start += len(res) - len(res.lstrip())
+                res = stripped
+            tokens.append(res)
+            offsets.extend((start, start + len(res)))
+        return tuple(tokens), offsets
+
+    def get_tokens(self):
+        '''
+        :returns: an iterator providing the sentence's tokens 
+        '''
+        tokens, _ = self._get_cached('tokens', self._parse_tokens, self.token,
+                                     self.value)
+        return iter(tokens)
+
+    def get_token_offsets(self):
+        '''
+        :returns: a read-only view of the tokens' offsets within the sentence
+                  (start and end of every token, i.e. [s0, e0, s1, e1, ...])
+        '''
+        _, offsets = self._get_cached('tokens', self._parse_tokens,
+                                      self.token, self.value)
+        return memoryview(offsets).toreadonly()
 
     def is_digit(self, x):
         """built in is_digit rejects negative number strings like -1 (used for
@@ -441,6 +599,42 @@ class Sentence(object):
         except ValueError:
             return False
 
+    def _parse_dependencies(self, dependency, pos):
+        if not dependency:
+            return None
+        result = []
+        pos_tags = self.pos_tags_list
+        deps = dependency.strip().split(self.ITEM_DELIMITER)
+        for index, dep in enumerate(deps):
+            if self.DEPENDENCY_DELIMITER in dep:
+                parent, label = dep.split(self.DEPENDENCY_DELIMITER, 1)
+                if not self.is_digit(parent):
+                    label, parent = parent, label
+                    if not self.is_digit(parent):
+                        logger.info(
+                            'Unable to parse dependeny annotation %s for '
+                            'sentence %s with dependency string %s as tuple '
+                            'of (parent index, dependency label), treating it '
+                            'as parent index only', dep, self.value,
+                            dependency)
+                        parent, label = -1, 'XX'
+            elif self.is_digit(dep):
+                parent, label = dep, None
+                logger.info(
+                    'Unable to parse dependeny annotation %s for sentence %s '
+                    'with dependency string %s as tuple of (parent index, '
+                    'dependency label), treating it as parent index only',
+                    dep, self.value, dependency)
+            else:
+                parent, label = -1, dep
+                logger.info(
+                    'Unable to parse dependeny annotation %s for sentence %s '
+                    'with dependency string %s as tuple of (parent index, '
+                    'dependency label), treating it as dependency label only',
+                    dep, self.value, dependency)
+            result.append(LabeledDependency(parent, pos_tags[index], label))
+        return tuple(result)
+
     def get_dependency_list(self):
         '''
         :returns: the dependencies of the sentence as a list of \
@@ -456,48 +650,9 @@ class Sentence(object):
         LabeledDependency(parent='1', pos='MD', label='OBJ')
         ]
         '''
-        if self.dependency:
-            result = []
-            deps = self.dependency.strip().split(self.ITEM_DELIMITER)
-            for index, dep in enumerate(deps):
-                if self.DEPENDENCY_DELIMITER in dep:
-
-                    parent, label = dep.split(self.DEPENDENCY_DELIMITER, 1)
-                    if not self.is_digit(parent):
-                        try:
-                            label, parent = parent, label
-                            assert self.is_digit(parent)
-                        except AssertionError:
-                            logger.info(
-                                'Unable to parse dependeny annotation {} for sentence '
-                                '{} with dependency string {} as tuple of '
-                                '(parent index, dependency label), treating it as '
-                                'parent index only'.format(dep, self.value,
-                                                           self.dependency))
-                            parent, label = -1, 'XX'
-                elif self.is_digit(dep):
-                    parent, label = dep, None
-                    logger.info(
-                        'Unable to parse dependeny annotation {} for sentence '
-                        '{} with dependency string {} as tuple of '
-                        '(parent index, dependency label), treating it as '
-                        'parent index only'.format(dep, self.value,
-                                                   self.dependency))
-                else:
-                    parent, dep = -1, dep
-                    logger.info(
-                        'Unable to parse dependeny annotation {} for sente'
-                        'nce '
-                        '{} with dependency string {} as tuple of '
-                        '(parent index, dependency label), treating it as '
-                        'dependency label only'.format(dep, self.value,
-                                                       self.dependency))
-                result.append(LabeledDependency(parent,
-                                                self.pos_tags_list[index],
-                                                label))
-            return result
-        else:
-            return None
+        dependencies = self._get_cached('dependency', self._parse_dependencies,
+                                        self.dependency, self.pos)
+        return list(dependencies) if dependencies is not None else None
 
     def set_dependency_list(self, dependencies):
         '''
@@ -539,7 +694,7 @@ class Sentence(object):
         :returns: A JSON string.
         :rtype: str
         '''
-        return json.dumps(self.to_api_dict(version))
+        return json_codec.dumps(self.to_api_dict(version))
 
     def to_api_dict(self, version=1.0):
         '''
@@ -552,13 +707,13 @@ class Sentence(object):
         :rtype: dict
         '''
         key_map = self.API_MAPPINGS[version]
-        return {key_map[key]: value for key, value in
-                self.as_dict().items() if key in key_map and
-                value is not None}
+        return {key_map[key]: value for key, value in self.__dict__.items()
+                if key in key_map and value is not None}
 
     sentence = property(get_sentence, set_sentence)
     pos_tags = property(get_pos_tags, set_pos_tags)
     tokens = property(get_tokens)
+    token_offsets = property(get_token_offsets)
     pos_tags_list = property(get_pos_tags_list, set_pos_tags_list)
     pos_tag_string = property(get_pos_tags_string, set_pos_tags_string)
     dependency_list = property(get_dependency_list, set_dependency_list)
@@ -0,0 +1,272 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+Bulk conversion of documents between the webLyzard XML format, the JSON
+API 1.0 format and :class:`weblyzard_api.model.document.Document` objects.
+
+A :class:`BulkConverter` splits the input into chunks, converts them in a
+pool of worker processes and yields the results in input order. Errors are
+reported per document rather than aborting the conversion::
+
+    from weblyzard_api.model.bulk import (BulkConverter, iter_xml_pages,
+                                          xml_to_api_dict)
+
+    converter = BulkConverter(xml_to_api_dict, processes=8)
+    for result in converter.imap(iter_xml_pages('dump.xml')):
+        if result.error is not None:
+            logger.warning('document %d: %s', result.index, result.error)
+        else:
+            push(result.value)
+    logger.info(converter.statistics)
+
+Conversion functions need to be picklable, i.e. module level functions,
+classmethods or :func:`functools.partial` objects thereof.
+'''
+import io
+import logging
+import os
+import pickle
+import time
+
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+
+from weblyzard_api.model.document import Document
+from weblyzard_api.model.parsers.json_10 import JSON10ParserXMLContent
+from weblyzard_api.model.xml_content import XMLContent
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 50
+
+ConversionResult = namedtuple('ConversionResult', ('index', 'value', 'error'))
+
+
+def xml_to_api_dict(xml):
+    ''' :returns: the JSON API 1.0 dictionary of a webLyzard XML document '''
+    return XMLContent(xml).to_api_dict()
+
+
+def xml_to_json(xml):
+    ''' :returns: the JSON API 1.0 representation of a webLyzard XML
+                  document '''
+    return XMLContent(xml).to_json()
+
+
+def api_dict_to_xml(api_dict):
+    ''' :returns: the webLyzard XML representation of a JSON API 1.0
+                  document (dictionary or JSON string) '''
+    if isinstance(api_dict, (str, bytes)):
+        xml_content = JSON10ParserXMLContent.from_json_string(api_dict)
+    else:
+        xml_content = JSON10ParserXMLContent.from_api_dict(api_dict)
+    return xml_content.get_xml_document()
+
+
+def dict_to_document(document_dict):
+    ''' :returns: the :class:`Document` of the given dictionary or JSON
+                  string '''
+    if isinstance(document_dict, (str, bytes)):
+        return Document.from_json(document_dict)
+    return Document.from_dict(document_dict)
+
+
+def dict_to_xml(document_dict):
+    ''' :returns: the webLyzard XML representation of the given
+                  :class:`Document` dictionary or JSON string '''
+    return dict_to_document(document_dict).to_xml()
+
+
+def iter_xml_pages(source):
+    '''
+    Lazily yields the documents (`page` elements) of a webLyzard XML dump
+    as XML strings.
+
+    :param source: the file name, binary file object or content (str or
+                   bytes) of the dump or of a single document
+    '''
+    if isinstance(source, str) and source.lstrip().startswith('<'):
+        source = io.BytesIO(source.encode('utf-8'))
+    elif isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    for _, page in etree.iterparse(source, events=('end', ), tag='{*}page',
+                                   strip_cdata=False, huge_tree=True):
+        yield etree.tostring(page, encoding='unicode', with_tail=False)
+        page.clear()
+        parent = page.getparent()
+        if parent is not None:
+            while page.getprevious() is not None:
+                del parent[0]
+
+
+def iter_json_lines(source):
+    '''
+    Lazily yields the JSON documents of a file with one document per line.
+
+    :param source: the file name or text file object
+    '''
+    if isinstance(source, str):
+        with open(source, encoding='utf-8') as f:
+            yield from iter_json_lines(f)
+        return
+
+    for line in source:
+        line = line.strip()
+        if line:
+            yield line
+
+
+class ConversionStatistics(object):
+    ''' counts the documents and errors of a bulk conversion '''
+
+    def __init__(self):
+        self.documents = 0
+        self.errors = 0
+        self.elapsed = 0.
+
+    @property
+    def throughput(self):
+        ''' :returns: the number of converted documents per second '''
+        return self.documents / self.elapsed if self.elapsed else 0.
+
+    def __repr__(self):
+        return '<ConversionStatistics: %d documents, %d errors, %.1f s, ' \
+            '%.1f documents/s>' % (self.documents, self.errors, self.elapsed,
+                                   self.throughput)
+
+
+class BulkConverter(object):
+    '''
+    Converts documents in chunks using a pool of worker processes.
+    '''
+
+    def __init__(self, convert, processes=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 max_pending_chunks=None):
+        '''
+        :param convert: the (picklable) function converting a single document
+        :param processes: the number of worker processes (default: the number
+                          of CPUs); documents are converted in the calling
+                          process, if set to 1
+        :param chunk_size: the number of documents sent to a worker at once
+        :param max_pending_chunks: the maximum number of chunks submitted
+                                   to the pool (default: twice the number of
+                                   processes), which bounds the memory
+                                   consumption for large inputs
+        '''
+        self.convert = convert
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.max_pending_chunks = max_pending_chunks or 2 * self.processes
+        self.statistics = ConversionStatistics()
+
+    def imap(self, documents):
+        '''
+        Converts the given documents.
+
+        :param documents: an iterable of documents
+        :returns: an iterator over :class:`ConversionResult` tuples (index,
+                  value, error) in the order of the input documents, where
+                  error is the exception raised for the document or None
+        '''
+        self.statistics = statistics = ConversionStatistics()
+        start = time.perf_counter()
+        index = 0
+        for chunk_results in self._iter_chunk_results(documents):
+            for value, error in chunk_results:
+                statistics.documents += 1
+                if error is not None:
+                    statistics.errors += 1
+                yield ConversionResult(index, value, error)
+                index += 1
+            statistics.elapsed = time.perf_counter() - start
+        logger.info('Converted %d documents (%d errors) in %.1f s '
+                    '(%.1f documents/s).', statistics.documents,
+                    statistics.errors, statistics.elapsed,
+                    statistics.throughput)
+
+    def map(self, documents):
+        '''
+        Converts the given documents.
+
+        :param documents: an iterable of documents
+        :returns: a list of the converted documents
+        :raises: the exception raised for the first document which could not
+                 be converted
+        '''
+        values = []
+        for result in self.imap(documents):
+            if result.error is not None:
+                raise result.error
+            values.append(result.value)
+        return values
+
+    def _iter_chunk_results(self, documents):
+        ''' yields the list of (value, error) tuples of every chunk '''
+        chunks = _iter_chunks(documents, self.chunk_size)
+        if self.processes == 1:
+            for chunk in chunks:
+                yield _convert_chunk(self.convert, chunk, portable=False)
+            return
+
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=self.processes) as executor:
+            try:
+                for chunk in chunks:
+                    pending.append((len(chunk), executor.submit(
+                        _convert_chunk, self.convert, chunk)))
+                    if len(pending) >= self.max_pending_chunks:
+                        yield _get_chunk_results(*pending.popleft())
+                while pending:
+                    yield _get_chunk_results(*pending.popleft())
+            finally:
+                # the consumer stopped early
+                for _, future in pending:
+                    future.cancel()
+
+
+def _iter_chunks(documents, chunk_size):
+    chunk = []
+    for document in documents:
+        chunk.append(document)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _convert_chunk(convert, chunk, portable=True):
+    '''
+    :param portable: ensure that errors can be returned to the parent
+                     process
+    :returns: a list of (value, error) tuples
+    '''
+    results = []
+    for document in chunk:
+        try:
+            results.append((convert(document), None))
+        except Exception as e:
+            results.append((None, _get_portable_error(e) if portable else e))
+    return results
+
+
+def _get_chunk_results(chunk_size, future):
+    try:
+        return future.result()
+    except Exception as e:
+        # the chunk could not be processed (e.g. the worker died or the
+        # results are not picklable)
+        return [(None, e)] * chunk_size
+
+
+def _get_portable_error(error):
+    ''' :returns: the error or a RuntimeError describing it, if the error
+                  cannot be unpickled '''
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return RuntimeError('%s: %s' % (error.__class__.__name__, error))
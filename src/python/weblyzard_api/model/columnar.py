@@ -0,0 +1,211 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+Columnar storage for the partitions of a
+:class:`weblyzard_api.model.document.Document`.
+
+A :class:`ColumnarPartition` stores one column per span attribute instead
+of one object per span:
+
+ * integers (e.g. `start`, `end`) and floats (e.g. `sem_orient`) are kept
+   in :mod:`array` arrays;
+ * strings with few distinct values (e.g. POS tags, dependency labels) are
+   stored as integer codes into a shared :class:`Vocabulary`;
+ * dictionaries with identical keys (e.g. `dependency`) are split into one
+   column per key.
+
+The partition is an immutable sequence, which creates the span objects on
+access - existing code iterating over `Document.partitions` keeps
+working::
+
+    document.to_columnar()
+    for token in document.partitions['TOKEN']:
+        print(token.pos)
+'''
+from array import array
+from collections.abc import Sequence
+from threading import Lock
+
+from weblyzard_api.model import SpanFactory
+
+# strings are encoded, if the number of distinct values does not exceed
+# this share of the column's length - columns of (mostly) unique values such
+# as hashes would otherwise grow the shared vocabulary with every document
+MAX_VOCABULARY_RATIO = 0.25
+# code of None values in encoded string columns
+NONE_CODE = -1
+
+
+class Vocabulary(object):
+    ''' A thread-safe, append-only mapping between strings and codes. '''
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+        self._lock = Lock()
+
+    def encode(self, value: str) -> int:
+        try:
+            return self.codes[value]
+        except KeyError:
+            with self._lock:
+                if value not in self.codes:
+                    self.codes[value] = len(self.values)
+                    self.values.append(value)
+                return self.codes[value]
+
+    def decode(self, code: int) -> str:
+        return None if code == NONE_CODE else self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+
+# vocabulary shared by all columnar partitions
+VOCABULARY = Vocabulary()
+
+
+class EncodedColumn(object):
+    ''' a column of strings (or None) stored as vocabulary codes '''
+
+    __slots__ = ('codes', 'vocabulary')
+
+    def __init__(self, codes: array, vocabulary: Vocabulary):
+        self.codes = codes
+        self.vocabulary = vocabulary
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return EncodedColumn(self.codes[index], self.vocabulary)
+        return self.vocabulary.decode(self.codes[index])
+
+    def __len__(self):
+        return len(self.codes)
+
+
+class StructColumn(object):
+    ''' a column of dictionaries sharing the same keys '''
+
+    __slots__ = ('keys', 'columns')
+
+    def __init__(self, keys: tuple, columns: list):
+        self.keys = keys
+        self.columns = columns
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return StructColumn(self.keys,
+                                [column[index] for column in self.columns])
+        return {key: column[index]
+                for key, column in zip(self.keys, self.columns)}
+
+    def __len__(self):
+        return len(self.columns[0])
+
+
+def encode_column(values: list, vocabulary: Vocabulary=VOCABULARY,
+                  nested: bool=True):
+    '''
+    :param values: the column's values
+    :param vocabulary: the vocabulary used for encoding strings
+    :param nested: whether dictionaries may be split into columns
+    :returns: the most compact lossless representation of the values
+              (an array, EncodedColumn, StructColumn or list)
+    '''
+    types = set(map(type, values))
+    if types == {int}:
+        for typecode in ('i', 'q'):
+            try:
+                return array(typecode, values)
+            except OverflowError:
+                pass
+        return values
+    if types == {float}:
+        return array('d', values)
+    if types <= {str, type(None)} and str in types:
+        if len(set(values)) <= MAX_VOCABULARY_RATIO * len(values):
+            return EncodedColumn(
+                array('i', [NONE_CODE if value is None
+                            else vocabulary.encode(value)
+                            for value in values]), vocabulary)
+    if nested and types == {dict}:
+        keys = tuple(values[0])
+        if all(tuple(value) == keys for value in values):
+            return StructColumn(keys, [
+                encode_column([value[key] for value in values], vocabulary,
+                              nested=False) for key in keys])
+    return values
+
+
+class ColumnarPartition(Sequence):
+    '''
+    An immutable sequence of spans of a single type, stored column-wise.
+    '''
+
+    def __init__(self, span_class, columns: dict):
+        '''
+        :param span_class: the class of the spans
+        :param columns: a dictionary of attribute names and columns
+        '''
+        self.span_class = span_class
+        self.columns = columns
+        self._items = list(columns.items())
+
+    @classmethod
+    def from_spans(cls, spans, vocabulary: Vocabulary=VOCABULARY):
+        '''
+        :param spans: a list of span dictionaries and/or CharSpans
+        :param vocabulary: the vocabulary used for encoding strings
+        :returns: the ColumnarPartition
+        :raises ValueError: if the spans cannot be stored column-wise
+                            (e.g. spans of different types)
+        '''
+        spans = SpanFactory.new_spans(spans)
+        span_classes = set(map(type, spans))
+        if len(span_classes) != 1:
+            raise ValueError('Columnar partitions require exactly one span '
+                             'type (got %s).' % ', '.join(sorted(
+                                 c.__name__ for c in span_classes)))
+        span_class = span_classes.pop()
+        if any(getattr(span, '__dict__', None) for span in spans):
+            raise ValueError('Span class %s stores attributes outside of its '
+                             '__slots__.' % span_class.__name__)
+
+        columns = {name: encode_column([getattr(span, name) for span in spans],
+                                       vocabulary)
+                   for name in span_class.get_attribute_names()}
+        return cls(span_class, columns)
+
+    @property
+    def starts(self):
+        return self.columns['start']
+
+    @property
+    def ends(self):
+        return self.columns['end']
+
+    def __len__(self):
+        return len(self.columns['start'])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ColumnarPartition(self.span_class, {
+                name: column[index] for name, column in self._items})
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('partition index out of range')
+        span = self.span_class.__new__(self.span_class)
+        for name, column in self._items:
+            setattr(span, name, column[index])
+        return span
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence) and not isinstance(other, str):
+            return len(self) == len(other) and all(
+                a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return '%s(%s, %d spans)' % (self.__class__.__name__,
+                                     self.span_class.__name__, len(self))
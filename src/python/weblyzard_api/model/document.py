@@ -7,21 +7,92 @@ Created on Jan 25, 2018
 '''
 from __future__ import unicode_literals
 from builtins import object
-import json
 import html
 
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 from decimal import Decimal
 from itertools import chain
 
 from weblyzard_api.model.parsers.xml_2013 import XML2013
 from weblyzard_api.model import Sentence, SpanFactory, CharSpan
+from weblyzard_api.model.columnar import ColumnarPartition
 from weblyzard_api.model.parsers.xml_2005 import XML2005
 from weblyzard_api.model.parsers.xml_deprecated import XMLDeprecated
+from weblyzard_api.util import json_codec
 from weblyzard_api.model.exceptions import (MissingFieldException,
                                             UnexpectedFieldException)
 from typing import Dict
 
+import logging
+logger = logging.getLogger(__name__)
+
+# types returned as is by Document._dict_transform
+_PLAIN_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+class SpanIndex(object):
+    '''
+    Sorted index over the spans of a single partition, which answers
+    overlap and position queries by bisection instead of scanning the
+    whole partition.
+    '''
+    __slots__ = ('spans', 'order', 'starts', 'ends', 'max_length',
+                 '_first_index')
+
+    def __init__(self, spans):
+        '''
+        :param spans: the partition's spans (CharSpans, dicts or a
+                      ColumnarPartition)
+        '''
+        if isinstance(spans, ColumnarPartition):
+            # query the columns - spans are only created for the results
+            starts, ends = spans.starts, spans.ends
+        else:
+            spans = SpanFactory.new_spans(spans)
+            starts = [span.start for span in spans]
+            ends = [span.end for span in spans]
+        self.spans = spans
+        self.ends = ends
+        self.order = sorted(range(len(spans)), key=starts.__getitem__)
+        self.starts = [starts[i] for i in self.order]
+        # overlapping spans start at most max_length before the search span
+        self.max_length = max([end - start
+                               for start, end in zip(starts, ends)] + [0])
+        self._first_index = None
+
+    def get_overlaps(self, search_span: CharSpan):
+        '''
+        :param search_span: the span to search for overlaps by
+        :returns: all spans overlapping the search span in partition order
+        '''
+        start, end = search_span.start, search_span.end
+        # bisect_left keeps spans starting at `start` if max_length is 0
+        lo = bisect_left(self.starts, start - self.max_length)
+        hi = max(bisect_left(self.starts, end), bisect_right(self.starts, start))
+        ends = self.ends
+        # see Document.overlapping
+        indices = sorted(i for i, other_start in zip(self.order[lo:hi],
+                                                     self.starts[lo:hi])
+                         if (other_start <= start < ends[i])
+                         or (start <= other_start < end))
+        return [self.spans[i] for i in indices]
+
+    def get_first_from(self, position: int):
+        '''
+        :param position: the character position
+        :returns: the first span (in partition order) starting at or after
+                  the given position or None
+        '''
+        if self._first_index is None:
+            # minimum partition index of the spans from a given sort position
+            first_index = [len(self.spans)] * (len(self.order) + 1)
+            for pos in range(len(self.order) - 1, -1, -1):
+                first_index[pos] = min(self.order[pos], first_index[pos + 1])
+            self._first_index = first_index
+        index = self._first_index[bisect_left(self.starts, position)]
+        return self.spans[index] if index < len(self.spans) else None
+
 
 class Document(object):
     # supported partition keys
@@ -76,10 +147,59 @@ class Document(object):
         if partitions is None:
             self.partitions = {}
         else:
-            self.partitions = {label: [SpanFactory.new_span(span) for span in spans]
-                                for label, spans in partitions.items()}
+            self.partitions = {label: SpanFactory.new_spans(spans)
+                               for label, spans in partitions.items()}
         self.header = header if header else {}
         self.annotations = annotations if annotations else []
+        # partition key -> (spans, number of spans, SpanIndex)
+        self._span_index = {}
+
+    def get_span_index(self, partition_key: str) -> SpanIndex:
+        '''
+        Return the (cached) SpanIndex of a partition. The index is rebuilt
+        if the partition has been replaced or its size has changed; call
+        :meth:`invalidate_span_index` after modifying spans in place.
+        :param partition_key: the partition to index
+        :returns: the SpanIndex or None, if the partition does not exist
+        '''
+        spans = self.partitions.get(partition_key)
+        if spans is None:
+            return None
+        cached = self._span_index.get(partition_key)
+        if cached is None or cached[0] is not spans or \
+                cached[1] != len(spans):
+            cached = (spans, len(spans), SpanIndex(spans))
+            self._span_index[partition_key] = cached
+        return cached[2]
+
+    def to_columnar(self, partition_keys=None):
+        '''
+        Convert partitions to the memory efficient, read-only
+        :class:`ColumnarPartition` representation. Partitions which cannot
+        be stored column-wise (e.g. empty partitions or partitions with
+        mixed span types) are kept as lists.
+        :param partition_keys: the partitions to convert (default: all)
+        '''
+        if partition_keys is None:
+            partition_keys = list(self.partitions)
+        for key in partition_keys:
+            spans = self.partitions.get(key)
+            if not spans or isinstance(spans, ColumnarPartition):
+                continue
+            try:
+                self.partitions[key] = ColumnarPartition.from_spans(spans)
+            except ValueError as e:
+                logger.debug('Keeping partition %s as list: %s', key, e)
+
+    def invalidate_span_index(self, partition_key: str=None):
+        '''
+        Drop the cached SpanIndex of the given (or of every) partition.
+        :param partition_key: the partition or None for all partitions
+        '''
+        if partition_key is None:
+            self._span_index.clear()
+        else:
+            self._span_index.pop(partition_key, None)
 
     def get_body(self):
         if self.content is None or len(self.content) == 0:
@@ -113,35 +233,35 @@ class Document(object):
     title = property(get_title, set_title)
 
     def __repr__(self):
-        return 'Document: {}'.format(self.__dict__)
+        return 'Document: {}'.format({k: v for k, v in self.__dict__.items()
+                                      if not k.startswith('_')})
 
     @classmethod
     def _dict_transform(cls, data, mapping=None):
-        ''' 
-        Recursively transform a document object to a JSON serializable dict, 
+        '''
+        Recursively transform a document object to a JSON serializable dict,
         with MAPPING applied as well as empty results removed.
         :param data, the data to be transformed to a dict
         :return a dictionary of a document, ready for JSON serialization
         '''
         if mapping is None:
             mapping = cls.MAPPING
-        if data is None:
-            return None
-        if isinstance(data, str):
+        data_type = type(data)
+        # fast path for the most common (exact) types
+        if data_type in _PLAIN_TYPES:
             return data
-        if isinstance(data, int):
-            return data
-        if isinstance(data, float):
-            return data
-        if isinstance(data, int):
-            return data
-        if isinstance(data, bool):
+        if data_type is dict:
+            return cls._transform_dict(data, mapping)
+        if data_type is list:
+            return [cls._dict_transform(item, mapping) for item in data]
+
+        if isinstance(data, (str, int, float)):
             return data
         if isinstance(data, Decimal):
             return str(data)  # needed for e.g. GEO coordinates
         if isinstance(data, tuple):
             if len(data) == 1:
-                return data[0]
+                return cls._dict_transform(data[0], mapping)
             return data
         if isinstance(data, memoryview):
             data = bytes(data)
@@ -149,24 +269,19 @@ class Document(object):
             return data.decode("utf-8")
         if isinstance(data, datetime):
             return data.strftime("%Y-%m-%d %H:%M:%S")
-        if isinstance(data, list):
-            result = []
-            for item in data:
-                result.append(cls._dict_transform(item, mapping=mapping))
-            return result
+        if isinstance(data, (list, ColumnarPartition)):
+            return [cls._dict_transform(item, mapping) for item in data]
         if isinstance(data, dict):
-            result = {}
-            for key, value in data.items():
-                key = mapping.get(key, key)
-                if value is not None:
-                    value = cls._dict_transform(value, mapping=mapping)
-                    if value is not None:
-                        result[key] = value
-            return result
+            return cls._transform_dict(data, mapping)
+        if isinstance(data, CharSpan) and not getattr(data, '__dict__', None) \
+                and mapping is cls.MAPPING:
+            return cls._get_span_serializer(data_type)(data)
 
         if isinstance(data, object):
+            attributes = data.get_attributes() \
+                if isinstance(data, CharSpan) else data.__dict__
             result = {}
-            for key, value in data.__dict__.items():
+            for key, value in attributes.items():
                 if key in mapping:
                     key = mapping[key]
                 elif key.startswith('_'):
@@ -175,20 +290,83 @@ class Document(object):
                 if value is not None:
                     if key == 'lang':
                         value = value.upper()
-                    value = cls._dict_transform(value, mapping=mapping)
+                    value = cls._dict_transform(value, mapping)
                     if value is not None:
-                        result[key] = cls._dict_transform(
-                            value, mapping=mapping)
+                        result[key] = value
             return result
         return None
 
+    @classmethod
+    def _transform_dict(cls, data, mapping):
+        result = {}
+        for key, value in data.items():
+            if value is None:
+                continue
+            if type(value) not in _PLAIN_TYPES:
+                value = cls._dict_transform(value, mapping)
+                if value is None:
+                    continue
+            result[mapping.get(key, key)] = value
+        return result
+
+    @classmethod
+    def _get_span_serializer(cls, span_class):
+        '''
+        :returns: a function serializing spans of the given class, which
+                  applies the attribute layout and MAPPING computed once
+                  per class
+        '''
+        serializers = cls.__dict__.get('_span_serializers')
+        if serializers is None:
+            serializers = cls._span_serializers = {}
+        try:
+            return serializers[span_class]
+        except KeyError:
+            pass
+
+        mapping = cls.MAPPING
+        layout = [(name, mapping.get(name, name))
+                  for name in span_class.get_attribute_names()
+                  if name in mapping or not name.startswith('_')]
+        transform = cls._dict_transform
+
+        def serialize(span):
+            result = {}
+            for name, key in layout:
+                value = getattr(span, name)
+                if value is None:
+                    continue
+                if type(value) not in _PLAIN_TYPES:
+                    value = transform(value, mapping)
+                    if value is None:
+                        continue
+                result[key] = value
+            return result
+
+        return serializers.setdefault(span_class, serialize)
+
+    @classmethod
+    def _get_inverse_mapping(cls):
+        '''
+        :returns: the (cached) mapping from JSON fields to attributes
+        '''
+        inverse_mapping = cls.__dict__.get('_inverse_mapping')
+        if inverse_mapping is None:
+            # This is tricky ... the mapping cannot be easily inversed
+            # making the md5sum to content_id conversion at the top level
+            # necessary
+            inverse_mapping = {v: k for k, v in cls.MAPPING.items()
+                               if k != 'content_id'}
+            cls._inverse_mapping = inverse_mapping
+        return inverse_mapping
+
     @classmethod
     def from_json(cls, json_payload):
-        ''' 
+        '''
         Convert a JSON object into a content model.
         :param json_payload, the string representation of the JSON content model
         '''
-        parsed_content = json.loads(json_payload, strict=False)
+        parsed_content = json_codec.loads(json_payload, strict=False)
         return cls.from_dict(dict_=parsed_content)
 
     @classmethod
@@ -203,28 +381,37 @@ class Document(object):
             if not required_field in dict_:
                 raise MissingFieldException(required_field)
 
+        supported_fields = cls.__dict__.get('_supported_fields')
+        if supported_fields is None:
+            supported_fields = cls._supported_fields = frozenset(
+                cls.REQUIRED_FIELDS + cls.OPTIONAL_FIELDS)
         for key in dict_.keys():
-            if not key in cls.REQUIRED_FIELDS + cls.OPTIONAL_FIELDS:
+            if not key in supported_fields:
                 raise UnexpectedFieldException(key)
 
-        # This is tricky ... the mapping cannot be easily inversed
-        # making the md5sum to content_id conversion at the top level necessary
-        inverse_mapping = {v: k for k, v in cls.MAPPING.items() if
-                                                    k != 'content_id'}
-        parsed_content = Document._dict_transform(dict_,
-                                                  mapping=inverse_mapping)
+        inverse_mapping = cls._get_inverse_mapping()
+        transform = Document._dict_transform
+        parsed_content = {}
+        partitions = {}
+        for key, value in dict_.items():
+            if value is None:
+                continue
+            if key == 'partitions':
+                # spans are created directly from the (cleaned) dicts
+                partitions = {
+                    label: SpanFactory.new_spans([
+                        span if isinstance(span, CharSpan) else
+                        Document._transform_dict(span, inverse_mapping)
+                        for span in spans])
+                    for label, spans in value.items() if spans is not None}
+                continue
+            value = transform(value, inverse_mapping)
+            if value is not None:
+                parsed_content[inverse_mapping.get(key, key)] = value
         parsed_content['content_id'] = parsed_content.pop('md5sum')
 
-        # populate default dicts:
-        partitions = {label: [SpanFactory.new_span(span) for span in spans]
-                      for label, spans in parsed_content['partitions'].items()} \
-            if 'partitions' in parsed_content else {}
-
-        header = parsed_content['header'] \
-            if 'header' in parsed_content and parsed_content[
-            'header'] is not None else {}
-
-        if not len(header):
+        header = parsed_content.get('header')
+        if not header:
             header = parsed_content['header'] \
                 if 'header' in parsed_content else {}
 
@@ -243,7 +430,7 @@ class Document(object):
     def to_json(self):
         '''
         Serialize a document to JSON '''
-        return json.dumps(self.to_dict())
+        return json_codec.dumps(self.to_dict())
 
     def to_dict(self):
         '''
@@ -299,20 +486,12 @@ class Document(object):
         the search span. 
         :param search_span, the span to search for overlaps by.
         :param target_partition_key, the target partition'''
-        result = []
-
-        if not target_partition_key in self.partitions:
-            return result
-
-        for other_span in self.partitions[target_partition_key]:
-            if not isinstance(other_span, CharSpan):
-                other_span = SpanFactory.new_span(other_span)
-            if not isinstance(search_span, CharSpan):
-                search_span = SpanFactory.new_span(search_span)
-            if self.overlapping(other_span, search_span):
-                result.append(other_span)
-
-        return result
+        index = self.get_span_index(target_partition_key)
+        if index is None:
+            return []
+        if not isinstance(search_span, CharSpan):
+            search_span = SpanFactory.new_span(search_span)
+        return index.get_overlaps(search_span)
 
     def get_pos_for_annotation(self, annotation: Dict):
         """
@@ -320,12 +499,11 @@ class Document(object):
         :param annotation
         :return: the POS of the annotation
         """
-        for token_span in self.partitions[self.TOKEN_KEY]:
-            if not isinstance(token_span, CharSpan):
-                token_span = SpanFactory.new_span(token_span)
-            if token_span.start >= annotation['start']:
-                return token_span.pos
-        return None
+        index = self.get_span_index(self.TOKEN_KEY)
+        if index is None:
+            raise KeyError(self.TOKEN_KEY)
+        token_span = index.get_first_from(annotation['start'])
+        return token_span.pos if token_span is not None else None
 
     def get_sentences(self, zero_based: bool=False,
                       include_title: bool=True,
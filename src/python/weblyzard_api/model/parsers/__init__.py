@@ -11,8 +11,11 @@ from __future__ import unicode_literals
 from builtins import str
 from builtins import zip
 from builtins import object
+import io
 import json
 import logging
+import math
+import re
 import hashlib
 import unicodedata
 
@@ -24,6 +27,7 @@ from weblyzard_api.model.exceptions import (MalformedJSONException,
                                             MissingFieldException,
                                             UnsupportedValueException)
 from weblyzard_api.client.rdf import Namespace
+from weblyzard_api.util import json_codec
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +51,9 @@ class DatesToStrings(json.JSONEncoder):
     def encode(self, obj):
         return super(DatesToStrings, self).encode(self._encode(obj))
 
+    def default(self, obj):
+        return json_codec.default(obj)
+
 
 class JSONParserBase(object):
     '''
@@ -78,12 +85,9 @@ class JSONParserBase(object):
             dict.
         '''
         try:
-            if isinstance(json_string, bytes):
-                json_string = json_string.decode('utf-8')
-
             logger.debug(json_string)
 
-            api_dict = json.loads(json_string)
+            api_dict = json_codec.loads(json_string)
         except Exception as e:
             raise MalformedJSONException(f'JSON could not be parsed: {e}') from e
         return cls.from_api_dict(api_dict)
@@ -209,6 +213,11 @@ class JSONParserBase(object):
         return 'neutral'
 
 
+# mappings which are inverted for loading documents
+MAPPING_NAMES = ('ATTR_MAPPING', 'SENTENCE_MAPPING', 'ANNOTATION_MAPPING',
+                 'FEATURE_MAPPING', 'RELATION_MAPPING')
+
+
 class XMLParser(object):
 
     VERSION = None
@@ -221,6 +230,37 @@ class XMLParser(object):
     FEATURE_MAPPING = {}
     RELATION_MAPPING = {}
     DEFAULT_NAMESPACE = 'wl'
+    # inverse mappings (XML attribute name -> key), computed per class
+    INVERTED_MAPPINGS = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super(XMLParser, cls).__init_subclass__(**kwargs)
+        cls.update_inverted_mappings()
+
+    @classmethod
+    def update_inverted_mappings(cls):
+        '''
+        Precomputes the inverse mappings used for loading documents.
+
+        .. note::
+           call this method after changing a mapping at runtime.
+        '''
+        inverted_mappings = {}
+        for name in MAPPING_NAMES:
+            try:
+                inverted_mappings[name] = cls.invert_mapping(getattr(cls, name))
+            except Exception as e:
+                # e.g. unknown namespaces - reported when used
+                inverted_mappings[name] = e
+        cls.INVERTED_MAPPINGS = inverted_mappings
+
+    @classmethod
+    def get_inverted_mapping(cls, name):
+        ''' :returns: the precomputed inverse of the given mapping '''
+        mapping = cls.INVERTED_MAPPINGS[name]
+        if isinstance(mapping, Exception):
+            raise mapping
+        return mapping
 
     @classmethod
     def get_default_ns(cls):
@@ -228,7 +268,13 @@ class XMLParser(object):
 
     @classmethod
     def remove_control_characters(cls, value):
-        return ''.join(ch for ch in value if unicodedata.category(ch)[0] != 'C')
+        ''' :returns: the value without characters of the unicode
+                      category "C" (control, format, surrogate, private use
+                      and unassigned characters) '''
+        if value.isprintable():
+            # printable strings do not contain any of these characters
+            return value
+        return value.translate(_CONTROL_CHARACTER_TABLE)
 
     @classmethod
     def encode_value(cls, value):
@@ -242,7 +288,7 @@ class XMLParser(object):
             return value.isoformat()
         else:
             try:
-                return json.dumps(value)
+                return json.dumps(value, default=json_codec.default)
             except Exception as e:
                 logger.error('Could not encode %s: %s', value, e)
                 return
@@ -250,6 +296,23 @@ class XMLParser(object):
     @classmethod
     def decode_value(cls, value):
         try:
+            if isinstance(value, str):
+                first = value[:1]
+                if first not in _JSON_START_CHARACTERS:
+                    # the value cannot be decoded by json.loads
+                    return value
+                if first in _JSON_NUMBER_START_CHARACTERS:
+                    # numbers, identifiers such as md5sums and token offsets
+                    match = _JSON_NUMBER.fullmatch(value)
+                    if match is None:
+                        return value
+                    elif not match.group(1):
+                        return int(value)
+                    decoded = float(value)
+                    return value if math.isinf(decoded) else decoded
+
+            # most attribute values are not JSON - the standard library
+            # rejects them faster than a fast backend plus its fallback
             decoded = json.loads(value)
             if decoded in (float('inf'), float('-inf'), float('nan')):
                 raise ValueError('deserializing of invalid json values')
@@ -261,11 +324,25 @@ class XMLParser(object):
 
     @classmethod
     def cast_item(cls, item):
-        ''' '''
-        if item.lower() == 'true':
-            return True
-        elif item.lower() == 'false':
-            return False
+        ''' :returns: the item as bool, int, float or decoded JSON value,
+                      if possible and otherwise the item itself '''
+        if item.isdecimal():
+            try:
+                return int(item)
+            except ValueError:
+                pass  # exceeds the limit for integer string conversion
+        if len(item) in (4, 5):
+            lower_item = item.lower()
+            if lower_item == 'true':
+                return True
+            elif lower_item == 'false':
+                return False
+
+        first = item[:1]
+        if not first or not (first in _NUMBER_OR_JSON_START_CHARACTERS
+                             or first.isdecimal() or first.isspace()):
+            # neither a number nor a JSON value
+            return item
 
         try:
             return int(item)
@@ -299,7 +376,10 @@ class XMLParser(object):
 
     @classmethod
     def is_supported(cls, xml_content):
-        return 'xmlns:wl="{}"'.format(cls.SUPPORTED_NAMESPACE) in xml_content
+        namespace_declaration = 'xmlns:wl="{}"'.format(cls.SUPPORTED_NAMESPACE)
+        if isinstance(xml_content, bytes):
+            namespace_declaration = namespace_declaration.encode('utf-8')
+        return namespace_declaration in xml_content
 
     @classmethod
     def invert_mapping(cls, mapping):
@@ -319,52 +399,173 @@ class XMLParser(object):
 
     @classmethod
     def parse(cls, xml_content, remove_duplicates=True, raise_on_empty=True):
-        ''' '''
-        parser = etree.XMLParser(recover=True, strip_cdata=False)
-        cleaned_xml_content = xml_content.replace('encoding="UTF-8"', '')
-        root = etree.fromstring(cleaned_xml_content,
-                                parser=parser)
-        if root is None:
-            raise ValueError(u'Failed to parse root of xml-content, check if '
-                             'this is valid xml: {}'.format(xml_content))
+        '''
+        Parses a single webLyzard XML document in one pass.
+
+        :param xml_content: the document as str, bytes or binary file object
+        :param remove_duplicates: skip sentences with an already seen md5sum
+        :param raise_on_empty: raise an :class:`EmptySentenceException` for
+                               empty sentences
+        :returns: a tuple (attributes, sentences, title_annotations,
+                  body_annotations, features, relations)
+        '''
+        for result in cls._iter_results(xml_content, remove_duplicates,
+                                        raise_on_empty, pages_only=False):
+            return result
+        raise ValueError(u'Failed to parse root of xml-content, check if '
+                         'this is valid xml: {}'.format(xml_content))
+
+    @classmethod
+    def parse_attributes(cls, xml_content):
+        '''
+        Reads the attributes of the document's root element without parsing
+        the remaining document.
+
+        :param xml_content: the document as str, bytes or binary file object
+        :returns: the document attributes (see :meth:`parse`)
+        '''
+        source, encoding = cls._open_source(xml_content)
+        context = etree.iterparse(source, events=('start', ),
+                                  encoding=encoding, recover=True,
+                                  huge_tree=True)
         try:
-            invert_mapping = cls.invert_mapping(cls.ATTR_MAPPING)
-            attributes = cls.load_attributes(root.attrib,
-                                             mapping=invert_mapping)
-        except Exception as e:
-            logger.warning('Could not process mapping %s: %s',
-                           cls.ATTR_MAPPING, e)
-            attributes = {}
+            for _, element in context:
+                return cls.load_page_attributes(element)
+        except etree.XMLSyntaxError as e:
+            raise ValueError(u'Failed to parse xml-content: {}'.format(e)) \
+                from e
+        raise ValueError(u'Failed to parse root of xml-content, check if '
+                         'this is valid xml: {}'.format(xml_content))
 
-        sentences = cls.load_sentences(
-            root, remove_duplicates=remove_duplicates, raise_on_empty=raise_on_empty)
-        title_sentence_ids = [sentence['md5sum'] for sentence in sentences
-                              if 'is_title' in sentence and sentence['is_title']]
+    @classmethod
+    def iter_documents(cls, source, remove_duplicates=True,
+                       raise_on_empty=True):
+        '''
+        Lazily parses all documents (`page` elements) of a multi-document
+        XML dump with bounded memory.
 
-        title_annotations = []
-        body_annotations = []
-        for annotation in cls.load_annotations(root):
-            if 'md5sum' in annotation and annotation['md5sum'] in title_sentence_ids:
-                title_annotations.append(annotation)
+        :param source: the XML dump as str, bytes or binary file object
+        :returns: an iterator over the :meth:`parse` results of the
+                  individual documents
+        '''
+        return cls._iter_results(source, remove_duplicates, raise_on_empty,
+                                 pages_only=True)
+
+    @classmethod
+    def iter_sentences(cls, source, remove_duplicates=True,
+                       raise_on_empty=False):
+        '''
+        Lazily yields the sentences of the document(s) in source.
+
+        :param source: the document as str, bytes or binary file object
+        :returns: an iterator over the sentence dictionaries
+        '''
+        builder = None
+        for page, kind, element in cls._iter_elements(source):
+            if builder is None:
+                builder = _DocumentBuilder(cls, page, remove_duplicates,
+                                           raise_on_empty)
+            if kind is None:
+                builder = None
+            elif kind == 'sentence':
+                sentence = builder.add_sentence(element)
+                if sentence is not None:
+                    yield sentence
+
+    @classmethod
+    def _iter_results(cls, source, remove_duplicates, raise_on_empty,
+                      pages_only):
+        builder = None
+        for page, kind, element in cls._iter_elements(source, pages_only):
+            if builder is None:
+                builder = _DocumentBuilder(cls, page, remove_duplicates,
+                                           raise_on_empty)
+            if kind is None:
+                yield builder.get_result()
+                builder = None
             else:
-                body_annotations.append(annotation)
+                builder.add(kind, element)
 
-        features = cls.load_features(root)
-        relations = cls.load_relations(root)
-        return attributes, sentences, title_annotations, body_annotations, features, relations
+    @classmethod
+    def _open_source(cls, source):
+        ''' :returns: a tuple (binary file object, encoding override) '''
+        if isinstance(source, str):
+            # the text has already been decoded, i.e. the encoding declared
+            # in the XML header does not apply anymore
+            return io.BytesIO(source.encode('utf-8')), 'utf-8'
+        elif isinstance(source, (bytes, bytearray)):
+            return io.BytesIO(source), None
+        return source, None
+
+    @classmethod
+    def _iter_elements(cls, source, pages_only=False):
+        '''
+        Reads the given source in a single pass and yields the tuples
+         * (page, kind, element) for every sentence, annotation, feature
+           and relation element of a document and
+         * (page, None, None) after a document has been read completely.
+
+        Processed elements are removed from the tree, so that memory
+        consumption does not grow with the document size.
+
+        :param pages_only: only `page` elements are considered as documents
+                           (multi-document dumps) - otherwise the root
+                           element is the document.
+        '''
+        source, encoding = cls._open_source(source)
+        default_ns = cls.get_default_ns()
+        page_tag = '{%s}page' % default_ns
+        element_kinds = {'{%s}%s' % (default_ns, kind): kind
+                         for kind in ('sentence', 'annotation', 'feature',
+                                      'relation')}
+
+        context = etree.iterparse(source, events=('start', 'end'),
+                                  encoding=encoding, recover=True,
+                                  strip_cdata=False, huge_tree=True)
+        page = None
+        try:
+            for event, element in context:
+                if event == 'start':
+                    if page is None and (element.tag == page_tag if pages_only
+                                         else element.getparent() is None):
+                        page = element
+                    continue
+
+                if element is page:
+                    yield page, None, None
+                    page = None
+                    _release(element)
+                elif page is not None and element.getparent() is page:
+                    kind = element_kinds.get(element.tag)
+                    if kind is not None:
+                        yield page, kind, element
+                    _release(element)
+        except etree.XMLSyntaxError as e:
+            raise ValueError(u'Failed to parse xml-content: {}'.format(e)) \
+                from e
+
+    @classmethod
+    def load_page_attributes(cls, page):
+        ''' :returns: the document attributes of the given page element '''
+        try:
+            return cls.load_attributes(
+                page.attrib, mapping=cls.get_inverted_mapping('ATTR_MAPPING'))
+        except Exception as e:
+            logger.warning('Could not process mapping %s: %s',
+                           cls.ATTR_MAPPING, e)
+            return {}
 
     @classmethod
     def load_attributes(cls, attributes, mapping):
         new_attributes = {}
+        if mapping is None:
+            mapping = {}
+        decode_value = cls.decode_value
 
         for key, value in attributes.items():
-            if mapping and key in mapping:
-                key = mapping.get(key, key)
-
-            value = cls.decode_value(value)
-
-            if not value == 'None':
-                new_attributes[key] = value
+            value = decode_value(value)
+            if value != 'None':
+                new_attributes[mapping.get(key, key)] = value
 
         return new_attributes
 
@@ -373,7 +574,7 @@ class XMLParser(object):
         ''' '''
         annotations = []
 
-        annotation_mapping = cls.invert_mapping(cls.ANNOTATION_MAPPING)
+        annotation_mapping = cls.get_inverted_mapping('ANNOTATION_MAPPING')
 
         for annotation_element in root.iterfind('{%s}annotation' % cls.get_default_ns(),
                                                 namespaces=cls.DOCUMENT_NAMESPACES):
@@ -386,64 +587,61 @@ class XMLParser(object):
     def load_sentences(cls, root, remove_duplicates=True, raise_on_empty=False):
         ''' '''
         sentences = []
-        seen_sentences = []
+        seen_sentences = set()
 
-        sentence_mapping = cls.invert_mapping(cls.SENTENCE_MAPPING)
+        sentence_mapping = cls.get_inverted_mapping('SENTENCE_MAPPING')
 
         for sent_element in root.iterfind('{%s}sentence' % cls.get_default_ns(),
                                           namespaces=cls.DOCUMENT_NAMESPACES):
-            if sent_element.text:
-                sent_value = sent_element.text.strip()
-            else:
-                sent_value = ''
-            sent_attributes = cls.load_attributes(sent_element.attrib,
-                                                  mapping=sentence_mapping)
-            sent_attributes['value'] = sent_value
-
-            if 'md5sum' in sent_attributes:
-                sent_id = sent_attributes['md5sum']
-            elif 'id' in sent_attributes:
-                sent_id = sent_attributes['id']
-                sent_attributes['md5sum'] = sent_id
-                del sent_attributes['id']
-            else:
-                sent_id = hashlib.md5(
-                    sent_value.encode('utf-8')).hexdigest()
-                sent_attributes['md5sum'] = sent_id
-
-            if not sent_value:
-                logger.warning('Empty attribute for sentence %s', sent_id)
-                if raise_on_empty:
-                    raise EmptySentenceException
+            sent_attributes = cls.load_sentence(sent_element, sentence_mapping,
+                                                raise_on_empty)
+            sent_id = sent_attributes['md5sum']
             if not sent_id in seen_sentences:
                 sentences.append(sent_attributes)
 
                 if remove_duplicates:
-                    seen_sentences.append(sent_id)
+                    seen_sentences.add(sent_id)
 
         return sentences
 
+    @classmethod
+    def load_sentence(cls, sent_element, mapping, raise_on_empty=False):
+        ''' :returns: the attributes of the given sentence element '''
+        if sent_element.text:
+            sent_value = sent_element.text.strip()
+        else:
+            sent_value = ''
+        sent_attributes = cls.load_attributes(sent_element.attrib,
+                                              mapping=mapping)
+        sent_attributes['value'] = sent_value
+
+        if 'md5sum' in sent_attributes:
+            sent_id = sent_attributes['md5sum']
+        elif 'id' in sent_attributes:
+            sent_id = sent_attributes['id']
+            sent_attributes['md5sum'] = sent_id
+            del sent_attributes['id']
+        else:
+            sent_id = hashlib.md5(
+                sent_value.encode('utf-8')).hexdigest()
+            sent_attributes['md5sum'] = sent_id
+
+        if not sent_value:
+            logger.warning('Empty attribute for sentence %s', sent_id)
+            if raise_on_empty:
+                raise EmptySentenceException
+        return sent_attributes
+
     @classmethod
     def load_features(cls, root):
         ''' '''
         features = {}
 
         # inverse feature mapping for loading
-        feature_mapping = cls.invert_mapping(cls.FEATURE_MAPPING)
+        feature_mapping = cls.get_inverted_mapping('FEATURE_MAPPING')
         for feat_element in root.iterfind('{%s}feature' % cls.get_default_ns(),
                                           namespaces=cls.DOCUMENT_NAMESPACES):
-            feat_attributes = cls.load_attributes(feat_element.attrib,
-                                                  mapping=feature_mapping)
-            if 'key' in feat_attributes and feat_attributes['key'] in features:
-                if not isinstance(features[feat_attributes['key']], list):
-                    features[feat_attributes['key']] = [
-                        features[feat_attributes['key']]]
-                if feat_element.text is not None:
-                    features[feat_attributes['key']].append(
-                        cls.cast_item(feat_element.text.strip()))
-            elif feat_element.text is not None:
-                features[feat_attributes['key']] = cls.cast_item(
-                    feat_element.text.strip())
+            cls.load_keyed_value(features, feat_element, feature_mapping)
         return features
 
     @classmethod
@@ -452,23 +650,28 @@ class XMLParser(object):
         relations = {}
 
         # inverse relation mapping for loading
-        relation_mapping = cls.invert_mapping(cls.RELATION_MAPPING)
+        relation_mapping = cls.get_inverted_mapping('RELATION_MAPPING')
         for rel_element in root.iterfind('{%s}relation' % cls.get_default_ns(),
                                          namespaces=cls.DOCUMENT_NAMESPACES):
-            rel_attributes = cls.load_attributes(rel_element.attrib,
-                                                 mapping=relation_mapping)
-            if 'key' in rel_attributes and rel_attributes['key'] in relations:
-                if not isinstance(relations[rel_attributes['key']], list):
-                    relations[rel_attributes['key']] = [
-                        relations[rel_attributes['key']]]
-                if rel_element.text is not None:
-                    relations[rel_attributes['key']].append(
-                        cls.cast_item(rel_element.text.strip()))
-            elif rel_element.text is not None:
-                relations[rel_attributes['key']] = cls.cast_item(
-                    rel_element.text.strip())
+            cls.load_keyed_value(relations, rel_element, relation_mapping)
         return relations
 
+    @classmethod
+    def load_keyed_value(cls, values, element, mapping):
+        '''
+        adds the value of a feature or relation element to `values`;
+        repeated keys are turned into lists.
+        '''
+        attributes = cls.load_attributes(element.attrib, mapping=mapping)
+        if 'key' in attributes and attributes['key'] in values:
+            if not isinstance(values[attributes['key']], list):
+                values[attributes['key']] = [values[attributes['key']]]
+            if element.text is not None:
+                values[attributes['key']].append(
+                    cls.cast_item(element.text.strip()))
+        elif element.text is not None:
+            values[attributes['key']] = cls.cast_item(element.text.strip())
+
     @classmethod
     def dump_xml_attributes(cls, attributes, mapping, resolve_namespaces=True,
                             xml_encode_values=True):
@@ -567,8 +770,80 @@ class XMLParser(object):
     def dump_xml(cls, titles, attributes, sentences, annotations=None,
                  features=None, relations=None):
         ''' returns a webLyzard XML document '''
-        if annotations is None:
-            annotations = []
+        default_ns = cls.get_default_ns()
+        page_attributes, nsmap, sentences = cls._get_xml_page(
+            titles, attributes, sentences)
+        root = etree.Element('{%s}page' % default_ns, attrib=page_attributes,
+                             nsmap=nsmap)
+        for kind, attrib, text in cls._iter_xml_elements(
+                sentences, annotations, features, relations):
+            element = etree.SubElement(root, '{%s}%s' % (default_ns, kind),
+                                       attrib=attrib)
+            if text is not None:
+                element.text = text
+        # [mig] lxml.etree returns `bytes` if encoding is NOT 'unicode'
+        return etree.tostring(root, encoding='unicode', pretty_print=True)
+
+    @classmethod
+    def write_xml(cls, output, titles, attributes, sentences,
+                  annotations=None, features=None, relations=None):
+        '''
+        Incrementally writes a webLyzard XML document (see :meth:`dump_xml`)
+        without building the document tree in memory.
+
+        :param output: a file name or a binary file-like object
+        '''
+        with etree.xmlfile(output, encoding='utf-8') as xf:
+            cls._write_page(xf, titles, attributes, sentences, annotations,
+                            features, relations)
+
+    @classmethod
+    def write_documents(cls, output, documents, root_tag='documents'):
+        '''
+        Incrementally writes multiple documents into a single XML dump,
+        which can be read with :meth:`iter_documents`.
+
+        :param output: a file name or a binary file-like object
+        :param documents: an iterable of dictionaries with the keyword
+                          arguments of :meth:`write_xml` (titles, attributes,
+                          sentences and optionally annotations, features and
+                          relations)
+        :param root_tag: the tag of the dump's root element
+        :returns: the number of documents written
+        '''
+        count = 0
+        with etree.xmlfile(output, encoding='utf-8') as xf:
+            xf.write_declaration()
+            with xf.element(root_tag):
+                for document in documents:
+                    xf.write('\n')
+                    cls._write_page(xf, **document)
+                    # hand the buffered output over to the file
+                    xf.flush()
+                    count += 1
+                xf.write('\n')
+        return count
+
+    @classmethod
+    def _write_page(cls, xf, titles, attributes, sentences, annotations=None,
+                    features=None, relations=None):
+        ''' writes a single page element to the given xmlfile context '''
+        default_ns = cls.get_default_ns()
+        page_attributes, nsmap, sentences = cls._get_xml_page(
+            titles, attributes, sentences)
+        with xf.element('{%s}page' % default_ns, attrib=page_attributes,
+                        nsmap=nsmap):
+            for kind, attrib, text in cls._iter_xml_elements(
+                    sentences, annotations, features, relations):
+                xf.write('\n  ')
+                with xf.element('{%s}%s' % (default_ns, kind), attrib=attrib):
+                    if text is not None:
+                        xf.write(text)
+            xf.write('\n')
+
+    @classmethod
+    def _get_xml_page(cls, titles, attributes, sentences):
+        ''' :returns: a tuple (page attributes, namespace map, sentences) '''
         required_namespaces = cls.get_required_namespaces(attributes)
         attributes, sentences = cls.pre_xml_dump(titles=titles,
                                                  attributes=attributes,
@@ -583,10 +858,16 @@ class XMLParser(object):
             attributes = cls.clean_attributes(attributes)
         except Exception as e:
             logger.warning(e)
-        root = etree.Element('{%s}page' % cls.get_default_ns(),
-                             attrib=attributes,
-                             nsmap=required_namespaces)
+        return _strip_quotes(attributes), required_namespaces, sentences
 
+    @classmethod
+    def _iter_xml_elements(cls, sentences, annotations=None, features=None,
+                           relations=None):
+        '''
+        Yields the child elements of a page as tuples (kind, attributes,
+        text), where kind is one of sentence, annotation, feature and
+        relation and text is a CDATA object or None.
+        '''
         for sent in sentences:
             sent = sent.as_dict()
             assert isinstance(sent, dict), 'dict required'
@@ -597,17 +878,14 @@ class XMLParser(object):
                 continue
 
             value = cls.get_xml_value(value)
-            sent_attributes = cls.dump_xml_attributes(attributes=sent,
-                                                      mapping=cls.SENTENCE_MAPPING)
-            sent_elem = etree.SubElement(root,
-                                         '{%s}sentence' % cls.get_default_ns(),
-                                         attrib=sent_attributes,
-                                         nsmap=required_namespaces)
             try:
-                sent_elem.text = etree.CDATA(value)
+                text = etree.CDATA(value)
             except Exception as e:
                 logger.debug('Skipping bad cdata: %s (%s)', value, e)
                 continue
+            sent_attributes = cls.dump_xml_attributes(
+                attributes=sent, mapping=cls.SENTENCE_MAPPING)
+            yield 'sentence', _strip_quotes(sent_attributes), text
 
         if annotations:
             if isinstance(annotations, list):
@@ -622,7 +900,6 @@ class XMLParser(object):
                 for annotation in a_items:
                     if not isinstance(annotation, dict):
                         continue
-                    assert isinstance(annotation, dict), 'dict required'
                     if 'entities' in annotation:
                         for entity in annotation['entities']:
                             entity = entity.copy()
@@ -635,44 +912,27 @@ class XMLParser(object):
 
                             annotation_attributes = cls.dump_xml_attributes(
                                 entity, mapping=cls.ANNOTATION_MAPPING)
-
-                            try:
-                                etree.SubElement(
-                                        root,
-                                        f'{cls.get_default_ns()}annotation',
-                                        attrib=annotation_attributes,
-                                        nsmap=required_namespaces)
-                            except Exception as e:
-                                continue
+                            yield 'annotation', \
+                                _strip_quotes(annotation_attributes), None
 
         # feature mappings if specified
-        if features is None:
-            features = {}
-        if cls.FEATURE_MAPPING and len(cls.FEATURE_MAPPING):
+        if features and cls.FEATURE_MAPPING:
             for key, items in features.items():
-                feature_attributes = cls.dump_xml_attributes({'key': key},
-                                                             mapping=cls.FEATURE_MAPPING)
+                feature_attributes = _strip_quotes(cls.dump_xml_attributes(
+                    {'key': key}, mapping=cls.FEATURE_MAPPING))
                 if not isinstance(items, list):
                     items = [items]
 
                 for value in items:
                     try:
-                        value = cls.get_xml_value(value)
-                        feat_elem = etree.SubElement(root,
-                                                     '{%s}feature' % cls.get_default_ns(
-                                                     ),
-                                                     attrib=feature_attributes,
-                                                     nsmap={})
-                        feat_elem.text = etree.CDATA(value)
-
+                        text = etree.CDATA(cls.get_xml_value(value))
                     except Exception as e:
-                        print('Skipping bad cdata: %s (%s)' % (value, e))
+                        logger.warning('Skipping bad cdata: %s (%s)', value, e)
                         continue
+                    yield 'feature', feature_attributes, text
 
         # relation mappings, if specified
-        if relations is None:
-            relations = {}
-        if cls.RELATION_MAPPING and len(cls.RELATION_MAPPING):
+        if relations and cls.RELATION_MAPPING:
             for key, items in relations.items():
 
                 rel_attributes = {'key': key}
@@ -697,24 +957,120 @@ class XMLParser(object):
                     rel_attributes = cls.dump_xml_attributes(rel_attributes,
                                                              mapping=cls.RELATION_MAPPING)
                     try:
-                        urls = cls.get_xml_value(urls)
-                        rel_elem = etree.SubElement(root,
-                                                    '{%s}relation' % cls.get_default_ns(
-                                                    ),
-                                                    attrib=rel_attributes,
-                                                    nsmap={})
-                        rel_elem.text = etree.CDATA(urls)
-
+                        text = etree.CDATA(cls.get_xml_value(urls))
                     except Exception as e:
-                        logger.warning('Skipping bad cdata: %s (%s)', value, e)
+                        logger.warning('Skipping bad cdata: %s (%s)', urls, e)
                         continue
-
-        return etree.tostring(root,
-                              encoding='unicode',
-                              pretty_print=True).replace("&quot;", "")  # [mig] lxml.etree returs `bytes` if encoding is NOT 'unicode'
-        # [mig] somewhere along the migration path, if run by python2, this return above contains double quotes (") and their xml counterparts (&quot;) which is very unhelpful, so we just replace them. please use python3 to not have that issue :)
+                    yield 'relation', _strip_quotes(rel_attributes), text
 
     @classmethod
     def pre_xml_dump(cls, titles, attributes, sentences):
         ''' overriding this functions allows to perform custom cleanup tasks'''
         return attributes, sentences
+
+
+XMLParser.update_inverted_mappings()
+
+
+class _ControlCharacterTable(dict):
+    ''' translation table removing characters of the unicode category "C",
+        which is populated on demand '''
+
+    def __missing__(self, codepoint):
+        result = None if unicodedata.category(chr(codepoint))[0] == 'C' \
+            else codepoint
+        self[codepoint] = result
+        return result
+
+
+_CONTROL_CHARACTER_TABLE = _ControlCharacterTable()
+# the first characters of values which json.loads might accept
+_JSON_START_CHARACTERS = frozenset('{["-0123456789tfnNI \t\n\r')
+_JSON_NUMBER_START_CHARACTERS = frozenset('-0123456789')
+# a JSON number; group 1 is not empty for floating point numbers
+_JSON_NUMBER = re.compile(r'-?(?:0|[1-9][0-9]*)'
+                          r'((?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?)[ \t\n\r]*')
+# the first characters of values which int, float or json.loads might accept
+# (in addition to unicode decimals and whitespace)
+_NUMBER_OR_JSON_START_CHARACTERS = frozenset('+-.{["nNiI')
+
+
+def _strip_quotes(attributes):
+    ''' removes double quotes from the attribute values, which have never
+        been part of serialized documents '''
+    for key, value in attributes.items():
+        if isinstance(value, str) and '"' in value:
+            attributes[key] = value.replace('"', '')
+    return attributes
+
+
+def _release(element):
+    ''' frees an element, which has been processed, and its preceding
+        siblings '''
+    element.clear()
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+class _DocumentBuilder(object):
+    ''' collects the content of a single document while it is parsed '''
+
+    def __init__(self, parser, page, remove_duplicates, raise_on_empty):
+        self.parser = parser
+        self.remove_duplicates = remove_duplicates
+        self.raise_on_empty = raise_on_empty
+        self.attributes = parser.load_page_attributes(page)
+
+        self.sentence_mapping = parser.get_inverted_mapping('SENTENCE_MAPPING')
+        self.annotation_mapping = parser.get_inverted_mapping(
+            'ANNOTATION_MAPPING')
+        self.feature_mapping = parser.get_inverted_mapping('FEATURE_MAPPING')
+        self.relation_mapping = parser.get_inverted_mapping('RELATION_MAPPING')
+
+        self.sentences = []
+        self.seen_sentences = set()
+        self.annotations = []
+        self.features = {}
+        self.relations = {}
+
+    def add(self, kind, element):
+        if kind == 'sentence':
+            sentence = self.add_sentence(element)
+            if sentence is not None:
+                self.sentences.append(sentence)
+        elif kind == 'annotation':
+            self.annotations.append(self.parser.load_attributes(
+                element.attrib, mapping=self.annotation_mapping))
+        elif kind == 'feature':
+            self.parser.load_keyed_value(self.features, element,
+                                         self.feature_mapping)
+        elif kind == 'relation':
+            self.parser.load_keyed_value(self.relations, element,
+                                         self.relation_mapping)
+
+    def add_sentence(self, element):
+        ''' :returns: the sentence or None for duplicates '''
+        sentence = self.parser.load_sentence(element, self.sentence_mapping,
+                                             self.raise_on_empty)
+        sent_id = sentence['md5sum']
+        if sent_id in self.seen_sentences:
+            return None
+        if self.remove_duplicates:
+            self.seen_sentences.add(sent_id)
+        return sentence
+
+    def get_result(self):
+        ''' :returns: the tuple returned by :meth:`XMLParser.parse` '''
+        title_sentence_ids = {sentence['md5sum'] for sentence in self.sentences
+                              if sentence.get('is_title')}
+        title_annotations = []
+        body_annotations = []
+        for annotation in self.annotations:
+            if annotation.get('md5sum') in title_sentence_ids:
+                title_annotations.append(annotation)
+            else:
+                body_annotations.append(annotation)
+        return self.attributes, self.sentences, title_annotations, \
+            body_annotations, self.features, self.relations
@@ -20,18 +20,47 @@ Remove functions:
 from __future__ import unicode_literals
 from builtins import str
 from builtins import object
-import json
+
+import io
 
 from weblyzard_api.model.parsers.xml_deprecated import XMLDeprecated
 from weblyzard_api.model.parsers.xml_2005 import XML2005
 from weblyzard_api.model.parsers.xml_2013 import XML2013
 from weblyzard_api.model.parsers import EmptySentenceException
 from weblyzard_api.model import Sentence, Annotation
+from weblyzard_api.util import json_codec
 
 SENTENCE_ATTRIBUTES = ('pos_tags', 'sem_orient', 'significance', 'md5sum',
                        'pos', 'token', 'dependency')
 
 
+class _LazyAttribute(object):
+    '''
+    An attribute of a lazily parsed :class:`XMLContent` which triggers
+    parsing the document on first access. Values are kept in the instance's
+    `__dict__`, i.e. the layout of parsed objects does not change.
+    '''
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        if instance.__dict__.get('_unparsed') is not None:
+            instance._materialize()
+        try:
+            return instance.__dict__[self.name]
+        except KeyError:
+            # e.g. objects unpickled from former versions
+            raise AttributeError(self.name) from None
+
+    def __set__(self, instance, value):
+        if instance.__dict__.get('_unparsed') is not None:
+            instance._materialize()
+        instance.__dict__[self.name] = value
+
+
 class XMLContent(object):
 
     SUPPORTED_XML_VERSIONS = {XML2005.VERSION: XML2005,
@@ -64,7 +93,25 @@ class XMLContent(object):
                                              'surfaceForm': 'surfaceForm'
                                              }}
 
-    def __init__(self, xml_content, remove_duplicates=True):
+    # attributes which are only materialized on first access, if the
+    # document has been parsed lazily
+    sentence_objects = _LazyAttribute()
+    titles = _LazyAttribute()
+    body_annotations = _LazyAttribute()
+    title_annotations = _LazyAttribute()
+    features = _LazyAttribute()
+    relations = _LazyAttribute()
+
+    def __init__(self, xml_content, remove_duplicates=True, lazy=False):
+        '''
+        :param xml_content: the xml document
+        :param remove_duplicates: skip sentences with an already seen md5sum
+        :param lazy: only parse the document's attributes and defer parsing
+                     sentences, annotations, features and relations to the
+                     first access (an :class:`EmptySentenceException` is
+                     raised at that point rather than on creation)
+        '''
+        self._unparsed = None
         self.xml_version = None
         self.attributes = {}
         self.sentence_objects = []
@@ -76,13 +123,35 @@ class XMLContent(object):
         self.features = {}
         self.relations = {}
 
+        if lazy:
+            self.xml_version = self.get_xml_version(xml_content)
+            if self.xml_version:
+                parser = self.SUPPORTED_XML_VERSIONS[self.xml_version]
+                self.attributes = parser.parse_attributes(xml_content)
+                self._unparsed = xml_content
+            return
+
         result = self.parse_xml_content(xml_content, remove_duplicates)
 
         if result:
             self.xml_version, self.attributes, self.sentence_objects, \
                 self.title_annotations, self.body_annotations, self.titles, \
                 self.features, self.relations = result
-        pass
+
+    def _materialize(self):
+        ''' parses the remaining document of a lazily parsed instance '''
+        _, _, self.__dict__['sentence_objects'], \
+            self.__dict__['title_annotations'], \
+            self.__dict__['body_annotations'], self.__dict__['titles'], \
+            self.__dict__['features'], self.__dict__['relations'] = \
+            self.parse_xml_content(self._unparsed, self.remove_duplicates)
+        self._unparsed = None
+
+    @property
+    def is_parsed(self):
+        ''' :returns: False, if the document's content has not been
+                      materialized yet '''
+        return self.__dict__.get('_unparsed') is None
 
     @classmethod
     def convert(cls, xml_content, target_version):
@@ -157,6 +226,14 @@ class XMLContent(object):
         if not xml_version:
             xml_version = self.xml_version
 
+        return self.SUPPORTED_XML_VERSIONS[xml_version].dump_xml(
+            **self._get_dump_arguments(annotations, features, relations,
+                                       ignore_title))
+
+    def _get_dump_arguments(self, annotations=None, features=None,
+                            relations=None, ignore_title=False):
+        ''' :returns: the keyword arguments of :meth:`XMLParser.dump_xml`
+                      for this document '''
         if not hasattr(self, 'features'):
             self.features = {}
         if features is None:
@@ -171,12 +248,24 @@ class XMLContent(object):
         if ignore_title:
             titles = []
 
-        return self.SUPPORTED_XML_VERSIONS[xml_version].dump_xml(titles=titles,
-                                                                 attributes=self.attributes,
-                                                                 sentences=self.sentences,
-                                                                 annotations=annotations,
-                                                                 features=features,
-                                                                 relations=relations)
+        return {'titles': titles, 'attributes': self.attributes,
+                'sentences': self.sentences, 'annotations': annotations,
+                'features': features, 'relations': relations}
+
+    @classmethod
+    def write_xml_documents(cls, output, xml_contents,
+                            xml_version=XML2013.VERSION):
+        '''
+        Incrementally writes the given documents into a single XML dump.
+
+        :param output: a file name or a binary file-like object
+        :param xml_contents: an iterable of :class:`XMLContent` objects
+        :param xml_version: version of the webLyzard XML format to use
+        :returns: the number of documents written
+        '''
+        return cls.SUPPORTED_XML_VERSIONS[xml_version].write_documents(
+            output, (xml_content._get_dump_arguments()
+                     for xml_content in xml_contents))
 
     def get_plain_text(self, include_title=False):
         ''' :returns: the plain text of the XML content '''
@@ -242,51 +331,36 @@ class XMLContent(object):
         :param ignore_relations: if true, document relations do not get serialized
         :param add_titles_to_sentences: if true, titles are treated as sentences
         '''
-        try:
-            if mapping is None:
-                mapping = self.ATTRIBUTE_MAPPING
-
-            result = self.apply_dict_mapping(self.attributes, mapping)
-            sentence_attr_name = mapping['sentences'] if 'sentences' in mapping else 'sentences'
-
-            if 'sentences_map' in mapping:
-                result[sentence_attr_name] = []
-                sent_mapping = mapping['sentences_map']
-
-                if add_titles_to_sentences and len(self.titles):
-                    sentences = self.titles + self.sentences
-                else:
-                    sentences = self.sentences
-
-                for sent in sentences:
-
-                    if ignore_non_sentence and not sent.pos:
-                        continue
-
-                    sent_attributes = self.apply_dict_mapping(sent.as_dict(),
-                                                              sent_mapping)
-                    result[sentence_attr_name].append(sent_attributes)
-
-            annotation_attr_name = mapping['body_annotations'] \
-                if 'body_annotations' in mapping else 'body_annotations'
-            if 'annotations_map' in mapping:
-                result[annotation_attr_name] = []
-                annotation_mapping = mapping['annotations_map']
-                for annotation in self.body_annotations:
-                    annotation_attributes = self.apply_dict_mapping(annotation.as_dict(),
-                                                                    annotation_mapping)
-                    result[annotation_attr_name].append(annotation_attributes)
-
-            if not ignore_features and self.features:
-                result['features'] = self.features
-
-            if not ignore_relations and self.relations:
-                result['relations'] = self.relations
-
-        except Exception as e:
-            result = self.attributes
-            result.update({'sentences': [sent.as_dict()
-                                         for sent in self.sentences]})
+        if mapping is None:
+            mapping = self.ATTRIBUTE_MAPPING
+
+        result = self.apply_dict_mapping(self.attributes, mapping)
+
+        if 'sentences_map' in mapping:
+            sent_mapping = mapping['sentences_map']
+            sentences = self.sentence_objects
+            if add_titles_to_sentences and self.titles:
+                sentences = self.titles + sentences
+            result[mapping.get('sentences', 'sentences')] = [
+                self.apply_dict_mapping(sent.as_dict(), sent_mapping)
+                for sent in sentences
+                if not ignore_non_sentence or sent.pos]
+
+        if 'annotations_map' in mapping:
+            annotation_mapping = mapping['annotations_map']
+            # annotations are either Annotation objects or dictionaries
+            # (JSON API documents)
+            result[mapping.get('body_annotations', 'body_annotations')] = [
+                self.apply_dict_mapping(
+                    annotation if isinstance(annotation, dict)
+                    else vars(annotation), annotation_mapping)
+                for annotation in self.body_annotations]
+
+        if not ignore_features and self.features:
+            result['features'] = self.features
+
+        if not ignore_relations and self.relations:
+            result['relations'] = self.relations
 
         return result
 
@@ -312,46 +386,75 @@ class XMLContent(object):
         :returns: A dict.
         :rtype: dict
         '''
-        document_dict = self.as_dict()
+        api_dict = self._get_api_header(version)
+        sentences = self._get_api_sentences()
+        if sentences:
+            api_dict['sentences'] = [sentence.to_api_dict(version)
+                                     for sentence in sentences]
+        self._add_api_trailer(api_dict)
+        return api_dict
+
+    def _get_api_header(self, version):
+        ''' :returns: the API dict's document attributes '''
         api_dict = {}
-        for key in self.API_MAPPINGS[version]:
-            if key in document_dict:
-                api_dict[self.API_MAPPINGS[version][key]] = \
-                    document_dict[key]
-        if self.sentences and len(self.sentences) > 0:
-            sentences = [s.to_api_dict(version) for s in self.sentences]
-            api_dict['sentences'] = sentences
-        if self.titles and len(self.titles) > 0:
-            for t in self.titles:
-                api_dict['sentences'] = [t.to_api_dict(
-                    version)] + api_dict.get('sentences', [])
-                if 'title' not in api_dict:
-                    api_dict['title'] = t.value
-#                 elif api_dict['title'] != t.value:
-#                     raise Exception('Mismatch between sentence marked as title and '+\
-#                                     'title attribute:\n'+\
-#                                     '%s != %s' % (t.value, api_dict['title']))
-        annotations = document_dict.get('annotations', None)
-        if annotations:
-            api_dict['annotations'] = annotations
-
-        if self.features and len(self.features) > 0:
+        for key, api_key in self.API_MAPPINGS[version].items():
+            if key in self.attributes:
+                api_dict[api_key] = self.attributes[key]
+        if self.titles and 'title' not in api_dict:
+            api_dict['title'] = self.titles[0].value
+        return api_dict
+
+    def _get_api_sentences(self):
+        ''' :returns: the sentences to serialize, preceded by the titles in
+                      reverse order (as in the former implementation) '''
+        if not self.titles:
+            return self.sentence_objects
+        return self.titles[::-1] + self.sentence_objects
+
+    def _add_api_trailer(self, api_dict):
+        ''' adds features and relations to the given API dict '''
+        if self.features:
             api_dict['features'] = self.features
-        if self.relations and len(self.relations) > 0:
+        if self.relations:
             api_dict['relations'] = self.relations
-        return api_dict
 
-    def to_json(self, version=1.0):
+    def to_json(self, version=1.0, fp=None):
         '''
         Serializes the XMLContent object to JSON according to the
         specified version.
 
         :param version: The version to conform to.
         :type version: float
-        :returns: A JSON string.
+        :param fp: an optional (text or binary) file-like object to which
+                   the JSON document is written sentence by sentence rather
+                   than returned
+        :returns: A JSON string or None, if `fp` has been provided.
         :rtype: str
         '''
-        return json.dumps(self.to_api_dict(version=version))
+        if fp is None:
+            return json_codec.dumps(self.to_api_dict(version=version))
+
+        write = fp.write
+        if isinstance(fp, (io.RawIOBase, io.BufferedIOBase)):
+            write = lambda chunk: fp.write(chunk.encode('utf-8'))
+
+        api_dict = self._get_api_header(version)
+        sentences = self._get_api_sentences()
+        self._add_api_trailer(api_dict)
+        header = json_codec.dumps(api_dict, compact=True)
+        if not sentences:
+            write(header)
+            return
+
+        write(header[:-1] + (',"sentences":[' if api_dict
+                             else '"sentences":['))
+        separator = ''
+        for sentence in sentences:
+            write(separator)
+            write(json_codec.dumps(sentence.to_api_dict(version),
+                                   compact=True))
+            separator = ','
+        write(']}')
 
     def _get_attribute(self, attr_name):
         ''' ::returns: the attribute for the given name '''
@@ -0,0 +1,86 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import io
+import json
+import unittest
+
+from pytest import raises
+
+from weblyzard_api.client.jesaja import Jesaja
+from weblyzard_api.client.recognize import Recognize
+from weblyzard_api.model import bulk
+from weblyzard_api.model.bulk import BulkConverter
+from weblyzard_api.model.document import Document
+from weblyzard_api.model.parsers import EmptySentenceException
+from weblyzard_api.model.xml_content import XMLContent
+from weblyzard_api.tests.always_run.model import test_json2018
+
+PAGE = '''<wl:page xmlns:wl="http://www.weblyzard.com/wl/2013#" wl:id="{0}"
+          xml:lang="en" dc:identifier="http://www.weblyzard.com/{0}"
+          xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <wl:sentence wl:id="{0}" wl:pos="NN VBZ ."><![CDATA[Doc {0} is.]]></wl:sentence>
+</wl:page>'''
+
+
+class TestBulkConverter(unittest.TestCase):
+
+    def setUp(self):
+        self.documents = [PAGE.format(i) for i in range(20)]
+        self.expected = [XMLContent(xml).to_api_dict()
+                         for xml in self.documents]
+
+    def test_imap(self):
+        documents = list(self.documents)
+        # empty sentences raise an EmptySentenceException
+        documents[3] = documents[3].replace('Doc 3 is.', '')
+        for processes in (1, 2):
+            converter = BulkConverter(bulk.xml_to_api_dict,
+                                      processes=processes, chunk_size=3)
+            results = list(converter.imap(iter(documents)))
+            assert [r.index for r in results] == list(range(20))
+            assert isinstance(results[3].error, EmptySentenceException)
+            assert [r.value for r in results if r.index != 3] == \
+                self.expected[:3] + self.expected[4:]
+            assert converter.statistics.documents == 20
+            assert converter.statistics.errors == 1
+
+            with raises(EmptySentenceException):
+                converter.map(documents)
+
+    def test_iter_xml_pages(self):
+        output = io.BytesIO()
+        XMLContent.write_xml_documents(
+            output, (XMLContent(xml) for xml in self.documents))
+        assert BulkConverter(bulk.xml_to_api_dict, processes=2).map(
+            bulk.iter_xml_pages(output.getvalue())) == self.expected
+        assert [bulk.xml_to_api_dict(page) for page in
+                bulk.iter_xml_pages(self.documents[0])] == self.expected[:1]
+
+    def test_conversions(self):
+        api_dict = self.expected[0]
+        xml = bulk.api_dict_to_xml(api_dict)
+        assert bulk.api_dict_to_xml(json.dumps(api_dict)) == xml
+        result = bulk.xml_to_api_dict(xml)
+        assert result['uri'] == api_dict['uri']
+        assert result['sentences'][0]['value'] == 'Doc 0 is.'
+        assert json.loads(bulk.xml_to_json(xml)) == result
+
+        document_json = test_json2018.TestJSON2018Parser.JSON_2018
+        lines = io.StringIO('%s\n\n%s\n' % (document_json.replace('\n', ''),
+                                            document_json.replace('\n', '')))
+        documents = BulkConverter(bulk.dict_to_document, processes=2).map(
+            bulk.iter_json_lines(lines))
+        assert len(documents) == 2
+        assert documents[0].to_dict() == \
+            Document.from_json(document_json).to_dict()
+        assert bulk.dict_to_xml(document_json) == documents[1].to_xml()
+
+    def test_clients(self):
+        assert Jesaja.get_documents(self.documents, processes=2) == \
+            [Jesaja.convert_document(xml) for xml in self.documents]
+        assert Recognize.convert_documents(self.documents, processes=2) == \
+            [Recognize.convert_document(xml) for xml in self.documents]
+
+
+if __name__ == '__main__':
+    unittest.main()
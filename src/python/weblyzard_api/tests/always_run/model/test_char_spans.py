@@ -48,3 +48,43 @@ class TestSpanFactory(unittest.TestCase):
         assert not hasattr(sentence_span, 'id')
         assert getattr(sentence_span, 'md5sum', None)
         assert sentence_span.md5sum == dict_sentence_span['id']
+
+    def test_new_spans(self):
+        dict_spans = [
+            {"@type": "TokenCharSpan", "start": 0, "end": 3, "pos": "NN",
+             "dependency": {"label": "DEP", "parent": 0}},
+            {"@type": "TokenCharSpan", "start": 4, "end": 6},
+            {"dep": {"label": "DEP", "parent": 0}, "start": 7, "end": 9},
+            {"@type": "SentenceCharSpan", "start": 0, "end": 9,
+             "id": "abc", "semOrient": 0.5},
+            {"@type": "SentimentCharSpan", "start": 0, "end": 3,
+             "value": 1.0},
+            {"@type": "UnknownCharSpan", "start": 0, "end": 9},
+            {"start": 0, "end": 9},
+            CharSpan(1, 2)]
+        spans = SpanFactory.new_spans(dict_spans)
+        assert spans == [SpanFactory.new_span(span) for span in dict_spans]
+        assert [type(span) for span in spans] == [
+            TokenCharSpan, TokenCharSpan, TokenCharSpan, SentenceCharSpan,
+            SentimentCharSpan, CharSpan, CharSpan, CharSpan]
+        assert spans[1].pos == TokenCharSpan.DEFAULT_POS
+        assert spans[3].md5sum == 'abc' and spans[3].emotions == {}
+        assert spans[-1] is dict_spans[-1]
+
+        # invalid spans are rejected as in new_span
+        with pytest.raises(TypeError):
+            SpanFactory.new_spans([{"@type": "TokenCharSpan", "start": 0,
+                                    "end": 87, "sem_orient": 0.67922089}])
+        with pytest.raises(TypeError):
+            SpanFactory.new_spans([{"@type": "SentimentCharSpan",
+                                    "start": 0, "end": 87}])
+
+    def test_slots(self):
+        span = SentenceCharSpan(start=0, end=9, md5sum='abc')
+        assert not hasattr(span, '__dict__')
+        with pytest.raises(AttributeError):
+            span.unknown = 1
+        assert span.get_attributes() == {
+            'span_type': 'SentenceCharSpan', 'start': 0, 'end': 9,
+            'md5sum': 'abc', 'sem_orient': 0.0, 'significance': 0.0,
+            'emotions': {}}
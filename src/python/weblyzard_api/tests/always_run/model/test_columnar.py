@@ -0,0 +1,101 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import unittest
+
+from array import array
+
+from pytest import raises
+
+from weblyzard_api.model import CharSpan, TokenCharSpan, SentenceCharSpan
+from weblyzard_api.model.columnar import ColumnarPartition, EncodedColumn, \
+    StructColumn, Vocabulary, encode_column
+from weblyzard_api.model.document import Document
+from weblyzard_api.tests.always_run.model import test_json2018
+
+
+class TestColumnarPartition(unittest.TestCase):
+
+    TOKENS = [{'@type': 'TokenCharSpan', 'start': i * 4, 'end': i * 4 + 3,
+               'pos': ('NN', 'VBZ', 'JJ')[i % 3],
+               'dependency': {'parent': i - 1, 'label': 'dep'}}
+              for i in range(100)]
+
+    def test_encode_column(self):
+        vocabulary = Vocabulary()
+        assert encode_column([1, 2, 3]).typecode == 'i'
+        assert encode_column([1, 2 ** 40]).typecode == 'q'
+        assert isinstance(encode_column([1., 2.5]), array)
+        # mixed types and large numbers are kept as is
+        assert encode_column([1, 2.5]) == [1, 2.5]
+        assert encode_column([True, 1]) == [True, 1]
+        assert encode_column([2 ** 70]) == [2 ** 70]
+
+        values = ['NN', None, 'NN', 'VB'] * 4
+        column = encode_column(values, vocabulary)
+        assert isinstance(column, EncodedColumn)
+        assert [column[i] for i in range(16)] == values
+        assert len(vocabulary) == 2
+
+        # columns with (mostly) unique strings are not encoded
+        values = ['%032x' % i for i in range(100)]
+        assert encode_column(values, vocabulary) == values
+
+        column = encode_column([{'a': 1, 'b': 'x'}, {'a': 2, 'b': 'y'}])
+        assert isinstance(column, StructColumn)
+        assert column[1] == {'a': 2, 'b': 'y'}
+        values = [{'a': 1}, {'b': 1}]
+        assert encode_column(values) == values
+
+    def test_bounded_vocabulary(self):
+        vocabulary = Vocabulary()
+        sizes = []
+        for document in range(2000):
+            sentences = [{'@type': 'SentenceCharSpan', 'start': i * 10,
+                          'end': i * 10 + 9, 'md5sum': '%032x' % (
+                              document * 5 + i)} for i in range(5)]
+            ColumnarPartition.from_spans(sentences, vocabulary)
+            ColumnarPartition.from_spans(self.TOKENS, vocabulary)
+            sizes.append(len(vocabulary))
+        # only the tags are encoded, the unique md5sums are not
+        assert sizes[0] == sizes[-1] == 6
+
+    def test_partition(self):
+        spans = [TokenCharSpan.from_dict(span) for span in self.TOKENS]
+        partition = ColumnarPartition.from_spans(self.TOKENS)
+        assert len(partition) == 100
+        assert list(partition) == spans
+        assert partition == spans
+        assert partition[-1] == spans[-1]
+        assert partition[10:20] == spans[10:20]
+        assert isinstance(partition[10:20], ColumnarPartition)
+        assert isinstance(partition.columns['pos'], EncodedColumn)
+        assert isinstance(partition.columns['dependency'], StructColumn)
+        with raises(IndexError):
+            partition[100]
+
+        with raises(ValueError):
+            ColumnarPartition.from_spans([CharSpan(0, 1),
+                                          SentenceCharSpan(0, 1)])
+
+    def test_document(self):
+        document = Document.from_json(
+            test_json2018.TestJSON2018Parser.JSON_2018)
+        expected_dict = document.to_dict()
+        expected_sentences = [s.as_dict() for s in document.get_sentences()]
+        document.partitions['MIXED'] = [CharSpan(0, 1),
+                                        SentenceCharSpan(0, 1)]
+
+        document.to_columnar()
+        assert isinstance(document.partitions['TOKEN'], ColumnarPartition)
+        assert isinstance(document.partitions['MIXED'], list)
+        del document.partitions['MIXED']
+
+        assert document.to_dict() == expected_dict
+        assert [s.as_dict() for s in document.get_sentences()] == \
+            expected_sentences
+        assert document.get_pos_for_annotation({'start': 21}) == 'NN'
+        assert document.title == '1 Corinthians 13:4-7'
+
+
+if __name__ == '__main__':
+    unittest.main()
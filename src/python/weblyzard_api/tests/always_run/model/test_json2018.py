@@ -4,6 +4,9 @@ from __future__ import unicode_literals
 import unittest
 import json
 
+from random import Random
+
+from weblyzard_api.model import CharSpan
 from weblyzard_api.model.document import Document
 
 
@@ -332,7 +335,76 @@ class TestJSON2018Parser(unittest.TestCase):
         pprint(json.dumps(result))
         assert result == expected_json
 
+    def test_dict_transform(self):
+        from datetime import datetime
+        from decimal import Decimal
+
+        document = Document.from_json(self.JSON_2018)
+        document.header = {'date': datetime(2020, 1, 2, 3, 4, 5),
+                           'geo': (Decimal('1.5'), ), 'sem_orient': 1,
+                           'author': None}
+        result = document.to_dict()
+        assert result['header'] == {'date': '2020-01-02 03:04:05',
+                                    'geo': '1.5', 'semOrient': 1}
+        assert result['lang'] == 'EN'
+        assert result['partitions']['SENTENCE'][0] == {
+            '@type': 'SentenceCharSpan', 'start': 0, 'end': 20,
+            'id': 'asdfasdmasdnsd23232', 'semOrient': 1.0,
+            'significance': 0.1231, 'emotions': {}}
+        assert Document.from_dict(result).to_dict() == result
+
+        # None values are ignored
+        document_dict = json.loads(self.JSON_2018)
+        document_dict['nilsimsa'] = None
+        document_dict['partitions']['SENTENCE'][0]['semOrient'] = None
+        document = Document.from_dict(document_dict)
+        assert document.nilsimsa is None
+        assert document.partitions['SENTENCE'][0].sem_orient == 0.0
+
+    def test_span_index(self):
+        document = Document.from_json(self.JSON_2018)
+        sentences = document.get_sentences()
+        assert [s.is_title for s in sentences] == [True, False, False]
+        assert sentences[1].pos == 'NN VBZ NN , NN VBZ NN .'
+        assert document.get_pos_for_annotation({'start': 21}) == 'NN'
+        assert document.get_pos_for_annotation({'start': 200}) is None
+
+        # the index is rebuilt if a partition changes
+        document.partitions['TITLE'].append(CharSpan(21, 30))
+        assert [s.is_title for s in document.get_sentences()] == \
+            [True, True, False]
+        document.set_title(document.content[52:60])
+        assert [s.is_title for s in document.get_sentences()] == \
+            [False, False, True]
+
+    def test_span_index_overlaps(self):
+        random = Random(42)
+        document = Document(content_id=1, content='x' * 100,
+                            content_type='text/plain', lang='en')
+        spans = []
+        for _ in range(200):
+            start = random.randint(0, 90)
+            spans.append(CharSpan(start, start + random.randint(0, 10)))
+        document.partitions['LINE'] = spans
+
+        for _ in range(200):
+            start = random.randint(0, 95)
+            search_span = CharSpan(start, start + random.randint(0, 5))
+            expected = [span for span in spans
+                        if Document.overlapping(span, search_span)]
+            assert document.get_partition_overlaps(
+                search_span, 'LINE') == expected
+        assert document.get_partition_overlaps(search_span, 'TOKEN') == []
 
+    def test_span_index_zero_length_overlaps(self):
+        document = Document(content_id=1, content='x' * 20,
+                            content_type='text/plain', lang='en')
+        spans = [CharSpan(5, 5), CharSpan(8, 8), CharSpan(12, 12)]
+        document.partitions['LINE'] = spans
+        assert document.get_partition_overlaps(CharSpan(5, 9), 'LINE') == \
+            spans[:2]
+        assert document.get_partition_overlaps(CharSpan(8, 8), 'LINE') == []
+        assert document.get_partition_overlaps(CharSpan(9, 12), 'LINE') == []
 
 
 if __name__ == '__main__':
@@ -5,13 +5,17 @@ from __future__ import print_function
 from __future__ import unicode_literals
 from builtins import str
 from builtins import zip
+import io
 import unittest
 import json
 
+from gzip import GzipFile
+from pickle import load
 from pprint import pprint
 
 from weblyzard_api.model.xml_content import Sentence, XMLContent
-from weblyzard_api.tests.test_helper import get_test_data
+from weblyzard_api.model.parsers.xml_2013 import XML2013
+from weblyzard_api.tests.test_helper import get_full_path, get_test_data
 from weblyzard_api.model import LabeledDependency
 
 
@@ -150,6 +154,29 @@ class TestXMLContent(unittest.TestCase):
         assert xml.relations and 'http://www.twitter.com/original_tweet1' in xml.relations['retweeted_from']
         pass
 
+    def test_lazy(self):
+        for xml_content in (self.xml_content1, self.xml_content3):
+            xml = XMLContent(xml_content)
+            lazy_xml = XMLContent(xml_content, lazy=True)
+            # header attributes are available without parsing the content
+            assert lazy_xml.attributes == xml.attributes
+            assert lazy_xml.get_content_id() == xml.get_content_id()
+            assert lazy_xml.get_lang() == xml.get_lang()
+            assert lazy_xml.get_nilsimsa() == xml.get_nilsimsa()
+            assert not lazy_xml.is_parsed
+
+            assert lazy_xml.as_dict() == xml.as_dict()
+            assert lazy_xml.is_parsed
+            assert lazy_xml.features == xml.features
+            assert lazy_xml.relations == xml.relations
+            assert lazy_xml.get_xml_document() == xml.get_xml_document()
+
+        # assigning values materializes the remaining content first
+        xml = XMLContent(self.xml_content3, lazy=True)
+        xml.features = {}
+        assert xml.features == {} and xml.relations
+        assert XMLContent(None, lazy=True).get_sentences() == []
+
     def test_supported_version(self):
 
         new_xml = '''
@@ -338,6 +365,58 @@ class TestXMLContent(unittest.TestCase):
                                   add_titles_to_sentences=True)
         assert len(result3['sentence']) == 2
 
+    def test_as_dict_annotations(self):
+        xml_obj = XMLContent(get_test_data('successful_xml.xml'))
+        result = xml_obj.as_dict()
+        assert len(result['sentences']) == len(xml_obj.sentences)
+        assert result['annotations'] == [
+            {key: getattr(annotation, key) for key in
+             XMLContent.ATTRIBUTE_MAPPING['annotations_map']}
+            for annotation in xml_obj.body_annotations]
+        assert 'sentences' not in xml_obj.attributes
+
+    def test_to_json(self):
+        for xml_content in (self.xml_content1, self.xml_content3):
+            xml_obj = XMLContent(xml_content)
+            api_dict = xml_obj.to_api_dict()
+            assert json.loads(xml_obj.to_json()) == api_dict
+            # titles precede the sentences
+            assert api_dict['sentences'][0]['value'] == \
+                xml_obj.all_sentences[0].value
+
+            # streaming to text and binary files
+            for fp in (io.StringIO(), io.BytesIO()):
+                assert xml_obj.to_json(fp=fp) is None
+                assert json.loads(fp.getvalue()) == api_dict
+
+    def test_write_xml_documents(self):
+        xml_contents = [XMLContent(self.xml_content2),
+                        XMLContent(self.xml_content3)]
+        output = io.BytesIO()
+        assert XMLContent.write_xml_documents(output, xml_contents) == 2
+        output.seek(0)
+        documents = list(XML2013.iter_documents(output))
+        assert documents == [XML2013.parse(xml.get_xml_document())
+                             for xml in xml_contents]
+
+    def test_quotes_in_titles(self):
+        ''' a literal "&quot;" in the title is kept in the title sentence '''
+        with GzipFile(get_full_path('xml_documents.pickle.gz')) as f:
+            documents = load(f)
+
+        quoted = 0
+        for document in documents:
+            xml_content = XMLContent(document)
+            if '&quot;' in (xml_content.title or ''):
+                assert '<![CDATA[%s]]>' % xml_content.title in \
+                    xml_content.get_xml_document()
+                quoted += 1
+        assert quoted == 32
+
+        xml = XMLContent(documents[21]).get_xml_document()
+        assert '<![CDATA[CHEMTRAILS ARE GOING TO KILL US &quot; GLOBAL ' \
+            'DIMMING &quot;]]>' in xml
+
     def test_2013_to_2005(self):
         xml = u'''<wl:page xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:wl="http://www.weblyzard.com/wl/2013#" wl:id="1234" dc:format="text/html" xml:lang="de" wl:nilsimsa="c131b2b10e82b95c36635540b7bbdf0704a7f8db022025e03a80b0c0205b5ea9">
    <wl:sentence wl:id="27c236ff13ce52930c4b3cbc47c63e0d" wl:pos="ADJA ADV ADJD $," wl:token="0,10 11,13 14,28 28,29" wl:is_title="true" wl:sem_orient="0.0" wl:significance="0.0"><![CDATA[@neuholder So eidesstattlich,]]></wl:sentence>
@@ -394,6 +473,33 @@ class TestXMLContent(unittest.TestCase):
                           u'ökonomischen', u'Anreiz', u',', u'aber', u'vielleicht',
                           u'Wählerstimmen', u'.']
 
+    def test_sentence_cache(self):
+        sent = Sentence('md5sum', pos='DT NN VBZ', value='The sky is',
+                        token='10,13 14,17 18,20', dependency='1:NMOD 2:SBJ -1:ROOT')
+        assert list(sent.tokens) == ['The', 'sky', 'is']
+        assert sent.token_offsets.tolist() == [0, 3, 4, 7, 8, 10]
+        assert sent.token_offsets.readonly
+        assert sent.pos_tags == ['DT', 'NN', 'VBZ']
+        assert sent.dependency_list[1] == \
+            LabeledDependency(parent='2', pos='NN', label='SBJ')
+
+        # the returned lists may be modified without affecting the sentence
+        sent.pos_tags.append('XX')
+        sent.dependency_list.pop()
+        assert sent.pos_tags == ['DT', 'NN', 'VBZ']
+        assert len(sent.dependency_list) == 3
+
+        # cached values are updated when the attributes change
+        sent.value = 'A cloud is'
+        sent.token = '0,1 2,7 8,10'
+        assert list(sent.tokens) == ['A', 'cloud', 'is']
+        sent.pos_tags = ['DT', 'JJ', 'VBZ']
+        assert sent.pos_tags_list == ['DT', 'JJ', 'VBZ']
+        assert sent.dependency_list[1].pos == 'JJ'
+        sent.dependency = 'NMOD:1'
+        assert sent.dependency_list == [
+            LabeledDependency(parent='1', pos='DT', label='NMOD')]
+
     def test_missing_sentence_content(self):
         xml_content = get_test_data('test-quotes.xml')
         xml = XMLContent(xml_content)
@@ -2,11 +2,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 from __future__ import unicode_literals
+import json
 import unittest
+import io
 import os
 
 from pickle import load
+from pytest import raises
 
+from weblyzard_api.model import CharSpan, Sentence
 from weblyzard_api.model.parsers import XMLParser
 from weblyzard_api.model.parsers.xml_2005 import XML2005
 from weblyzard_api.model.parsers.xml_2013 import XML2013
@@ -53,6 +57,62 @@ class TestXMLParser(unittest.TestCase):
         self.assertEqual(md5sum, expected)
         self.assertEqual(XMLParser.decode_value(md5sum), expected)
 
+    def test_value_conversion(self):
+        assert XMLParser.remove_control_characters('Grüße') == 'Grüße'
+        assert XMLParser.remove_control_characters(
+            'a\x00b\nc​de͸f\xa0g') == 'abcdef\xa0g'
+        assert XMLParser.encode_value(b'a\tb') == 'ab'
+
+        for value, expected in (('12', 12), ('-1.5', -1.5), ('1e3', 1000.0),
+                                ('0123', '0123'), ('1e999', '1e999'),
+                                ('0,3 4,12', '0,3 4,12'), ('de', 'de'),
+                                ('true', True), ('null', None),
+                                ('["a"]', ['a']), ('Infinity', 'Infinity'),
+                                ('', '')):
+            decoded = XMLParser.decode_value(value)
+            assert decoded == expected and type(decoded) == type(expected)
+
+        for item, expected in (('12', 12), ('١٢', 12), ('+1', 1),
+                               ('1.5', 1.5), ('TRUE', True), ('False', False),
+                               ('{"a": 1}', {'a': 1}), ('text', 'text'),
+                               ('', '')):
+            cast = XMLParser.cast_item(item)
+            assert cast == expected and type(cast) == type(expected)
+
+    def test_span_attributes(self):
+        spans = [CharSpan(0, 3), CharSpan(4, 9)]
+        expected = json.dumps([span.to_dict() for span in spans])
+        assert XMLParser.encode_value(spans) == expected
+        assert XMLParser.get_xml_value({'spans': spans}) == \
+            json.dumps({'spans': [span.to_dict() for span in spans]})
+
+        attributes = XML2013.dump_xml_attributes(
+            {'keywords': spans}, mapping=XML2013.ATTR_MAPPING)
+        assert attributes == {
+            '{http://purl.org/dc/elements/1.1/}subject': expected}
+
+    def test_inverted_mappings(self):
+        for parser in (XML2005, XML2013):
+            for name in ('ATTR_MAPPING', 'SENTENCE_MAPPING',
+                         'ANNOTATION_MAPPING', 'FEATURE_MAPPING',
+                         'RELATION_MAPPING'):
+                assert parser.get_inverted_mapping(name) == \
+                    parser.invert_mapping(getattr(parser, name))
+
+        class CustomParser(XML2013):
+            SENTENCE_MAPPING = {'md5sum': ('md5', 'wl')}
+
+        assert CustomParser.get_inverted_mapping('SENTENCE_MAPPING') == {
+            '{%s}md5' % XML2013.SUPPORTED_NAMESPACE: 'md5sum'}
+        assert XML2013.get_inverted_mapping('SENTENCE_MAPPING')[
+            '{%s}id' % XML2013.SUPPORTED_NAMESPACE] == 'md5sum'
+
+        class InvalidParser(XML2013):
+            SENTENCE_MAPPING = {'md5sum': ('md5', 'unknown')}
+
+        with raises(KeyError):
+            InvalidParser.get_inverted_mapping('SENTENCE_MAPPING')
+
 
 class TestXML2005(unittest.TestCase):
 
@@ -121,5 +181,125 @@ class TestXML2013(unittest.TestCase):
             assert 'md5sum' in sent
 
 
+class TestStreamingXMLParser(unittest.TestCase):
+
+    PAGE = '''<wl:page xmlns:wl="http://www.weblyzard.com/wl/2013#"
+             xmlns:dc="http://purl.org/dc/elements/1.1/"
+             wl:id="{content_id}" xml:lang="de">
+        <wl:sentence wl:id="t{content_id}" wl:is_title="true"><![CDATA[Title {content_id}]]></wl:sentence>
+        <wl:sentence wl:id="s1"><![CDATA[First sentence.]]></wl:sentence>
+        <wl:sentence wl:id="s1"><![CDATA[First sentence.]]></wl:sentence>
+        <wl:sentence wl:id="s2"><![CDATA[Zweiter Satz über Österreich.]]></wl:sentence>
+        <wl:annotation wl:key="k1" wl:start="0" wl:end="5" wl:md5sum="t{content_id}"></wl:annotation>
+        <wl:annotation wl:key="k2" wl:start="0" wl:end="5" wl:md5sum="s1"></wl:annotation>
+        <wl:feature wl:key="f">1</wl:feature>
+        <wl:feature wl:key="f">2</wl:feature>
+        <wl:relation wl:key="r">http://www.weblyzard.com</wl:relation>
+    </wl:page>'''
+
+    def test_input_types(self):
+        xml = '<?xml version="1.0" encoding="UTF-8"?>\n' + \
+            self.PAGE.format(content_id=1)
+        expected = XML2013.parse(xml)
+        attributes, sentences, title_annotations, body_annotations, \
+            features, relations = expected
+        assert attributes == {'content_id': 1, 'language_id': 'de'}
+        assert [s['md5sum'] for s in sentences] == ['t1', 's1', 's2']
+        assert sentences[2]['value'] == 'Zweiter Satz über Österreich.'
+        assert [a['key'] for a in title_annotations] == ['k1']
+        assert [a['key'] for a in body_annotations] == ['k2']
+        assert features == {'f': [1, 2]}
+        assert relations == {'r': 'http://www.weblyzard.com'}
+
+        assert XML2013.parse(xml.encode('utf-8')) == expected
+        assert XML2013.parse(io.BytesIO(xml.encode('utf-8'))) == expected
+        assert XML2013.parse(xml.encode('latin-1').replace(
+            b'UTF-8', b'ISO-8859-1')) == expected
+
+        _, sentences, _, _, _, _ = XML2013.parse(xml, remove_duplicates=False)
+        assert len(sentences) == 4
+
+    def test_iter_documents(self):
+        dump = '<dump>%s</dump>' % ''.join(self.PAGE.format(content_id=i)
+                                           for i in range(100))
+        documents = XML2013.iter_documents(io.BytesIO(dump.encode('utf-8')))
+        for content_id, document in enumerate(documents):
+            attributes, sentences, title_annotations, _, features, _ = document
+            assert attributes['content_id'] == content_id
+            assert len(sentences) == 3
+            assert len(title_annotations) == 1
+            assert features == {'f': [1, 2]}
+        assert content_id == 99
+
+    def test_iter_sentences(self):
+        sentences = XML2013.iter_sentences(self.PAGE.format(content_id=1))
+        assert next(sentences)['value'] == 'Title 1'
+        assert [s['md5sum'] for s in sentences] == ['s1', 's2']
+
+    def test_bounded_memory(self):
+        ''' processed elements are removed from the tree, i.e. only the
+            elements of the current input chunk are kept in memory '''
+        sentences = ''.join('<wl:sentence wl:id="%d"><![CDATA[Sentence %d]]>'
+                            '</wl:sentence>' % (i, i) for i in range(10000))
+        xml = self.PAGE.format(content_id=1).replace('</wl:page>',
+                                                     sentences + '</wl:page>')
+        sizes = []
+        for page, kind, element in XML2013._iter_elements(xml):
+            sizes.append(len(page))
+        assert len(sizes) > 10000
+        assert max(sizes) < 2000
+
+    def test_invalid_xml(self):
+        with raises(ValueError):
+            XML2013.parse('')
+
+
+class TestXMLWriter(unittest.TestCase):
+
+    ATTRIBUTES = {'content_id': 1, 'lang': 'de', 'title': 'Ein "Titel"'}
+    ANNOTATIONS = {'OrganizationEntity': [
+        {'key': 'http://www.weblyzard.com', 'preferredName': 'webLyzard',
+         'entities': [{'start': 0, 'end': 5, 'surfaceForm': 'Erste'}]}]}
+
+    def get_document(self, content_id=1):
+        return {'titles': [Sentence(value='Titel', is_title=True)],
+                'attributes': dict(self.ATTRIBUTES, content_id=content_id),
+                'sentences': [Sentence(value='Erste Zeile <über> ]] [[.',
+                                       pos='ADJA NN'),
+                              Sentence(value='Zweite Zeile.')],
+                'annotations': self.ANNOTATIONS,
+                'features': {'f': [1, 2]},
+                'relations': {'r': 'http://www.weblyzard.com'}}
+
+    def test_write_xml(self):
+        xml = XML2013.dump_xml(**self.get_document())
+        assert '&quot;' not in xml and 'Ein Titel' in xml
+        attributes, sentences, _, annotations, features, relations = \
+            XML2013.parse(xml)
+        assert [s['value'] for s in sentences][1:] == \
+            ['Erste Zeile <über> ]] [[.', 'Zweite Zeile.']
+        assert [(a['key'], a['start'], a['preferredName'])
+                for a in annotations] == \
+            [('http://www.weblyzard.com', 0, 'webLyzard')]
+        assert features == {'f': [1, 2]}
+        assert relations == {'r': 'http://www.weblyzard.com'}
+
+        output = io.BytesIO()
+        XML2013.write_xml(output, **self.get_document())
+        assert XML2013.parse(output.getvalue()) == XML2013.parse(xml)
+
+    def test_write_documents(self):
+        output = io.BytesIO()
+        documents = (self.get_document(content_id=i) for i in range(50))
+        assert XML2013.write_documents(output, documents) == 50
+
+        output.seek(0)
+        for content_id, document in enumerate(
+                XML2013.iter_documents(output)):
+            assert document == XML2013.parse(XML2013.dump_xml(
+                **self.get_document(content_id=content_id)))
+        assert content_id == 49
+
+
 if __name__ == '__main__':
     unittest.main()
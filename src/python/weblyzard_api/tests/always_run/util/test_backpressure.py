@@ -0,0 +1,200 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from time import sleep
+from urllib.error import HTTPError, URLError
+
+from mock import patch
+from pytest import raises
+
+from weblyzard_api.client.backpressure import AdaptiveConcurrencyLimiter, \
+    classify_exception, OVERLOADED, FAILED
+from weblyzard_api.client.jeremia import Jeremia
+
+
+class TestAdaptiveConcurrencyLimiter(unittest.TestCase):
+
+    def test_aimd(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=6,
+                                             latency_tolerance=None)
+        with patch('weblyzard_api.client.backpressure.time') as time:
+            time.return_value = 1.
+            # additive increase: +1 per round of requests
+            for _ in range(4):
+                limiter.release(limiter.acquire())
+            assert 4.9 < limiter.limit < 5.
+
+            # multiplicative decrease - only once per round
+            start_times = [limiter.acquire() for _ in range(4)]
+            time.return_value = 2.
+            for start_time in start_times:
+                limiter.release(start_time, OVERLOADED)
+            assert 2.4 < limiter.limit < 2.5
+
+            # failures which do not indicate an overload are neutral
+            limiter.release(limiter.acquire(), FAILED)
+            assert 2.4 < limiter.limit < 2.5
+
+            for _ in range(100):
+                limiter.release(limiter.acquire())
+            assert limiter.limit == 6
+            assert limiter.get_statistics()['in_flight'] == 0
+
+    def test_latency_backoff(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=10,
+                                             latency_tolerance=3.)
+        with patch('weblyzard_api.client.backpressure.time') as time:
+            time.return_value = 0.
+            start_time = limiter.acquire()
+            time.return_value = 1.
+            limiter.release(start_time)
+            assert limiter.get_statistics()['baseline_latency'] == 1.
+
+            start_time = limiter.acquire()
+            time.return_value = 6.
+            limiter.release(start_time)
+            assert 5. < limiter.limit < 5.1
+
+    def test_blocking(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=2)
+        start_times = [limiter.acquire(), limiter.acquire()]
+        with raises(TimeoutError):
+            limiter.acquire(timeout=0.01)
+
+        Thread(target=lambda: (sleep(0.05),
+                               limiter.release(start_times[0]))).start()
+        limiter.acquire(timeout=5)
+        assert limiter.get_statistics()['in_flight'] == 2
+
+    def test_call(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=2,
+                                             latency_tolerance=None)
+        assert limiter.call(max, 1, 2) == 2
+
+        def overloaded():
+            raise HTTPError('http://localhost', 503, 'unavailable', {}, None)
+
+        with raises(HTTPError):
+            limiter.call(overloaded)
+        assert limiter.limit == 1.25
+        assert limiter.get_statistics()['in_flight'] == 0
+
+    def test_call_async(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=2)
+        concurrency = []
+
+        async def request(i):
+            concurrency.append(limiter.get_statistics()['in_flight'])
+            await asyncio.sleep(0.01)
+            return i
+
+        async def run():
+            return await asyncio.gather(*[limiter.call_async(request, i)
+                                          for i in range(10)])
+
+        assert asyncio.run(run()) == list(range(10))
+        assert max(concurrency) == 2
+
+    def test_classify_exception(self):
+        assert classify_exception(HTTPError('', 502, '', {}, None)) == \
+            OVERLOADED
+        assert classify_exception(HTTPError('', 404, '', {}, None)) == FAILED
+        assert classify_exception(URLError(TimeoutError())) == OVERLOADED
+        assert classify_exception(URLError(ConnectionRefusedError())) == \
+            FAILED
+
+
+class OverloadedHandler(BaseHTTPRequestHandler):
+    ''' rejects requests with 503, if more than `capacity` requests are
+        processed concurrently '''
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers['Content-Length']))
+        server = self.server
+        with server.lock:
+            server.active += 1
+            overloaded = server.active > server.capacity
+            server.rejected += overloaded
+        try:
+            if overloaded:
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            sleep(0.02)
+            body = data
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class TestJeremiaBackpressure(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), OverloadedHandler)
+        self.server.daemon_threads = True
+        self.server.lock = Lock()
+        self.server.active = 0
+        self.server.rejected = 0
+        self.server.capacity = 2
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:%d/rest' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_submit_documents(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=8)
+        limits = []
+        release = limiter.release
+
+        def record_release(*args):
+            release(*args)
+            limits.append(limiter.limit)
+
+        limiter.release = record_release
+        client = Jeremia(self.url, concurrency_limiter=limiter)
+
+        def submit(i):
+            return client.submit_documents([{'id': i}], max_retry_delay=0.05)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(submit, range(40)))
+
+        assert results == [[{'id': i}] for i in range(40)]
+        # the 503 responses reduced the number of concurrent requests
+        assert self.server.rejected > 0
+        assert min(limits) <= 2
+
+    def test_submit_documents_stream(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=1)
+        client = Jeremia(self.url, concurrency_limiter=limiter)
+        documents = [{'id': i} for i in range(5)]
+
+        # the request slot is held until the stream has been consumed
+        result = client.submit_documents(documents, stream=True)
+        assert limiter.get_statistics()['in_flight'] == 1
+        with raises(TimeoutError):
+            limiter.acquire(timeout=0.01)
+        assert list(result) == documents
+        assert limiter.get_statistics()['in_flight'] == 0
+
+        result = client.submit_documents(documents, stream=True)
+        assert next(result) == documents[0]
+        result.close()
+        assert limiter.get_statistics()['in_flight'] == 0
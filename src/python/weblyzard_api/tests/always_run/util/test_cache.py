@@ -14,6 +14,7 @@ import unittest
 import os
 import pickle
 import redis
+import threading
 
 from gzip import GzipFile
 from multiprocessing import Pool
@@ -30,7 +31,8 @@ from weblyzard_api.util.cache import (MemoryCache, MemoryCached, DiskCached,
                                       update_hybrid_cache_group,
                                       HybridMemRedisCached, DEFAULT_REDIS_PORT,
                                       DEFAULT_REDIS_HOST, logger,
-                                      RealtimeRedisMemCached)
+                                      RealtimeRedisMemCached, get_deep_size,
+                                      SingleFlight, DiskCacheIndex)
 
 get_cache_dir = lambda no: get_resource(__file__, ('.unittest-temp%d' % (no),))
 
@@ -86,6 +88,191 @@ class TestMemoryCached(TestCached):
     # todo: failing
 
 
+class TestEvictionPolicies(unittest.TestCase):
+
+    @staticmethod
+    def fetch(cache, *keys):
+        for key in keys:
+            cache.fetchObjectId(key, str, key)
+
+    def test_lru(self):
+        cache = MemoryCache(max_cache_size=3)
+        self.fetch(cache, 1, 2, 3, 1, 4)
+        assert len(cache._cacheData) == 3
+        assert 2 not in cache
+        assert all(key in cache for key in (1, 3, 4))
+        del cache[3]
+        self.fetch(cache, 5, 6)
+        assert 1 not in cache
+        assert all(key in cache for key in (4, 5, 6))
+
+    def test_lfu(self):
+        cache = MemoryCache(max_cache_size=3, policy='lfu')
+        self.fetch(cache, 1, 1, 1, 2, 2, 3, 4)
+        assert 3 not in cache
+        self.fetch(cache, 4, 4, 5)
+        assert 2 not in cache
+        assert all(key in cache for key in (1, 4, 5))
+
+    def test_arc(self):
+        cache = MemoryCache(max_cache_size=3, policy='arc')
+        # frequently used keys survive a scan
+        self.fetch(cache, 1, 1, 2, 2, *range(10, 20))
+        assert 1 in cache and 2 in cache
+        assert len(cache._cacheData) == 3
+
+    def test_unsupported_policy(self):
+        with pytest.raises(ValueError):
+            MemoryCached(10, policy='fifo')
+
+    def test_decorator(self):
+        fn = mock.MagicMock(side_effect=lambda x: x)
+
+        @MemoryCached(2)
+        def cached(x):
+            return fn(x)
+
+        for x in (1, 2, 1, 3, 1, 2):
+            assert cached(x) == x
+        assert [c.args[0] for c in fn.call_args_list] == [1, 2, 3, 2]
+
+
+class TestByteBudget(unittest.TestCase):
+
+    def test_max_cache_bytes(self):
+        cache = MemoryCache(max_cache_bytes=100, sizer=len)
+        for key, size in ((1, 40), (2, 30), (1, 40), (3, 50), (4, 200)):
+            cache.fetchObjectId(key, lambda size: size * 'x', size)
+        # objects exceeding the budget are not cached
+        assert 4 not in cache
+        assert 2 not in cache
+        assert cache.getCacheStatistics() == {
+            'cache_hits': 1, 'cache_misses': 4, 'cache_entries': 2,
+            'cache_bytes': 90}
+
+        cache.fetchObjectId(3, str, 3)
+        del cache[3]
+        assert cache.getCacheStatistics() == {
+            'cache_hits': 2, 'cache_misses': 4, 'cache_entries': 1,
+            'cache_bytes': 40}
+
+    def test_statistics(self):
+        cache = MemoryCached(2)
+        cache.fetchObjectId(1, str, 1)
+        statistics = cache.getCacheStatistics()
+        assert statistics['cache_entries'] == 1
+        assert statistics['cache_bytes'] == get_deep_size('1')
+
+        ttl_cache = TTLMemoryCached(ttl=datetime.timedelta(days=1),
+                                    max_cache_bytes=100, sizer=len)
+        for size in (60, 30, 50):
+            ttl_cache.fetchObjectId(size, lambda size: size * 'x', size)
+        assert 60 not in ttl_cache
+        assert len(ttl_cache._expires) == 2
+        assert ttl_cache.getCacheStatistics()['cache_bytes'] == 80
+
+    def test_statistics_do_not_block_hits(self):
+        sizing, hit = threading.Event(), threading.Event()
+
+        def sizer(obj):
+            sizing.set()
+            assert hit.wait(5)
+            return 1
+
+        def fetch():
+            sizing.wait(5)
+            cache.fetchObjectId(1, str, 1)
+            hit.set()
+
+        cache = MemoryCache(sizer=sizer)
+        cache.fetchObjectId(1, str, 1)
+        thread = threading.Thread(target=fetch)
+        thread.start()
+        assert cache.getCacheStatistics()['cache_bytes'] == 1
+        thread.join()
+        assert cache.getCacheStatistics()['cache_hits'] == 1
+
+    def test_get_deep_size(self):
+        class Slots(object):
+            __slots__ = ('value', )
+
+            def __init__(self, value):
+                self.value = value
+
+        value = 'x' * 1000
+        assert get_deep_size([value, value]) < 2 * len(value)
+        assert get_deep_size({'a': Slots(value)}) > len(value)
+        assert get_deep_size(MemoryCache) == 0
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    NUM_THREADS = 16
+
+    def run_threads(self, target, *args):
+        barrier = threading.Barrier(self.NUM_THREADS)
+        results = []
+
+        def run():
+            barrier.wait()
+            try:
+                results.append(target(*args))
+            except Exception as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=run)
+                   for _ in range(self.NUM_THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    @staticmethod
+    def slow_fetch(fn):
+        def fetch(*args):
+            time.sleep(0.1)
+            return fn(*args)
+        return fetch
+
+    def test_single_flight(self):
+        fn = mock.MagicMock(side_effect=[ValueError(), 2])
+        single_flight = SingleFlight()
+        results = self.run_threads(single_flight.do, 'key',
+                                   self.slow_fetch(fn))
+        assert fn.call_count == 1
+        assert all(isinstance(result, ValueError) for result in results)
+        assert single_flight.do('key', fn) == 2
+
+    def test_memory_caches(self):
+        for cache in (MemoryCache(), TTLMemoryCached(
+                ttl=datetime.timedelta(days=1), max_cache_size=5)):
+            fn = mock.MagicMock(side_effect=str)
+            results = self.run_threads(cache.fetch, self.slow_fetch(fn), 7)
+            assert results == self.NUM_THREADS * ['7']
+            fn.assert_called_once_with(7)
+
+    def test_disk_cache(self):
+        cache = DiskCache(get_cache_dir(7))
+        fn = mock.MagicMock(side_effect=str)
+        try:
+            results = self.run_threads(cache.fetch, self.slow_fetch(fn), 7)
+        finally:
+            rmtree(get_cache_dir(7))
+        assert results == self.NUM_THREADS * ['7']
+        fn.assert_called_once_with(7)
+
+    def test_thread_safety(self):
+        cache = MemoryCache(max_cache_size=50, policy='lfu')
+
+        def fetch():
+            for x in range(2000):
+                cache.fetch(str, x % 70 + x % 3)
+
+        self.run_threads(fetch)
+        assert len(cache._cacheData) == len(cache._usage) == 50
+
+
 class SkipTestDiskCached(TestCached):
     @staticmethod
     @DiskCached(get_cache_dir(1))
@@ -184,6 +371,74 @@ class SkipTestDiskCached(TestCached):
             p.join()
 
 
+class TestBoundedDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = get_cache_dir(8)
+
+    def tearDown(self):
+        if exists(self.cache_dir):
+            rmtree(self.cache_dir)
+
+    def get_cache(self, **kargs):
+        cache = DiskCache(self.cache_dir, cache_nesting_level=2, **kargs)
+        cache.gc_interval = 1
+        return cache
+
+    def test_max_cache_size(self):
+        cache = self.get_cache(max_cache_size=10)
+        for x in range(10):
+            cache.fetch(str, x)
+        cache.fetch(str, 0)
+        cache._index._flush()
+        cache.fetch(str, 10)
+        # the cache is reduced to 90 % of its size
+        assert cache.getCacheStatistics()['cache_entries'] == 9
+        assert [x for x in range(11) if cache.getKey(x) not in cache] == \
+            [1, 2]
+        # the layout of the cache directory remains unchanged
+        obj_id = Cache.getObjectId(cache.getKey(10))
+        assert exists(join(self.cache_dir, obj_id[0], obj_id[1], obj_id))
+
+    def test_max_cache_bytes_and_ttl(self):
+        cache = self.get_cache(max_cache_bytes=2000,
+                               ttl=datetime.timedelta(milliseconds=100))
+        for x in range(5):
+            cache.fetch(lambda x: x * 'x', x * 200)
+        assert cache.getCacheStatistics()['cache_entries'] == 5
+        cache.fetch(lambda x: x * 'x', 1000)
+        assert cache.getCacheStatistics()['cache_bytes'] <= 1800
+
+        time.sleep(0.2)
+        assert cache.getKey(1000) not in cache
+        fn = mock.MagicMock(return_value='x')
+        assert cache.fetch(fn, 1) == 'x'
+        assert cache.fetch(fn, 1) == 'x'
+        fn.assert_called_once_with(1)
+        assert cache.getCacheStatistics()['cache_entries'] == 1
+
+    def test_existing_cache_dir(self):
+        unbounded_cache = DiskCache(self.cache_dir, cache_nesting_level=2)
+        for x in range(20):
+            unbounded_cache.fetch(str, x)
+        assert not exists(join(self.cache_dir, DiskCacheIndex.FILE_NAME))
+
+        cache = self.get_cache(max_cache_size=15)
+        assert cache.getCacheStatistics()['cache_entries'] == 20
+        cache.fetch(str, 20)
+        assert cache.getCacheStatistics()['cache_entries'] == 13
+        assert sum(x in unbounded_cache for x in map(cache.getKey,
+                                                     range(21))) == 13
+
+    def test_processes(self):
+        cache = self.get_cache(max_cache_size=5)
+        p = Pool(4)
+        p.map(g, 20 * [cache])
+        p.close()
+        p.join()
+        assert cache.getCacheStatistics()['cache_entries'] <= 7
+
+
 def f(c):
     ''' Function for checking Diskcache with larger files.
 
@@ -272,6 +527,59 @@ class TestTTLMemoryCached(unittest.TestCase):
         dummy_slow_expiry()
         assert fn.call_count == 1
 
+    def test_max_cache_size(self):
+        cache = TTLMemoryCached(ttl=datetime.timedelta(days=1),
+                                max_cache_size=2, policy='lfu')
+        for key in (1, 1, 2, 3):
+            cache.fetchObjectId(key, str, key)
+        assert 1 in cache and 3 in cache and 2 not in cache
+        assert len(cache._expires) == 2
+
+    def test_purge_expired(self):
+        cache = TTLMemoryCached(ttl=datetime.timedelta(milliseconds=1))
+        for key in range(20):
+            cache.fetchObjectId(key, str, key)
+        time.sleep(0.01)
+        assert 0 not in cache
+        # expired objects are purged in batches on access
+        cache.fetchObjectId('a', str, 'a')
+        assert len(cache._cacheData) == 20 - cache.purge_batch_size + 1
+        cache.fetchObjectId('a', str, 'a')
+        cache.fetchObjectId('a', str, 'a')
+        assert list(cache._expires) == [cache.getObjectId('a')]
+
+    def test_get_ttl(self):
+        fn = mock.MagicMock(side_effect=lambda x: x)
+        cache = TTLMemoryCached(
+            ttl=datetime.timedelta(days=1),
+            get_ttl=lambda x: datetime.timedelta(milliseconds=1) if x < 0
+            else None)
+        for x in (1, -1):
+            cache.fetchObjectId(x, fn, x)
+        time.sleep(0.01)
+        for x in (1, -1):
+            cache.fetchObjectId(x, fn, x)
+        assert [c.args[0] for c in fn.call_args_list] == [1, -1, -1]
+
+    def test_stale_while_revalidate(self):
+        results = iter(range(10))
+        fn = mock.MagicMock(side_effect=lambda: next(results))
+
+        cache = TTLMemoryCached(ttl=datetime.timedelta(milliseconds=50),
+                                stale_ttl=datetime.timedelta(days=1))
+        cached = cache(fn)
+
+        assert cached() == 0
+        time.sleep(0.1)
+        # the stale result is returned while it is refreshed
+        assert cached() == 0
+        for _ in range(100):
+            if not cache._refreshing:
+                break
+            time.sleep(0.01)
+        assert cached() == 1
+        assert fn.call_count == 2
+
 
 class TestHybridMemDiskCached():
 
@@ -316,6 +624,37 @@ class TestHybridMemDiskCached():
         with GzipFile('/tmp/test_disk_cache_function.pkl') as f:
             assert len(pickle.load(f)) == 2
 
+    def test_sync_keeps_local_usage(self):
+        cache_file = '/tmp/test_disk_cache_usage.pkl'
+        try:
+            os.remove(cache_file)
+        except OSError:
+            pass
+        cache = HybridMemDiskCached('test_disk_cache_usage', max_cache_size=2,
+                                    group=[], cache_dir_path='/tmp')
+        fn = mock.MagicMock(side_effect=str.upper)
+        for _ in range(6):
+            assert cache.fetchObjectId('x', fn, 'x') == 'X'
+        x = cache.getObjectId('x')
+        with GzipFile(cache_file, 'w') as f:
+            pickle.dump({'a': 1, 'b': 2, 'c': 3, x: 'upstream'}, f)
+
+        # upstream objects only fill the free space of the cache
+        cache.sync_upstream()
+        assert cache.fetchObjectId('x', fn, 'x') == 'X'
+        assert fn.call_count == 1
+        assert len(cache._cacheData) == 2
+        with GzipFile(cache_file) as f:
+            assert pickle.load(f) == {'a': 1, 'b': 2, 'c': 3, x: 'X'}
+
+        # the server's objects replace the cached ones in place
+        with GzipFile(cache_file, 'w') as f:
+            pickle.dump({x: 'upstream'}, f)
+        cache.sync_upstream(priority='server')
+        assert cache.fetchObjectId('x', fn, 'x') == 'upstream'
+        assert fn.call_count == 1
+        assert len(cache._cacheData) == 2
+        os.remove(cache_file)
 
 def redis_is_live():
         from weblyzard_api.util.cache import DEFAULT_REDIS_PORT, \
@@ -19,13 +19,21 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from future import standard_library
 standard_library.install_aliases()
+import asyncio
+import gzip
+import json
 import unittest
 import urllib.request, urllib.error, urllib.parse
 
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pytest import raises
 from socket import timeout
+from threading import Thread
 
-from weblyzard_api.util.http import DEFAULT_TIMEOUT, Retrieve, setdefaulttimeout, log
+from weblyzard_api.client import MultiRESTClient, RESTClient
+from weblyzard_api.util.async_http import AsyncRetrieve
+from weblyzard_api.util.http import DEFAULT_TIMEOUT, Retrieve, setdefaulttimeout, log, \
+    HTTPPoolManager, RETRY_POLICY
 
 
 class TestHttpRetrieve(unittest.TestCase):
@@ -100,6 +108,234 @@ class TestHttpRetrieve(unittest.TestCase):
             if user:
                 assert url != test_url
 
+class EchoRequestHandler(BaseHTTPRequestHandler):
+    ''' returns the request's path, headers and the connection's port '''
+    protocol_version = 'HTTP/1.1'
+    # number of requests per path
+    requests = {}
+
+    def do_GET(self):
+        if self.path.startswith('/missing'):
+            self._reply(404, b'not found')
+            return
+        if self.path.startswith('/unavailable/'):
+            # fails with 503 for the given number of requests
+            count = self.requests[self.path] = \
+                self.requests.get(self.path, 0) + 1
+            if count <= int(self.path.rsplit('/', 1)[1]):
+                self._reply(503, b'unavailable')
+                return
+        if self.path.startswith('/truncated'):
+            # closes the connection in the middle of the response body
+            self.requests[self.path] = self.requests.get(self.path, 0) + 1
+            self.send_response(200)
+            self.send_header('Content-Length', '10')
+            self.end_headers()
+            self.wfile.write(b'abc')
+            self.close_connection = True
+            return
+        if self.path.startswith('/redirect'):
+            # redirects to /target or to the url following /redirect/
+            location = urllib.parse.unquote(self.path[len('/redirect/'):])
+            self.send_response(302)
+            self.send_header('Location', location or '/target')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps({'path': self.path,
+                           'port': self.client_address[1],
+                           'auth': self.headers.get('Authorization'),
+                           'cookie': self.headers.get('Cookie')}).encode()
+        if self.path.startswith('/gzip'):
+            self._reply(200, gzip.compress(body), {'Content-Encoding': 'gzip'})
+        else:
+            self._reply(200, body)
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers['Content-Length']))
+        self._reply(200, data)
+
+    def _reply(self, code, body, headers=None):
+        self.send_response(code)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestPooledRetrieve(unittest.TestCase):
+    ''' tests the keep-alive connection pool against a local server '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), EchoRequestHandler)
+        cls.server.daemon_threads = True
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = 'http://127.0.0.1:%d' % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.pool_manager = HTTPPoolManager(pool_size=2)
+        self.retrieve = Retrieve(self.__class__.__name__, sleep_time=0,
+                                 pool_manager=self.pool_manager)
+
+    def tearDown(self):
+        self.pool_manager.clear()
+
+    def get(self, path, **kwargs):
+        return json.loads(self.retrieve.open(self.url + path, **kwargs).read())
+
+    def test_connection_reuse(self):
+        ports = {self.get('/status')['port'] for _ in range(5)}
+        assert len(ports) == 1
+
+    def test_post_and_gzip(self):
+        r = self.retrieve.open(self.url + '/echo', data='{"a": 1}',
+                               headers={'Content-Type': 'application/json'})
+        assert json.loads(r.read()) == {'a': 1}
+        first = self.get('/gzip')
+        assert first['path'] == '/gzip'
+        assert self.get('/status')['port'] == first['port']
+
+    def test_streamed_json_request(self):
+        client = RESTClient(self.url, pool_manager=self.pool_manager)
+        documents = [{'id': i} for i in range(100)]
+        result = client.execute('echo', parameters=documents, stream=True)
+        assert not isinstance(result, list)
+        assert list(result) == documents
+        assert client.execute('echo', parameters=documents) == documents
+
+    def test_streamed_request_statistics(self):
+        client = MultiRESTClient(self.url, use_random_server=False)
+        documents = [{'id': i} for i in range(10)]
+
+        def get_statistics():
+            return client.get_service_statistics()[self.url]
+
+        # the outcome is recorded once the stream has been consumed
+        result = client.request('echo', parameters=documents, stream=True)
+        assert get_statistics()['in_flight'] == 1
+        assert get_statistics()['requests'] == 0
+        assert list(result) == documents
+        assert get_statistics()['in_flight'] == 0
+        assert get_statistics()['requests'] == 1
+
+        # streams closed early are not counted
+        result = client.request('echo', parameters=documents, stream=True)
+        assert next(result) == documents[0]
+        result.close()
+        assert get_statistics()['in_flight'] == 0
+        assert get_statistics()['requests'] == 1
+
+    def test_basic_auth(self):
+        result = self.get('/auth', user='user', pwd='passwd')
+        assert result['auth'] == 'Basic dXNlcjpwYXNzd2Q='
+
+    def test_errors_and_redirects(self):
+        with raises(urllib.error.HTTPError) as e:
+            self.retrieve.open(self.url + '/missing')
+        assert e.value.code == 404
+        assert self.get('/redirect')['path'] == '/target'
+
+    def test_cross_origin_redirect(self):
+        headers = {'Cookie': 'session=1'}
+        result = self.get('/redirect', user='user', pwd='passwd',
+                          headers=headers)
+        assert result['auth'] == 'Basic dXNlcjpwYXNzd2Q='
+        assert result['cookie'] == 'session=1'
+
+        # same server, but another host
+        target = 'http://localhost:%d/target' % self.server.server_address[1]
+        result = self.get('/redirect/' + urllib.parse.quote(target, safe=''),
+                          user='user', pwd='passwd', headers=headers)
+        assert result['path'] == '/target'
+        assert result['auth'] is None
+        assert result['cookie'] is None
+
+        # asyncio variant
+        retrieve = AsyncRetrieve(self.__class__.__name__)
+        result = json.loads(asyncio.run(retrieve.open(
+            self.url + '/redirect/' + urllib.parse.quote(target, safe=''),
+            user='user', pwd='passwd', headers=headers)).read())
+        assert result['path'] == '/target'
+        assert result['auth'] is None
+        assert result['cookie'] is None
+
+    def test_truncated_response(self):
+        # requests are not repeated, once the server has started responding
+        retrieve = AsyncRetrieve(self.__class__.__name__)
+
+        async def fetch():
+            await retrieve.open(self.url + '/status')
+            await retrieve.open(self.url + '/truncated')
+
+        with raises(urllib.error.URLError):
+            asyncio.run(fetch())
+        assert EchoRequestHandler.requests['/truncated'] == 1
+
+    def test_async_event_loops(self):
+        # the idle connections of another event loop are closed
+        retrieve = AsyncRetrieve(self.__class__.__name__)
+        pool_manager = retrieve.pool_manager
+
+        async def fetch():
+            result = await retrieve.open(self.url + '/status')
+            return pool_manager.connection_pool(self.url), result
+
+        loop = asyncio.new_event_loop()
+        pool, result = loop.run_until_complete(fetch())
+        assert result.code == 200
+        _, writer = pool._idle[0]
+
+        for _ in range(2):
+            new_pool, result = asyncio.run(fetch())
+            assert result.code == 200
+            assert new_pool is not pool
+            assert not pool._idle
+            assert writer.is_closing()
+            pool, writer = new_pool, new_pool._idle[0][1]
+        loop.run_until_complete(asyncio.sleep(0))
+        loop.close()
+
+    def test_retry(self):
+        retrieve = Retrieve(self.__class__.__name__, sleep_time=0,
+                            pool_manager=self.pool_manager,
+                            retry_policy=RETRY_POLICY.replace(base_delay=0.01))
+        with raises(urllib.error.HTTPError) as e:
+            retrieve.open(self.url + '/unavailable/1')
+        assert e.value.code == 503
+
+        r = retrieve.open(self.url + '/unavailable/2', retry=2)
+        assert json.loads(r.read())['path'] == '/unavailable/2'
+        with raises(urllib.error.HTTPError):
+            retrieve.open(self.url + '/unavailable/5', retry=2)
+        assert EchoRequestHandler.requests['/unavailable/5'] == 3
+
+    def test_threads(self):
+        results = []
+
+        def fetch():
+            for _ in range(10):
+                results.append(self.get('/status')['path'])
+
+        threads = [Thread(target=fetch) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == ['/status'] * 80
+        pool = self.pool_manager.connection_pool(self.url)
+        assert pool._idle.qsize() <= 2
+
+
 def t_retrieve(url):
     ''' retrieves the given url from the web
 
@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import datetime
+import json
+import math
+import unittest
+
+from pytest import raises, warns
+
+from weblyzard_api.model import CharSpan
+from weblyzard_api.util import json_codec
+
+
+class TestJSONCodec(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = json_codec.BACKEND
+        # available backends in the order of preference
+        self.backends = []
+        for name in json_codec.PREFERRED_BACKENDS:
+            try:
+                json_codec.get_backend(name)
+            except ImportError:
+                continue
+            self.backends.append(name)
+
+    def tearDown(self):
+        json_codec.BACKEND = self.backend
+
+    def test_loads(self):
+        document = {'id': 1, 'content': 'Grüße — /', 'values': [1.5, None,
+                                                               True]}
+        for backend in self.backends:
+            json_codec.set_backend(backend)
+            serialized = json.dumps(document)
+            assert json_codec.loads(serialized) == document
+            assert json_codec.loads(serialized.encode('utf-8')) == document
+
+            # input rejected by most fast backends
+            assert json_codec.loads(str(2 ** 70)) == 2 ** 70
+            assert math.isnan(json_codec.loads('NaN'))
+            assert json_codec.loads('"a\tb"', strict=False) == 'a\tb'
+            with raises(ValueError):
+                json_codec.loads('"a\tb"')
+            with raises(ValueError):
+                json_codec.loads(b'{"invalid"')
+
+    def test_dumps(self):
+        document = {'span': CharSpan(0, 5), 1: 'ä', 'big': 2 ** 70}
+        expected = {'span': {'@type': 'CharSpan', 'span_type': 'CharSpan',
+                             'start': 0, 'end': 5},
+                    '1': 'ä', 'big': 2 ** 70}
+        for backend in self.backends:
+            json_codec.set_backend(backend)
+            assert json.loads(json_codec.dumps(document)) == expected
+            assert json.loads(json_codec.dumps_bytes(document)) == expected
+            assert ' ' not in json_codec.dumps([1, 2], compact=True)
+            with raises(TypeError):
+                json_codec.dumps(object())
+
+    def test_dumps_unsupported_values(self):
+        for backend in self.backends:
+            json_codec.set_backend(backend)
+            expected = 'null' if backend == 'orjson' else 'NaN'
+            assert json_codec.dumps(float('nan')) == expected
+            assert json_codec.dumps_bytes([float('inf')]) == \
+                ('[%s]' % ('null' if backend == 'orjson' else 'Infinity')
+                 ).encode('utf-8')
+            with raises(TypeError):
+                json_codec.dumps(datetime.datetime(2020, 1, 1))
+            with raises(TypeError):
+                json_codec.dumps_bytes({'date': datetime.date(2020, 1, 1)})
+
+    def test_json_encoder(self):
+        # deprecated, but still supported
+        with warns(DeprecationWarning):
+            assert json.loads(json.dumps([CharSpan(0, 5)])) == [
+                {'@type': 'CharSpan', 'span_type': 'CharSpan', 'start': 0,
+                 'end': 5}]
+        with raises(TypeError):
+            json.dumps(object())
+
+    def test_get_backend(self):
+        assert json_codec.get_backend('json') is json_codec._stdlib
+        assert json_codec.get_backend().name == self.backends[0]
+        with raises(KeyError):
+            json_codec.get_backend('unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
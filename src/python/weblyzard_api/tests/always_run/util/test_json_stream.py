@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import gzip
+import io
+import json
+import unittest
+
+from pytest import raises
+
+from weblyzard_api.util.http import GzipResponse
+from weblyzard_api.util.json_stream import JSONArrayStream, ObservedIterator, \
+    iter_json_array
+
+
+class FakeResponse(io.BytesIO):
+    headers = {}
+
+
+class TestJSONArrayStream(unittest.TestCase):
+
+    DOCUMENTS = [{'id': i, 'title': 'Überschrift %d' % i,
+                  'sentences': [{'value': 'Hallo "Welt"', 'pos': [1, 2.5]}]}
+                 for i in range(50)] + [12345, 1.5e10, 'text', None, True, []]
+
+    def test_roundtrip(self):
+        data = json.dumps(self.DOCUMENTS).encode('utf-8')
+        # small chunk sizes split numbers, strings and multi-byte characters
+        for chunk_size in (1, 3, 7, 64, 100000):
+            result = list(JSONArrayStream(io.BytesIO(data),
+                                          chunk_size=chunk_size))
+            assert result == self.DOCUMENTS
+
+    def test_whitespace_and_empty(self):
+        assert list(JSONArrayStream(io.BytesIO(b' [ ] '))) == []
+        assert list(JSONArrayStream(io.BytesIO(b''))) == []
+        assert list(JSONArrayStream(io.BytesIO(b'[1 ,\n 22 ]'),
+                                    chunk_size=1)) == [1, 22]
+
+    def test_invalid_input(self):
+        with raises(ValueError):
+            list(JSONArrayStream(io.BytesIO(b'{"a": 1}')))
+        with raises(ValueError):
+            list(JSONArrayStream(io.BytesIO(b'[1, 2')))
+        with raises(ValueError):
+            list(JSONArrayStream(io.BytesIO(b'[1; 2]')))
+
+    def test_gzip_stream(self):
+        data = gzip.compress(json.dumps(self.DOCUMENTS).encode('utf-8'))
+        response = FakeResponse(data)
+        result = list(iter_json_array(GzipResponse(response), chunk_size=16))
+        assert result == self.DOCUMENTS
+        assert response.closed
+
+    def test_observed_iterator(self):
+        outcomes = []
+        data = json.dumps([1, 2, 3]).encode('utf-8')
+
+        stream = ObservedIterator(iter_json_array(io.BytesIO(data)),
+                                  outcomes.append)
+        assert list(stream) == [1, 2, 3]
+        stream.close()
+        assert outcomes == [None]
+
+        with raises(ValueError):
+            list(ObservedIterator(iter_json_array(io.BytesIO(b'[1, 2')),
+                                  outcomes.append))
+        assert isinstance(outcomes[-1], ValueError)
+
+        # closed before it has been exhausted
+        response = io.BytesIO(data)
+        stream = ObservedIterator(iter_json_array(response), outcomes.append)
+        assert next(stream) == 1
+        stream.close()
+        assert isinstance(outcomes[-1], GeneratorExit)
+        assert response.closed
+        assert list(stream) == []
+
+        # garbage collected without being read
+        ObservedIterator(iter_json_array(io.BytesIO(data)), outcomes.append)
+        assert isinstance(outcomes[-1], GeneratorExit)
+        assert len(outcomes) == 4
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,11 +10,20 @@ from future import standard_library
 standard_library.install_aliases()
 from builtins import str
 from builtins import range
+import asyncio
+import json
 import unittest
 
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
 from urllib.error import HTTPError
 
-from weblyzard_api.client import MultiRESTClient, RESTClient
+from weblyzard_api.client import MultiRESTClient, RESTClient, \
+    AsyncMultiRESTClient
+from weblyzard_api.client.emotion_classifier_client import \
+    EmotionClassifierClient, AsyncEmotionClassifierClient
+from weblyzard_api.client.jeremia import AsyncJeremia
+from weblyzard_api.client.recognize import Recognize, AsyncRecognize
 
 
 class TestRESTClient(unittest.TestCase):
@@ -89,5 +98,199 @@ class TestRESTClient(unittest.TestCase):
         assert service_urls != client._service_urls
 
 
+class JSONEchoHandler(BaseHTTPRequestHandler):
+    ''' echoes the request path, body and the server's port '''
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._reply({'path': self.path})
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers['Content-Length']))
+        self._reply({'path': self.path, 'data': json.loads(data)})
+
+    def _reply(self, obj):
+        if self.path.endswith('/has_queued_threads'):
+            obj = False
+        elif isinstance(obj, dict):
+            obj['port'] = self.server.server_address[1]
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class JSONEchoServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class JSONEchoServersMixin(object):
+    ''' starts two local JSON echo servers '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.servers = []
+        for _ in range(2):
+            server = JSONEchoServer(('127.0.0.1', 0), JSONEchoHandler)
+            Thread(target=server.serve_forever, daemon=True).start()
+            cls.servers.append(server)
+        cls.urls = ['http://127.0.0.1:%d/rest' % server.server_address[1]
+                    for server in cls.servers]
+
+    @classmethod
+    def tearDownClass(cls):
+        for server in cls.servers:
+            server.shutdown()
+            server.server_close()
+
+
+class TestBatchDispatch(JSONEchoServersMixin, unittest.TestCase):
+
+    def test_dispatch_batches(self):
+        documents = [{'id': i} for i in range(95)]
+        client = MultiRESTClient(self.urls, use_random_server=False)
+        results = client.dispatch_batches('submit', documents, batch_size=10)
+        assert len(results) == 10
+        assert [d for r in results for d in r['data']] == documents
+        assert {r['port'] for r in results} == {
+            server.server_address[1] for server in self.servers}
+        assert client.dispatch_batches('submit', []) == []
+
+    def test_retry_failed_batches(self):
+        documents = [{'id': i} for i in range(30)]
+        client = MultiRESTClient(['http://127.0.0.1:1/rest', self.urls[0]],
+                                 use_random_server=False)
+        results = client.dispatch_batches('submit', documents, batch_size=5,
+                                          max_workers=4)
+        assert [d for r in results for d in r['data']] == documents
+
+        client = MultiRESTClient(['http://127.0.0.1:1/rest'],
+                                 use_random_server=False)
+        with self.assertRaises(Exception) as e:
+            client.dispatch_batches('submit', documents)
+        assert 'Could not make request to path' in str(e.exception)
+
+    def test_dead_service(self):
+        documents = [{'id': i} for i in range(100)]
+        dead_url = 'http://127.0.0.1:1/rest'
+        client = MultiRESTClient([dead_url, self.urls[0]],
+                                 use_random_server=False)
+        results = client.dispatch_batches('submit', documents, batch_size=5,
+                                          max_workers=1)
+        assert [d for r in results for d in r['data']] == documents
+        # the open circuit keeps the remaining batches away from the service
+        statistics = client.get_service_statistics()[dead_url]
+        assert statistics['state'] == 'open'
+        assert statistics['requests'] == 3
+
+    def test_source_id_failure(self):
+        client = MultiRESTClient(['http://127.0.0.1:1/rest', self.urls[0]],
+                                 use_random_server=False)
+        assert client.request('status', source_id=1)['port'] == \
+            self.servers[0].server_address[1]
+        # requests pinned to a failing service raise an exception, even
+        # though another service is available
+        with self.assertRaises(Exception) as e:
+            client.request('status', source_id=2)
+        assert 'Could not make request to path' in str(e.exception)
+
+
+class TestAsyncMultiRESTClient(JSONEchoServersMixin, unittest.TestCase):
+
+    def test_request(self):
+        client = AsyncMultiRESTClient(self.urls, use_random_server=False)
+
+        async def run():
+            return await asyncio.gather(*[
+                client.request('echo/%d' % i, parameters={'i': i})
+                for i in range(50)])
+
+        results = asyncio.run(run())
+        assert [r['data']['i'] for r in results] == list(range(50))
+        assert {r['port'] for r in results} == {
+            self.servers[0].server_address[1]}
+
+    def test_failover_and_fan_out(self):
+        client = AsyncMultiRESTClient(['http://127.0.0.1:1/rest'] + self.urls,
+                                      use_random_server=False)
+        result = asyncio.run(client.request('status'))
+        assert result['port'] == self.servers[0].server_address[1]
+
+        result = asyncio.run(client.request('status',
+                                            execute_all_services=True))
+        assert result['port'] == self.servers[1].server_address[1]
+
+        client = AsyncMultiRESTClient(['http://127.0.0.1:1/rest'],
+                                      use_random_server=False)
+        with self.assertRaises(Exception) as e:
+            asyncio.run(client.request('status'))
+        assert 'Could not make request to path' in str(e.exception)
+        assert not asyncio.run(client.is_online())
+
+    def test_no_streaming(self):
+        client = AsyncMultiRESTClient(self.urls, use_random_server=False)
+        with self.assertRaises(TypeError):
+            client.request('echo', parameters=[1, 2], stream=True)
+        with self.assertRaises(TypeError):
+            client.clients[0].execute('echo', parameters=[1, 2], stream=True)
+
+    def test_dispatch_batches(self):
+        documents = [{'id': i} for i in range(95)]
+        client = AsyncMultiRESTClient(self.urls, use_random_server=False)
+        results = asyncio.run(client.dispatch_batches('submit', documents,
+                                                      batch_size=10))
+        assert [d for r in results for d in r['data']] == documents
+        assert len({r['port'] for r in results}) == 2
+
+    def test_dispatch_batches_dead_service(self):
+        documents = [{'id': i} for i in range(100)]
+        dead_url = 'http://127.0.0.1:1/rest'
+        client = AsyncMultiRESTClient([dead_url, self.urls[0]],
+                                      use_random_server=False)
+        results = asyncio.run(client.dispatch_batches(
+            'submit', documents, batch_size=5, max_workers=1))
+        assert [d for r in results for d in r['data']] == documents
+        statistics = client.get_service_statistics()[dead_url]
+        assert statistics['state'] == 'open'
+        assert statistics['requests'] == 3
+
+    def test_service_client(self):
+        client = AsyncJeremia(self.urls[0])
+        result = asyncio.run(client.submit_documents([{'id': 1}]))
+        assert result['data'] == [{'id': 1}]
+        assert json.loads(asyncio.run(client.status()))['path'] \
+            .endswith('/status')
+
+    def test_sync_and_async_requests(self):
+        ''' the asyncio clients send the same requests as the sync ones '''
+        documents = [{'id': 1, 'lang': 'en', 'sentences': []}]
+        for method, args in (
+                ('search_text', ('en.people.ng', 'Bill Gates')),
+                ('search_document', (['en.people.ng'], {'content_id': 1})),
+                ('search_documents', ('en.people.ng', documents)),
+                ('get_focus', ('en.people.ng', documents)),
+                ('extract_geo_location', ('Vienna',))):
+            expected = getattr(Recognize(self.urls[0]), method)(*args)
+            result = asyncio.run(
+                getattr(AsyncRecognize(self.urls[0]), method)(*args))
+            assert result == expected
+            assert 'profileNames=en.' in result['path'] or \
+                'profiles=en.' in result['path']
+        assert asyncio.run(AsyncRecognize(self.urls[0]).search_documents(
+            'en.people.ng', [])) is None
+
+        expected = EmotionClassifierClient(self.urls[0]).get_emotions(
+            'text', 'plaintext')
+        assert expected['data']['content'] == 'text'
+        assert asyncio.run(AsyncEmotionClassifierClient(
+            self.urls[0]).get_emotions('text', 'plaintext')) == expected
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+
+from urllib.error import HTTPError, URLError
+
+from mock import patch
+from pytest import raises
+
+from weblyzard_api.util.retry import RetryPolicy
+
+
+def http_error(code, headers=None):
+    return HTTPError('http://localhost', code, 'error', headers or {}, None)
+
+
+class Failing(object):
+    ''' raises the given errors before returning 'ok' '''
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_backoff(self):
+        policy = RetryPolicy(base_delay=1, max_delay=5, jitter=False)
+        assert [policy.get_delay(i) for i in range(1, 6)] == [1, 2, 4, 5, 5]
+
+        policy = policy.replace(jitter=True)
+        for attempt in range(1, 6):
+            assert 0 <= policy.get_delay(attempt) <= min(5, 2 ** (attempt - 1))
+
+    def test_classification(self):
+        policy = RetryPolicy()
+        assert policy.is_retryable(http_error(503))
+        assert policy.is_retryable(http_error(429))
+        assert not policy.is_retryable(http_error(400))
+        assert not policy.is_retryable(http_error(404))
+        assert policy.is_retryable(URLError(ConnectionRefusedError()))
+        assert policy.is_retryable(TimeoutError())
+        assert not policy.is_retryable(ValueError())
+
+        policy = policy.replace(retryable_status_codes=(404, ),
+                                retryable_exceptions=(ValueError, ))
+        assert policy.is_retryable(http_error(404))
+        assert not policy.is_retryable(http_error(503))
+        assert policy.is_retryable(ValueError())
+        assert not policy.is_retryable(URLError('error'))
+
+    def test_replace(self):
+        policy = RetryPolicy(max_attempts=3)
+        assert policy.replace(max_attempts=None).max_attempts == 3
+        assert policy.replace(max_attempts=5).max_attempts == 5
+        assert policy.max_attempts == 3
+        with raises(TypeError):
+            policy.replace(unknown=1)
+
+    @patch('weblyzard_api.util.retry.time.sleep')
+    def test_call(self, sleep):
+        policy = RetryPolicy(max_attempts=3, jitter=False)
+        fn = Failing(http_error(503), URLError('refused'))
+        assert policy.call(fn) == 'ok'
+        assert fn.calls == 3
+        assert [c[0][0] for c in sleep.call_args_list] == [0.5, 1.]
+
+        # the number of attempts is limited
+        fn = Failing(*[http_error(503)] * 3)
+        with raises(HTTPError):
+            policy.call(fn)
+        assert fn.calls == 3
+
+        # errors which are not retryable are raised immediately
+        fn = Failing(http_error(400))
+        with raises(HTTPError):
+            policy.call(fn)
+        assert fn.calls == 1
+
+    @patch('weblyzard_api.util.retry.time.sleep')
+    def test_retry_after(self, sleep):
+        policy = RetryPolicy(max_attempts=3, max_delay=10, jitter=False)
+        fn = Failing(http_error(503, {'Retry-After': '7'}),
+                     http_error(503, {'Retry-After': '3600'}))
+        assert policy.call(fn) == 'ok'
+        assert [c[0][0] for c in sleep.call_args_list] == [7., 10.]
+
+    def test_deadline(self):
+        policy = RetryPolicy(max_attempts=100, base_delay=10, deadline=5)
+        with patch('weblyzard_api.util.retry.time') as time:
+            time.time.return_value = 0.
+            fn = Failing(*[http_error(503)] * 10)
+            policy = policy.replace(jitter=False)
+            # the first retry would exceed the deadline
+            with raises(HTTPError):
+                policy.call(fn)
+            assert fn.calls == 1
+            assert not time.sleep.called
+
+    @patch('weblyzard_api.util.retry.time.sleep')
+    def test_attempts(self, sleep):
+        policy = RetryPolicy(max_attempts=4, jitter=False)
+        assert list(policy.attempts()) == [1, 2, 3, 4]
+        assert sleep.call_count == 3
+
+        for attempt in policy.attempts():
+            if attempt == 2:
+                break
+        assert sleep.call_count == 4
+
+    @patch('weblyzard_api.util.retry.time.sleep')
+    def test_decorator(self, sleep):
+        fn = Failing(http_error(502))
+
+        @RetryPolicy()
+        def decorated(value):
+            ''' documentation '''
+            return fn(), value
+
+        assert decorated(1) == ('ok', 1)
+        assert decorated.__doc__ == ''' documentation '''
+        assert fn.calls == 2
+
+    def test_async(self):
+        fn = Failing(http_error(503), http_error(503))
+
+        @RetryPolicy(base_delay=0.001)
+        async def decorated():
+            return fn()
+
+        assert asyncio.run(decorated()) == 'ok'
+        assert fn.calls == 3
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import unittest
+
+from mock import patch
+
+from weblyzard_api.client import MultiRESTClient
+from weblyzard_api.client.server_selection import ServerSelector, \
+    CIRCUIT_CLOSED, CIRCUIT_OPEN, CIRCUIT_HALF_OPEN
+
+
+class TestServerSelector(unittest.TestCase):
+
+    def test_latency_ordering(self):
+        selector = ServerSelector(('a', 'b', 'c'))
+        # unknown services keep the configured order
+        assert selector.order(('a', 'b', 'c')) == ['a', 'b', 'c']
+
+        with patch('weblyzard_api.client.server_selection.time') as time:
+            for key, latency in (('a', 3.), ('b', 1.), ('c', 2.)):
+                time.return_value = 0.
+                start_time = selector.start(key)
+                time.return_value = latency
+                selector.success(key, start_time)
+
+        assert selector.order(('a', 'b', 'c')) == ['b', 'c', 'a']
+
+        # requests in flight increase the expected cost
+        selector.start('b')
+        selector.start('b')
+        assert selector.order(('a', 'b', 'c')) == ['c', 'a', 'b']
+
+    def test_circuit_breaker(self):
+        selector = ServerSelector(('a', 'b'), failure_threshold=2,
+                                  reset_timeout=10)
+        with patch('weblyzard_api.client.server_selection.time') as time:
+            time.return_value = 100.
+            for _ in range(2):
+                selector.failure('a', selector.start('a'))
+            stats = selector.get_statistics()
+            assert stats['a']['state'] == CIRCUIT_OPEN
+            assert stats['a']['failures'] == 2
+            assert selector.order(('a', 'b')) == ['b']
+
+            # the reset timeout has expired: a is probed first
+            time.return_value = 111.
+            assert selector.order(('a', 'b')) == ['a', 'b']
+            assert selector.get_statistics()['a']['state'] == CIRCUIT_OPEN
+            start_time = selector.start('a')
+            assert selector.get_statistics()['a']['state'] == \
+                CIRCUIT_HALF_OPEN
+            # no further requests while the probe is in flight
+            assert selector.order(('a', 'b')) == ['b']
+            selector.cancel('a')
+            assert selector.order(('a', 'b')) == ['a', 'b']
+
+            # a failed probe re-opens the circuit
+            selector.failure('a', selector.start('a'))
+            assert selector.order(('a', 'b')) == ['b']
+
+            time.return_value = 122.
+            assert 'a' in selector.order(('a', 'b'))
+            selector.success('a', selector.start('a'))
+            assert selector.get_statistics()['a']['state'] == CIRCUIT_CLOSED
+
+    def test_recovery(self):
+        ''' a recovered service is used again, although the other service
+            keeps succeeding '''
+        selector = ServerSelector(('a', 'b'), failure_threshold=1,
+                                  reset_timeout=10)
+        healthy = {'a': False, 'b': True}
+        successes = {'a': 0, 'b': 0}
+        with patch('weblyzard_api.client.server_selection.time') as time:
+            for now in range(100):
+                time.return_value = float(now)
+                if now == 50:
+                    healthy['a'] = True
+                for key in selector.order(('a', 'b')):
+                    start_time = selector.start(key)
+                    if healthy[key]:
+                        selector.success(key, start_time)
+                        successes[key] += 1
+                        break
+                    # failures time out
+                    time.return_value = now + 5.
+                    selector.failure(key, start_time)
+
+        assert selector.get_statistics()['a']['state'] == CIRCUIT_CLOSED
+        assert successes['a'] > 0
+
+    def test_all_services_unavailable(self):
+        selector = ServerSelector(('a', 'b'), failure_threshold=1)
+        selector.failure('b', selector.start('b'))
+        selector.failure('a', selector.start('a'))
+        # fall back to the services which failed first
+        assert selector.order(('a', 'b')) == ['b', 'a']
+
+    def test_multi_rest_client(self):
+        client = MultiRESTClient(['http://127.0.0.1:1', 'http://127.0.0.1:2'],
+                                 use_random_server=False)
+        client.selector.failure_threshold = 1
+        with self.assertRaises(Exception):
+            client.request('status')
+
+        statistics = client.get_service_statistics()
+        assert len(statistics) == 2
+        for service_statistics in statistics.values():
+            assert service_statistics['state'] == CIRCUIT_OPEN
+            assert service_statistics['in_flight'] == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+Micro benchmarks of the performance critical code paths.
+
+usage::
+
+    python -m weblyzard_api.tests.benchmark.<benchmark module> [size]
+'''
+from __future__ import print_function
+
+import timeit
+
+REPETITIONS = 5
+
+
+def benchmark(name, fn, num_items=None, item='value', details=''):
+    ''' prints the best time of `REPETITIONS` calls of fn
+
+    :param name: the name of the benchmark
+    :param fn: the function to benchmark
+    :param num_items: the number of items processed by fn; if given, the
+                      time per item is printed instead of the total time
+    :param item: the name of the items
+    :param details: additional information appended to the output
+    :returns: the best time in seconds
+    '''
+    best = min(timeit.repeat(fn, number=1, repeat=REPETITIONS))
+    if num_items:
+        print('%-45s %8.2f us/%s%s' % (name, best * 1e6 / num_items, item,
+                                       details))
+    else:
+        print('%-45s %8.1f ms%s' % (name, best * 1000, details))
+    return best
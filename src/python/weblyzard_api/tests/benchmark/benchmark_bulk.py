@@ -0,0 +1,37 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+Benchmarks the throughput of the bulk conversion of webLyzard XML documents
+to JSON API 1.0 dictionaries with different numbers of processes.
+
+usage::
+
+    python -m weblyzard_api.tests.benchmark.benchmark_bulk [documents]
+'''
+from __future__ import print_function
+
+import os
+import sys
+
+from weblyzard_api.model.bulk import BulkConverter, xml_to_api_dict
+from weblyzard_api.tests.benchmark.benchmark_xml_parser import \
+    get_xml_document
+
+DEFAULT_NUM_DOCUMENTS = 1000
+SENTENCES_PER_DOCUMENT = 50
+
+
+def main(num_documents=DEFAULT_NUM_DOCUMENTS):
+    documents = [get_xml_document(SENTENCES_PER_DOCUMENT)] * num_documents
+    print('%d documents with %d sentences' % (num_documents,
+                                             SENTENCES_PER_DOCUMENT))
+    for processes in sorted({1, 2, os.cpu_count() or 1}):
+        converter = BulkConverter(xml_to_api_dict, processes=processes)
+        for _ in converter.imap(documents):
+            pass
+        print('%2d processes %10.1f documents/s' % (
+            processes, converter.statistics.throughput))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
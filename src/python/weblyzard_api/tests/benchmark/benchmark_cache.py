@@ -0,0 +1,120 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+Benchmarks the lookups of a full :class:`MemoryCached` cache with the
+different eviction policies, of a :class:`TTLMemoryCached` cache whose
+results expire quickly and of the former sort based LRU eviction, as well
+as the hits of an unbounded and a bounded :class:`DiskCache`.
+
+usage::
+
+    python -m weblyzard_api.tests.benchmark.benchmark_cache [cache_size]
+'''
+from __future__ import print_function
+
+import datetime
+import random
+import shutil
+import sys
+import tempfile
+
+from operator import itemgetter
+from time import time
+
+from weblyzard_api.tests.benchmark import benchmark
+from weblyzard_api.util.cache import (EVICTION_POLICIES, DiskCache,
+                                      MemoryCached, TTLMemoryCached)
+
+DEFAULT_CACHE_SIZE = 5000
+LOOKUPS_PER_ENTRY = 4
+
+
+class LegacyMemoryCached(MemoryCached):
+    ''' the former MemoryCached, which sorts the usage time stamps on every
+        insert into a full cache '''
+
+    def fetchObjectId(self, key, fetch_function, *args, **kargs):
+        key = self.getObjectId(key)
+        self._usage[key] = time()
+        try:
+            return self._cacheData[key]
+        except KeyError:
+            obj = fetch_function(*args, **kargs)
+            if obj is not None:
+                self.garbage_collect_cache()
+                self._cacheData[key] = obj
+            return obj
+
+    def garbage_collect_cache(self):
+        if self.max_cache_size == 0 or len(
+                self._cacheData) <= self.max_cache_size:
+            return
+
+        (key, _) = sorted(list(self._usage.items()),
+                          key=itemgetter(1), reverse=True).pop()
+        del self._usage[key]
+        del self._cacheData[key]
+
+
+def get_keys(cache_size):
+    ''' :returns: entity lookups of frequent keys mixed with a long tail of
+                  rarely used keys '''
+    rnd = random.Random(42)
+    return [int(rnd.paretovariate(1.)) if rnd.random() < 0.6
+            else rnd.randrange(10 * cache_size)
+            for _ in range(LOOKUPS_PER_ENTRY * cache_size)]
+
+
+def benchmark_lookups(name, get_cache, keys):
+    ''' benchmarks the lookups of a new cache and reports its hit rate '''
+    def run():
+        computed = []
+        lookup = get_cache()(lambda key: computed.append(key) or key)
+        for key in keys:
+            lookup(key)
+        return len(computed)
+
+    hits = 100. * (1 - run() / len(keys))
+    benchmark(name, run, num_items=len(keys), item='lookup',
+              details=' %6.1f %% hits' % hits)
+
+
+def benchmark_hits(name, cache, keys):
+    for key in keys:
+        cache.fetch(str, key)
+    benchmark(name, lambda: [cache.fetch(str, key) for key in keys],
+              num_items=len(keys), item='lookup')
+
+
+def main(cache_size=DEFAULT_CACHE_SIZE):
+    keys = get_keys(cache_size)
+    print('%d lookups, %d distinct keys, cache size %d' % (
+        len(keys), len(set(keys)), cache_size))
+
+    def get_legacy_cache():
+        cache = LegacyMemoryCached(cache_size)
+        cache._usage = {}
+        return cache
+
+    benchmark_lookups('sort based LRU (former)', get_legacy_cache, keys)
+    for policy in sorted(EVICTION_POLICIES):
+        benchmark_lookups('MemoryCached (%s)' % policy,
+                          lambda: MemoryCached(cache_size, policy=policy),
+                          keys)
+    benchmark_lookups('TTLMemoryCached (lru)', lambda: TTLMemoryCached(
+        datetime.timedelta(milliseconds=1), cache_size), keys)
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        for name, cache in (
+                ('DiskCache hits', DiskCache(cache_dir + '/unbounded', 2)),
+                ('DiskCache hits (max_cache_size)',
+                 DiskCache(cache_dir + '/bounded', 2,
+                           max_cache_size=10 * cache_size))):
+            benchmark_hits(name, cache, keys[:cache_size // 10])
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,151 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+Benchmarks the conversion of :class:`Document` objects from and to
+dictionaries and verifies that the results match the former, generic
+implementation.
+
+usage::
+
+    python -m weblyzard_api.tests.benchmark.benchmark_document [tokens]
+'''
+from __future__ import print_function
+
+import json
+import sys
+
+from datetime import datetime
+from decimal import Decimal
+
+from weblyzard_api.model import CharSpan, SpanFactory
+from weblyzard_api.model.document import Document
+from weblyzard_api.tests.benchmark import benchmark
+from weblyzard_api.tests.always_run.model import test_json2018
+
+DEFAULT_NUM_TOKENS = 20000
+
+
+def legacy_dict_transform(data, mapping=Document.MAPPING):
+    ''' the former Document._dict_transform '''
+    if data is None:
+        return None
+    if isinstance(data, (str, int, float)):
+        return data
+    if isinstance(data, Decimal):
+        return str(data)
+    if isinstance(data, tuple):
+        return data[0] if len(data) == 1 else data
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    if isinstance(data, bytes):
+        return data.decode("utf-8")
+    if isinstance(data, datetime):
+        return data.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(data, dict):
+        result = {}
+        for key, value in data.items():
+            key = mapping.get(key, key)
+            if value is not None:
+                value = legacy_dict_transform(value, mapping)
+                if value is not None:
+                    result[key] = value
+        return result
+    if not isinstance(data, (list, CharSpan)) and hasattr(data, '__len__'):
+        data = list(data)  # ColumnarPartition
+    if isinstance(data, list):
+        return [legacy_dict_transform(item, mapping) for item in data]
+
+    result = {}
+    attributes = data.get_attributes() if isinstance(data, CharSpan) \
+        else data.__dict__
+    for key, value in attributes.items():
+        if key in mapping:
+            key = mapping[key]
+        elif key.startswith('_'):
+            continue
+        if value is not None:
+            if key == 'lang':
+                value = value.upper()
+            value = legacy_dict_transform(value, mapping)
+            if value is not None:
+                result[key] = legacy_dict_transform(value, mapping)
+    return result
+
+
+def legacy_from_dict(dict_):
+    ''' the former Document.from_dict (without validation) '''
+    inverse_mapping = {v: k for k, v in Document.MAPPING.items()
+                       if k != 'content_id'}
+    parsed_content = legacy_dict_transform(dict_, inverse_mapping)
+    parsed_content['content_id'] = parsed_content.pop('md5sum')
+    partitions = {label: [SpanFactory.new_span(span) for span in spans]
+                  for label, spans in parsed_content['partitions'].items()} \
+        if 'partitions' in parsed_content else {}
+    return Document(content_id=int(parsed_content['content_id']),
+                    content=parsed_content.get('content'),
+                    nilsimsa=parsed_content.get('nilsimsa'),
+                    lang=parsed_content.get('lang'),
+                    content_type=parsed_content.get('content_type'),
+                    partitions=partitions,
+                    header=parsed_content.get('header') or {},
+                    annotations=parsed_content.get('annotations', {}))
+
+
+def get_document_dict(num_tokens):
+    ''' :returns: the dictionary of a document with the given number of
+                  tokens, ten tokens per sentence and one annotation per
+                  sentence '''
+    words = ['token%d' % (i % 100) for i in range(num_tokens)]
+    content = ' '.join(words)
+    tokens, sentences, annotations = [], [], []
+    start = 0
+    for i, word in enumerate(words):
+        tokens.append({'@type': 'TokenCharSpan', 'start': start,
+                       'end': start + len(word), 'pos': 'NN',
+                       'dependency': {'parent': i - 1, 'label': 'dep'}})
+        start += len(word) + 1
+    for i in range(0, num_tokens, 10):
+        last = tokens[min(i + 9, num_tokens - 1)]
+        sentences.append({'@type': 'SentenceCharSpan',
+                          'start': tokens[i]['start'], 'end': last['end'],
+                          'id': '%032x' % i, 'semOrient': 0.5,
+                          'significance': 0.25, 'emotions': {}})
+        annotations.append({'start': tokens[i]['start'],
+                            'end': tokens[i]['end'],
+                            'key': 'http://dbpedia.org/resource/%d' % i,
+                            'annotationType': 'ORGANIZATION',
+                            'surfaceForm': words[i], 'md5sum': None})
+    return {'id': 1, 'format': 'text/plain', 'lang': 'EN',
+            'content': content, 'header': {'title': 'benchmark'},
+            'annotations': annotations, 'nilsimsa': None,
+            'partitions': {'BODY': [{'@type': 'CharSpan', 'start': 0,
+                                     'end': len(content)}],
+                           'TOKEN': tokens, 'SENTENCE': sentences}}
+
+
+def check_parity(document_dict):
+    document = Document.from_dict(document_dict)
+    legacy_document = legacy_from_dict(document_dict)
+    assert document.partitions == legacy_document.partitions
+    assert document.to_dict() == legacy_dict_transform(legacy_document)
+    assert document.to_dict() == legacy_dict_transform(document)
+    document.to_columnar()
+    assert document.to_dict() == legacy_dict_transform(legacy_document)
+
+
+def main(num_tokens=DEFAULT_NUM_TOKENS):
+    document_dict = get_document_dict(num_tokens)
+    check_parity(json.loads(test_json2018.TestJSON2018Parser.JSON_2018))
+    check_parity(document_dict)
+    print('document with %d tokens - results match the former '
+          'implementation' % num_tokens)
+
+    document = Document.from_dict(document_dict)
+    benchmark('from_dict (former)', lambda: legacy_from_dict(document_dict))
+    benchmark('Document.from_dict', lambda: Document.from_dict(document_dict))
+    benchmark('to_dict (former)', lambda: legacy_dict_transform(document))
+    benchmark('Document.to_dict', document.to_dict)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,78 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+Benchmarks decoding the partitions of large JSON documents into span
+objects (time and memory).
+
+The dictionary based span classes used before the introduction of
+`__slots__` serve as baseline.
+
+usage::
+
+    python -m weblyzard_api.tests.benchmark.benchmark_spans [tokens]
+'''
+from __future__ import print_function
+
+import sys
+import tracemalloc
+
+from weblyzard_api.model import SpanFactory, TokenCharSpan
+from weblyzard_api.model.columnar import ColumnarPartition
+from weblyzard_api.tests.benchmark import benchmark
+
+DEFAULT_NUM_TOKENS = 20000
+
+
+class DictTokenCharSpan(object):
+    ''' the former, dictionary based TokenCharSpan '''
+
+    def __init__(self, start, end, span_type=TokenCharSpan.SPAN_TYPE,
+                 pos=None, dependency=None):
+        self.span_type = span_type
+        self.start = start
+        self.end = end
+        self.pos = pos or TokenCharSpan.DEFAULT_POS
+        self.dependency = dependency
+
+    @classmethod
+    def from_dict(cls, dict_):
+        kwargs = {TokenCharSpan.DICT_MAPPING.get(k, k): v
+                  for k, v in dict_.items()}
+        del kwargs['span_type']
+        return cls(**kwargs)
+
+
+def get_token_partition(num_tokens):
+    ''' :returns: a TOKEN partition as returned by the web services '''
+    return [{'@type': 'TokenCharSpan', 'start': i * 6, 'end': i * 6 + 5,
+             'pos': 'NN', 'dependency': {'parent': i - 1, 'label': 'dep'}}
+            for i in range(num_tokens)]
+
+
+def benchmark_memory(name, fn):
+    ''' benchmarks fn and reports the memory retained by its result '''
+    tracemalloc.start()
+    result = fn()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    benchmark(name, fn, details=' %8d kB' % (size // 1024))
+
+
+def main(num_tokens=DEFAULT_NUM_TOKENS):
+    partition = get_token_partition(num_tokens)
+    print('partition with %d tokens' % num_tokens)
+    benchmark_memory('dict based spans (baseline)',
+                     lambda: [DictTokenCharSpan.from_dict(span)
+                              for span in partition])
+    benchmark_memory('SpanFactory.new_span',
+                     lambda: [SpanFactory.new_span(span)
+                              for span in partition])
+    benchmark_memory('SpanFactory.new_spans',
+                     lambda: SpanFactory.new_spans(partition))
+    benchmark_memory('ColumnarPartition.from_spans',
+                     lambda: ColumnarPartition.from_spans(partition))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,71 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+Benchmarks parsing of large webLyzard XML documents (e.g. PDF crawls with
+thousands of sentences).
+
+usage::
+
+    python -m weblyzard_api.tests.benchmark.benchmark_xml_parser [sentences]
+'''
+from __future__ import print_function
+
+import io
+import sys
+
+from lxml import etree
+
+from weblyzard_api.model.parsers.xml_2013 import XML2013
+from weblyzard_api.model.xml_content import XMLContent
+from weblyzard_api.tests.benchmark import benchmark
+
+DEFAULT_NUM_SENTENCES = 5000
+
+
+def get_xml_document(num_sentences, duplicate_ratio=0.1):
+    ''' :returns: an XML2013 document with the given number of sentences,
+                  a share of which are duplicates, and one annotation per
+                  sentence '''
+    sentences, annotations = [], []
+    num_unique = int(num_sentences * (1 - duplicate_ratio))
+    for i in range(num_sentences):
+        sent_id = '%032x' % (i % num_unique)
+        sentences.append(
+            '<wl:sentence wl:id="%s" wl:pos="DT NN VBZ JJ ." '
+            'wl:token="0,3 4,12 13,15 16,25 25,26" wl:sem_orient="0.0" '
+            'wl:significance="%d.5"%s><![CDATA[The sentence %d is short.]]>'
+            '</wl:sentence>' % (sent_id, i, ' wl:is_title="true"'
+                                if i == 0 else '', i))
+        annotations.append(
+            '<wl:annotation wl:key="http://dbpedia.org/resource/%d" '
+            'wl:surfaceForm="sentence" wl:start="4" wl:end="12" '
+            'wl:md5sum="%s"/>' % (i, sent_id))
+    return ('<wl:page xmlns:wl="http://www.weblyzard.com/wl/2013#" '
+            'xmlns:dc="http://purl.org/dc/elements/1.1/" wl:id="1" '
+            'dc:format="text/html" xml:lang="en">%s%s</wl:page>'
+            % (''.join(sentences), ''.join(annotations)))
+
+
+def main(num_sentences=DEFAULT_NUM_SENTENCES):
+    xml = get_xml_document(num_sentences)
+    xml_bytes = xml.encode('utf-8')
+    root = etree.fromstring(xml_bytes)
+    print('document with %d sentences (%d kB)' % (num_sentences,
+                                                 len(xml_bytes) // 1024))
+    benchmark('XML2013.parse (str)', lambda: XML2013.parse(xml))
+    benchmark('XML2013.parse (bytes)', lambda: XML2013.parse(xml_bytes))
+    benchmark('XML2013.load_sentences', lambda: XML2013.load_sentences(root))
+    benchmark('XMLContent', lambda: XMLContent(xml))
+    benchmark('XMLContent (lazy, content_id)',
+              lambda: XMLContent(xml, lazy=True).get_content_id())
+    xml_content = XMLContent(xml)
+    benchmark('XMLContent.to_api_dict', xml_content.to_api_dict)
+    benchmark('XMLContent.to_json', xml_content.to_json)
+    benchmark('XMLContent.get_xml_document', xml_content.get_xml_document)
+    benchmark('XMLContent.write_xml_documents',
+              lambda: XMLContent.write_xml_documents(io.BytesIO(),
+                                                     [xml_content]))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,111 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+Microbenchmarks for the value helpers of :class:`XMLParser`, which are
+applied to every attribute of every parsed or serialized document, and
+verifies that the results match the former implementations.
+
+usage::
+
+    python -m weblyzard_api.tests.benchmark.benchmark_xml_values [values]
+'''
+from __future__ import print_function
+
+import json
+import math
+import sys
+import unicodedata
+
+from weblyzard_api.model.parsers import XMLParser
+from weblyzard_api.tests.benchmark import benchmark
+
+DEFAULT_NUM_VALUES = 10000
+
+
+def legacy_remove_control_characters(value):
+    return ''.join(ch for ch in value if unicodedata.category(ch)[0] != 'C')
+
+
+def legacy_decode_value(value):
+    try:
+        decoded = json.loads(value)
+        if decoded in (float('inf'), float('-inf'), float('nan')):
+            raise ValueError('deserializing of invalid json values')
+        else:
+            return decoded
+    except ValueError:
+        return value
+
+
+def legacy_cast_item(item):
+    if item.lower() == 'true':
+        return True
+    elif item.lower() == 'false':
+        return False
+
+    try:
+        return int(item)
+    except Exception:
+        pass
+
+    try:
+        return float(item)
+    except Exception:
+        pass
+
+    try:
+        return json.loads(item)
+    except Exception:
+        pass
+    return item
+
+
+def get_values(num_values):
+    ''' :returns: typical attribute values, sentences and feature values '''
+    attributes = ['7e985ffb692bb6f617f25619ecca39a9', 'text/html', 'de',
+                  '0.0', '1.5', '228557824', 'true', 'DT NN VBZ JJ .',
+                  '0,3 4,12 13,15 16,25 25,26', 'http://www.weblyzard.com',
+                  '["a", "b"]', 'NaN']
+    sentences = ['Die Grüße des %d. Tages sind – wie immer – herzlich.' % i
+                 if i % 4 else 'Zeile %d\nmit\tSteuerzeichen​.' % i
+                 for i in range(num_values)]
+    return [attributes[i % len(attributes)] for i in range(num_values)], \
+        sentences
+
+
+def equal(a, b):
+    if isinstance(a, float) and math.isnan(a):
+        return isinstance(b, float) and math.isnan(b)
+    return type(a) == type(b) and a == b
+
+
+def check_parity(attributes, sentences):
+    for value in attributes + sentences:
+        assert equal(XMLParser.decode_value(value),
+                     legacy_decode_value(value))
+        assert equal(XMLParser.cast_item(value), legacy_cast_item(value))
+        assert XMLParser.remove_control_characters(value) == \
+            legacy_remove_control_characters(value)
+
+
+def main(num_values=DEFAULT_NUM_VALUES):
+    attributes, sentences = get_values(num_values)
+    check_parity(attributes, sentences)
+    print('%d values - results match the former implementation' % num_values)
+
+    for name, fn, values in (
+            ('remove_control_characters (former)',
+             legacy_remove_control_characters, sentences),
+            ('XMLParser.remove_control_characters',
+             XMLParser.remove_control_characters, sentences),
+            ('encode_value (attributes)', XMLParser.encode_value, attributes),
+            ('decode_value (former)', legacy_decode_value, attributes),
+            ('XMLParser.decode_value', XMLParser.decode_value, attributes),
+            ('cast_item (former)', legacy_cast_item, attributes),
+            ('XMLParser.cast_item', XMLParser.cast_item, attributes)):
+        benchmark(name, lambda: [fn(value) for value in values],
+                  num_items=len(values))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,379 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+asyncio based access to HTTP resources
+
+Provides a minimal HTTP/1.1 client on top of asyncio streams with per-host
+keep-alive connection pools, so that a single event loop can keep many
+requests in flight without requiring one thread per request.
+
+.. remarks:
+   errors are reported with the same exceptions as :mod:`urllib`
+   (:class:`urllib.error.HTTPError` and :class:`urllib.error.URLError`).
+'''
+import asyncio
+import gzip
+import http.client
+import urllib.error
+
+from email.parser import Parser
+from typing import Dict
+from urllib.parse import urlsplit, urlunsplit, urljoin
+
+from weblyzard_api.util.http import (USER_AGENT, DEFAULT_TIMEOUT,
+                                     DEFAULT_POOL_SIZE, HTTP_REDIRECT_CODES,
+                                     MAX_REDIRECTS, CREDENTIAL_HEADERS,
+                                     Retrieve, get_origin)
+
+import logging
+log = logging.getLogger(__name__)
+
+# maximum number of concurrent connections per host
+DEFAULT_CONNECTION_LIMIT = 100
+
+
+class AsyncResponse(object):
+    ''' A completely read HTTP response '''
+
+    __slots__ = ('url', 'code', 'reason', 'headers', 'body')
+
+    def __init__(self, url, code, reason, headers, body):
+        self.url = url
+        self.code = code
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    @property
+    def status(self):
+        return self.code
+
+    def read(self):
+        return self.body
+
+    def close(self):
+        pass
+
+
+class AsyncHTTPConnectionPool(object):
+    ''' A pool of keep-alive asyncio stream connections to a single host '''
+
+    def __init__(self, scheme: str, host: str, port: int=None,
+                 max_size: int=DEFAULT_POOL_SIZE,
+                 limit: int=DEFAULT_CONNECTION_LIMIT):
+        '''
+        :param scheme: 'http' or 'https'
+        :param host: the host name
+        :param port: optional port
+        :param max_size: maximum number of idle connections to retain
+        :param limit: maximum number of concurrent connections
+        '''
+        self.scheme = scheme
+        self.host = host
+        self.port = port or (443 if scheme == 'https' else 80)
+        self.max_size = max_size
+        self._idle = []
+        self._semaphore = asyncio.Semaphore(limit)
+        default_port = 443 if scheme == 'https' else 80
+        self._host_header = host if self.port == default_port \
+            else '%s:%d' % (host, self.port)
+
+    async def _get_connection(self):
+        ''' :returns: a tuple (reader, writer, reused) '''
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.open_connection(
+            self.host, self.port, ssl=self.scheme == 'https')
+        return reader, writer, False
+
+    def _release(self, reader, writer):
+        if len(self._idle) < self.max_size:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+    def close(self):
+        ''' closes all idle connections '''
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+    async def urlopen(self, method: str, url: str, body: bytes=None,
+                      headers: Dict=None) -> AsyncResponse:
+        ''' Sends a request over a pooled connection.
+        :param method: the HTTP method
+        :param url: the full request url
+        :param body: optional request body
+        :param headers: optional request headers
+        :returns: the :class:`AsyncResponse`
+        '''
+        split_url = urlsplit(url)
+        selector = urlunsplit(('', '', split_url.path or '/',
+                               split_url.query, ''))
+        async with self._semaphore:
+            while True:
+                try:
+                    reader, writer, reused = await self._get_connection()
+                except OSError as e:
+                    raise urllib.error.URLError(e)
+                status_line = None
+                try:
+                    status_line = await self._send(
+                        reader, writer, method, selector, body, headers or {})
+                    response, will_close = await self._read_response(
+                        reader, method, status_line)
+                except (http.client.RemoteDisconnected, ConnectionResetError,
+                        BrokenPipeError) as e:
+                    writer.close()
+                    # the server dropped an idle keep-alive connection; once
+                    # a response has been received, the request has been
+                    # processed and must not be repeated
+                    if reused and status_line is None:
+                        continue
+                    raise urllib.error.URLError(e)
+                except (OSError, asyncio.IncompleteReadError) as e:
+                    writer.close()
+                    raise urllib.error.URLError(e)
+                except BaseException:
+                    # e.g. cancellations - the connection state is unknown
+                    writer.close()
+                    raise
+
+                if will_close:
+                    writer.close()
+                else:
+                    self._release(reader, writer)
+                response.url = url
+                return response
+
+    async def _send(self, reader, writer, method, selector, body, headers):
+        ''' sends the request
+        :returns: the response's status line
+        '''
+        lines = ['%s %s HTTP/1.1' % (method, selector),
+                 'Host: %s' % self._host_header]
+        lines.extend('%s: %s' % item for item in headers.items())
+        if body is not None:
+            lines.append('Content-Length: %d' % len(body))
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if body:
+            writer.write(body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise http.client.RemoteDisconnected(
+                'Remote end closed connection without response')
+        return status_line
+
+    async def _read_response(self, reader, method, status_line):
+        ''' reads the complete response
+        :returns: a tuple (response, will_close)
+        '''
+        version, code, reason = (status_line.decode('latin-1').rstrip('\r\n')
+                                 .split(' ', 2) + [''])[:3]
+        code = int(code)
+
+        header_lines = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            header_lines.append(line.decode('latin-1'))
+        response_headers = Parser(_class=http.client.HTTPMessage).parsestr(
+            ''.join(header_lines))
+
+        connection = (response_headers.get('Connection') or '').lower()
+        will_close = connection == 'close' or (
+            version == 'HTTP/1.0' and connection != 'keep-alive')
+
+        content_length = response_headers.get('Content-Length')
+        if method == 'HEAD' or code in (204, 304) or 100 <= code < 200:
+            data = b''
+        elif (response_headers.get('Transfer-Encoding') or '').lower() \
+                == 'chunked':
+            data = await self._read_chunked(reader)
+        elif content_length is not None:
+            data = await reader.readexactly(int(content_length))
+        else:
+            data = await reader.read()
+            will_close = True
+
+        if response_headers.get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        return AsyncResponse(None, code, reason, response_headers,
+                             data), will_close
+
+    @staticmethod
+    async def _read_chunked(reader):
+        chunks = []
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        # skip trailers
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        return b''.join(chunks)
+
+
+class AsyncHTTPPoolManager(object):
+    ''' Maintains one :class:`AsyncHTTPConnectionPool` per scheme, host and
+        port.
+
+        .. remarks:
+           connections are bound to the event loop they have been created
+           in; the pools are therefore closed and reset if used from
+           another loop.
+    '''
+
+    def __init__(self, pool_size: int=DEFAULT_POOL_SIZE,
+                 limit: int=DEFAULT_CONNECTION_LIMIT):
+        '''
+        :param pool_size: number of idle connections retained per host
+        :param limit: maximum number of concurrent connections per host
+        '''
+        self.pool_size = pool_size
+        self.limit = limit
+        self._pools = {}
+        self._loop = None
+
+    def connection_pool(self, url: str) -> AsyncHTTPConnectionPool:
+        ''' :returns: the connection pool responsible for the given url '''
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self.clear()
+            self._loop = loop
+
+        split_url = urlsplit(url)
+        key = (split_url.scheme, split_url.hostname, split_url.port)
+        if key not in self._pools:
+            self._pools[key] = AsyncHTTPConnectionPool(
+                *key, max_size=self.pool_size, limit=self.limit)
+        return self._pools[key]
+
+    async def urlopen(self, method: str, url: str, body: bytes=None,
+                      headers: Dict=None,
+                      timeout=DEFAULT_TIMEOUT) -> AsyncResponse:
+        ''' Sends a request to the given url, following redirects and
+            translating error codes into :class:`urllib.error.HTTPError`.
+            Authorization and Cookie headers are dropped on redirects to
+            another origin.
+        '''
+        for _ in range(MAX_REDIRECTS + 1):
+            try:
+                response = await asyncio.wait_for(
+                    self.connection_pool(url).urlopen(method, url, body,
+                                                      headers),
+                    timeout)
+            except asyncio.TimeoutError as e:
+                raise urllib.error.URLError(e)
+
+            location = response.headers.get('Location')
+            if response.code in HTTP_REDIRECT_CODES and location:
+                redirect_url = urljoin(url, location)
+                if get_origin(redirect_url) != get_origin(url):
+                    headers = {k: v for k, v in (headers or {}).items()
+                               if k.lower() not in CREDENTIAL_HEADERS}
+                url = redirect_url
+                if response.code == 303 or (response.code in (301, 302)
+                                            and method == 'POST'):
+                    method, body = ('HEAD', None) if method == 'HEAD' \
+                        else ('GET', None)
+                    headers = {k: v for k, v in (headers or {}).items()
+                               if k.lower() != 'content-type'}
+                continue
+
+            if response.code >= 400:
+                raise urllib.error.HTTPError(url, response.code,
+                                             response.reason,
+                                             response.headers, None)
+            return response
+
+        raise urllib.error.HTTPError(url, response.code, 'too many redirects',
+                                     response.headers, None)
+
+    def clear(self):
+        ''' closes all idle connections '''
+        for pool in self._pools.values():
+            try:
+                pool.close()
+            except RuntimeError:
+                # the pool's event loop has already been closed
+                pass
+        self._pools = {}
+
+
+class AsyncRetrieve(object):
+    ''' asyncio counterpart of :class:`weblyzard_api.util.http.Retrieve`
+
+        .. remarks:
+           only basic authentification is supported.
+    '''
+
+    __slots__ = ('module', 'user_agent', 'default_timeout', 'pool_manager')
+
+    def __init__(self, module, user_agent=USER_AGENT,
+                 default_timeout=DEFAULT_TIMEOUT,
+                 pool_manager: AsyncHTTPPoolManager=None):
+        '''
+        :param module: the module name to add to the user agent
+        :param user_agent: the user agent to use
+        :param default_timeout: the request timeout
+        :param pool_manager: an optional :class:`AsyncHTTPPoolManager`
+        '''
+        self.module = module
+        self.default_timeout = default_timeout
+        self.pool_manager = pool_manager or AsyncHTTPPoolManager()
+        self.user_agent = user_agent % self.module \
+            if "%s" in user_agent else user_agent
+
+    async def open(self, url: str, user: str=None, pwd: str=None,
+                   data=None, headers: Dict={},
+                   authentification_method: str="basic",
+                   accept_gzip: bool=True,
+                   head_only: bool=False) -> AsyncResponse:
+        ''' Open a URL and return the response
+            :param url: the URL to open
+            :param user: optional user name
+            :param pwd: optional password
+            :param data: optional data to submit
+            :param headers: a dictionary of optional headers
+            :param authentification_method: the used authentification_method
+                        (only 'basic' is supported)
+            :param accept_gzip: flag to change the accepted encoding, gzip
+                        or not
+            :param head_only: if True: only execute a HEAD request
+            :returns: the completely read :class:`AsyncResponse`
+        '''
+        if authentification_method != 'basic':
+            raise ValueError('Unsupported authentification method %s'
+                             % authentification_method)
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        request_headers = {'User-Agent': self.user_agent}
+        if accept_gzip:
+            request_headers['Accept-encoding'] = 'gzip'
+        if user and pwd:
+            request_headers['Authorization'] = \
+                Retrieve._get_basic_auth_header(user, pwd)
+        if data is not None and not any(
+                key.lower() == 'content-type' for key in headers):
+            request_headers['Content-Type'] = \
+                'application/x-www-form-urlencoded'
+        request_headers.update(headers)
+
+        if head_only:
+            method = 'HEAD'
+        else:
+            method = 'GET' if data is None else 'POST'
+        return await self.pool_manager.urlopen(method, url, body=data,
+                                               headers=request_headers,
+                                               timeout=self.default_timeout)
@@ -15,18 +15,28 @@ import logging
 # standard_library.install_aliases()
 from builtins import next
 from builtins import object
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import Future
 import redis
 import pickle
+import re
+import sqlite3
 from pickle import dump, load
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
 
 from gzip import GzipFile
 from hashlib import sha1
+from heapq import heapify, heappop, heappush
 from operator import itemgetter
-from os import makedirs, remove, getpid, link, getenv
-from os.path import exists, dirname, basename, join
+from os import (makedirs, remove, getpid, getenv, fstat, replace, stat,
+                walk)
+from os.path import exists, dirname, basename, join, getmtime, getsize
 from socket import gethostname
+from sys import getsizeof
+from threading import Lock, RLock, Thread
 from time import time
+from types import (BuiltinFunctionType, FunctionType, MethodType,
+                   ModuleType)
 
 from weblyzard_api.util.pickleIterator import WritePickleIterator, ReadPickleIterator
 
@@ -52,6 +62,11 @@ logger = logging.getLogger(__name__)
 DEFAULT_REDIS_HOST = getenv('REDIS_HOST_WL_CACHING', 'localhost')
 DEFAULT_REDIS_PORT = getenv('REDIS_PORT_WL_CACHING', 6379)
 
+# returned by DiskCache._load for missing and expired objects
+_MISSING = object()
+# the object ids computed by Cache.getObjectId
+_OBJECT_ID = re.compile('[0-9a-f]{40}$')
+
 
 def get_unique_temp_file(fname): return join(dirname(fname),
                                              "_%s-%s-%d" % (basename(fname),
@@ -59,6 +74,47 @@ def get_unique_temp_file(fname): return join(dirname(fname),
                                                             getpid()))
 
 
+class SingleFlight(object):
+    ''' Runs a single computation per key at a time; concurrent callers with
+        the same key wait for the result (or exception) of the running
+        computation instead of starting their own. '''
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls = {}
+
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def do(self, key, fn):
+        ''' returns the result of fn() for the given key
+            ::param key: the key identifying the computation
+            ::param fn: function without arguments computing the result
+        '''
+        with self._lock:
+            future = self._calls.get(key)
+            running = future is not None
+            if not running:
+                future = self._calls[key] = Future()
+        if running:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
 class Cache(object):
     ''' An abstract class for caching functions '''
 
@@ -106,28 +162,217 @@ class Cache(object):
         return sha1(repr(obj).encode("utf8")).hexdigest()
 
 
+class DiskCacheIndex(object):
+    ''' An sqlite index of the size, last access and expiry of the files of
+        a bounded DiskCache, which is shared by all processes using the
+        cache directory '''
+
+    FILE_NAME = '.index.sqlite'
+    # number of recorded accesses written to the index at once
+    access_flush_size = 64
+
+    def __init__(self, cache_dir, cache_file_suffix='', ttl=0.):
+        ''' ::param cache_dir: the cache base directory
+            ::param cache_file_suffix: the suffix of the cache files
+            ::param ttl: the time to live of the cache files in seconds (0 for
+                         no expiry)
+        '''
+        self.cache_dir = cache_dir
+        self.cache_file_suffix = cache_file_suffix
+        self.ttl = ttl
+        self.__setstate__({})
+
+    def __getstate__(self):
+        return {'cache_dir': self.cache_dir,
+                'cache_file_suffix': self.cache_file_suffix, 'ttl': self.ttl}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+        self._connection = None
+        self._pid = None
+        self._accessed = {}
+
+    def add(self, obj_id, size):
+        ''' adds or replaces the entry of a cache file '''
+        now = time()
+        with self._lock:
+            self._execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                          (obj_id, size, now,
+                           now + self.ttl if self.ttl else None))
+
+    def record_access(self, obj_id):
+        ''' records the access of a cache file; accesses are written to the
+            index in batches '''
+        with self._lock:
+            self._accessed[obj_id] = time()
+            if len(self._accessed) >= self.access_flush_size:
+                self._flush()
+
+    def remove(self, obj_id):
+        with self._lock:
+            self._accessed.pop(obj_id, None)
+            self._execute('DELETE FROM entries WHERE id = ?', (obj_id, ))
+
+    def get_statistics(self):
+        ''' returns the number of entries and their total size '''
+        with self._lock:
+            result = self._execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries')
+        return result.fetchone() if result else (0, 0)
+
+    def pop_evictable(self, max_entries=0, max_bytes=0, low_water_mark=1.):
+        ''' removes the expired entries and the least recently used entries
+            exceeding the given limits from the index
+            ::param low_water_mark: the fraction of the limits to which the
+                                    index is reduced, if a limit is exceeded
+            ::returns: the ids of the removed entries
+        '''
+        with self._lock:
+            self._flush()
+            try:
+                with self._get_connection() as connection:
+                    return self._pop_evictable(connection, max_entries,
+                                               max_bytes, low_water_mark)
+            except sqlite3.Error:
+                logger.warning('Cannot update the disk cache index %s.',
+                               self.cache_dir, exc_info=True)
+                return []
+
+    def _pop_evictable(self, connection, max_entries, max_bytes,
+                       low_water_mark):
+        evict = [obj_id for obj_id, in connection.execute(
+            'SELECT id FROM entries WHERE expires < ?', (time(), ))]
+        connection.executemany('DELETE FROM entries WHERE id = ?',
+                               ((obj_id, ) for obj_id in evict))
+        entries, total_bytes = connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        if entries <= (max_entries or entries) and \
+                total_bytes <= (max_bytes or total_bytes):
+            return evict
+
+        max_entries = max_entries * low_water_mark or float('inf')
+        max_bytes = max_bytes * low_water_mark or float('inf')
+        lru = []
+        for obj_id, size in connection.execute(
+                'SELECT id, size FROM entries ORDER BY last_access'):
+            if entries <= max_entries and total_bytes <= max_bytes:
+                break
+            lru.append(obj_id)
+            entries -= 1
+            total_bytes -= size
+        connection.executemany('DELETE FROM entries WHERE id = ?',
+                               ((obj_id, ) for obj_id in lru))
+        return evict + lru
+
+    def _flush(self):
+        if self._accessed:
+            accessed, self._accessed = self._accessed, {}
+            self._execute('UPDATE entries SET last_access = ? WHERE id = ?',
+                          [(t, obj_id) for obj_id, t in accessed.items()],
+                          many=True)
+
+    def _execute(self, sql, parameters=(), many=False):
+        try:
+            with self._get_connection() as connection:
+                if many:
+                    return connection.executemany(sql, parameters)
+                return connection.execute(sql, parameters)
+        except sqlite3.Error:
+            logger.warning('Cannot update the disk cache index %s.',
+                           self.cache_dir, exc_info=True)
+
+    def _get_connection(self):
+        # connections must not be shared with forked processes
+        if self._connection is None or self._pid != getpid():
+            index_file = join(self.cache_dir, self.FILE_NAME)
+            makedirs(self.cache_dir, exist_ok=True)
+            is_new = not exists(index_file)
+            self._connection = sqlite3.connect(
+                index_file, timeout=60, check_same_thread=False)
+            self._pid = getpid()
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            with self._connection as connection:
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS entries (id TEXT PRIMARY KEY, '
+                    'size INTEGER, last_access REAL, expires REAL)')
+                connection.execute(
+                    'CREATE INDEX IF NOT EXISTS entries_last_access ON '
+                    'entries (last_access)')
+                connection.execute(
+                    'CREATE INDEX IF NOT EXISTS entries_expires ON '
+                    'entries (expires)')
+                if is_new:
+                    self._import_files(connection)
+        return self._connection
+
+    def _import_files(self, connection):
+        ''' adds the files of a cache directory created without an index '''
+        suffix_length = len(self.cache_file_suffix)
+        entries = []
+        for path, _, file_names in walk(self.cache_dir):
+            for file_name in file_names:
+                obj_id = file_name[:len(file_name) - suffix_length]
+                if file_name.endswith(self.cache_file_suffix) and \
+                        _OBJECT_ID.match(obj_id):
+                    try:
+                        stat_result = stat(join(path, file_name))
+                    except OSError:
+                        continue
+                    mtime = stat_result.st_mtime
+                    entries.append((obj_id, stat_result.st_size, mtime,
+                                    mtime + self.ttl if self.ttl else None))
+        connection.executemany('INSERT OR REPLACE INTO entries VALUES '
+                               '(?, ?, ?, ?)', entries)
+        if entries:
+            logger.info('Added %d existing files to the disk cache index %s.',
+                        len(entries), self.cache_dir)
+
+
 class DiskCache(Cache):
     ''' @class DiskCache
         Caches abitrary functions based on the function's arguments (fetch) or
         on a user defined key (fetchObjectId)
 
+        The cache is bounded, if a maximum size, number of bytes or a time to
+        live is specified. Bounded caches keep track of their files in a
+        DiskCacheIndex and evict expired and least recently used files after
+        every `gc_interval` inserts.
+
         @remarks
         This version of DiskCached is threadsafe
     '''
+    # number of inserts between two garbage collections of a bounded cache
+    gc_interval = 64
+    # fraction of the maximum size to which a full cache is reduced
+    gc_low_water_mark = 0.9
 
     def __init__(self, cache_dir, cache_nesting_level=0, cache_file_suffix="",
-                 fn=None):
+                 fn=None, max_cache_size=0, max_cache_bytes=0, ttl=None):
         ''' initializes the Cache object
             ::param cache_dir: the cache base directory
             ::param cache_nesting_level: optional number of nesting level (0)
             ::param cache_file_suffix: optional suffix for cache files
             ::param fn: function to cache (optional; required for directly calling the class
                           using __call__
+            ::param max_cache_size: optional maximum number of cache files
+            ::param max_cache_bytes: optional maximum size of the cache files
+            ::param ttl: optional time to live of the cache files (timedelta)
         '''
         Cache.__init__(self, fn)
         self.cache_dir = cache_dir
         self.cache_file_suffix = cache_file_suffix
         self.cache_nesting_level = cache_nesting_level
+        self.max_cache_size = max_cache_size
+        self.max_cache_bytes = max_cache_bytes
+        self.ttl = ttl.total_seconds() if ttl else 0.
+        self._single_flight = SingleFlight()
+        self._index = None
+        if max_cache_size or max_cache_bytes or ttl:
+            self._index = DiskCacheIndex(cache_dir, cache_file_suffix,
+                                         self.ttl)
+        self._inserts = 0
 
         self._cache_hit = 0
         self._cache_miss = 0
@@ -150,13 +395,18 @@ class DiskCache(Cache):
 
     def __contains__(self, key):
         ''' returns whether the key is already stored in the cache '''
-        cache_file = self._get_fname(self.getObjectId(key))
-        return exists(cache_file)
+        try:
+            mtime = getmtime(self._get_path(self.getObjectId(key)))
+        except OSError:
+            return False
+        return not self.ttl or mtime + self.ttl >= time()
 
     def __delitem__(self, key):
         ''' removes the given item from the cache '''
-        cache_file = self._get_fname(self.getObjectId(key))
-        remove(cache_file)
+        obj_id = self.getObjectId(key)
+        remove(self._get_path(obj_id))
+        if self._index is not None:
+            self._index.remove(obj_id)
 
     def fetchObjectId(self, key, fetch_function, *args, **kargs):
         ''' fetches the object with the given id, querying
@@ -172,43 +422,95 @@ class DiskCache(Cache):
 
             ::returns: the object (retrieved from the cache or computed)
         '''
-        cache_file = self._get_fname(self.getObjectId(key))
-        if exists(cache_file):
+        obj_id = self.getObjectId(key)
+        obj = self._load(self._get_path(obj_id))
+        if obj is not _MISSING:
             #
             # case 1: cache hit - return the cached result
             #
             self._cache_hit += 1
-            with GzipFile(cache_file) as f:
-                # return load(f)
-                return load(f,
-                            encoding='utf-8')  # [mig] FIXME: no hardcoded enc!
+            if self._index is not None:
+                self._index.record_access(obj_id)
+            return obj
 
         #
         # case 2: cache miss
-        # - compute and cache the result
+        # - compute and cache the result, unless the same result is
+        #   already being computed by another thread
         #
-        temp_file = get_unique_temp_file(cache_file)
-
         self._cache_miss += 1
+        return self._single_flight.do(obj_id, lambda: self._fetch_missing(
+            obj_id, fetch_function, args, kargs))
+
+    def _load(self, cache_file):
+        ''' returns the cached object or _MISSING, if the cache file does
+            not exist or has expired '''
+        try:
+            f = open(cache_file, 'rb')
+        except FileNotFoundError:
+            return _MISSING
+
+        with f:
+            if self.ttl and fstat(f.fileno()).st_mtime + self.ttl < time():
+                return _MISSING
+            with GzipFile(fileobj=f) as gzip_file:
+                # return load(f)
+                return load(gzip_file,
+                            encoding='utf-8')  # [mig] FIXME: no hardcoded enc!
+
+    def _fetch_missing(self, obj_id, fetch_function, args, kargs):
+        ''' computes and caches a missing result, unless another thread has
+            cached it in the meantime '''
+        cache_file = self._get_path(obj_id)
+        obj = self._load(cache_file)
+        if obj is not _MISSING:
+            return obj
+
         obj = fetch_function(*args, **kargs)
 
         # Do not cache None
         if obj is None:
             return obj
 
-        with GzipFile(temp_file, "w") as f:
-            dump(obj, f)
-
+        temp_file = get_unique_temp_file(cache_file)
         try:
-            link(temp_file, cache_file)
-        # ignore file exists errors
-        except OSError as e:
-            if e.errno != 17:
-                raise e
-
-        remove(temp_file)
+            f = GzipFile(temp_file, "w")
+        except FileNotFoundError:
+            makedirs(dirname(cache_file), exist_ok=True)
+            f = GzipFile(temp_file, "w")
+        try:
+            with f:
+                dump(obj, f)
+        except Exception:
+            self._remove(temp_file)
+            raise
+
+        if self._index is not None:
+            self._index.add(obj_id, getsize(temp_file))
+        # replacing the file is atomic, i.e. concurrent readers see either
+        # the old or the new file
+        replace(temp_file, cache_file)
+
+        if self._index is not None:
+            self._inserts += 1
+            if self._inserts % self.gc_interval == 0:
+                self.garbage_collect_cache()
         return obj
 
+    def garbage_collect_cache(self):
+        ''' removes the expired and least recently used files of a bounded
+            cache '''
+        if self._index is None:
+            return
+
+        evicted = self._index.pop_evictable(
+            self.max_cache_size, self.max_cache_bytes, self.gc_low_water_mark)
+        for obj_id in evicted:
+            self._remove(self._get_path(obj_id))
+        if evicted:
+            logger.debug('Evicted %d files from the disk cache %s.',
+                         len(evicted), self.cache_dir)
+
     def _remove(self, fname):
         ''' removes the given files (if it exists) '''
         try:
@@ -218,7 +520,17 @@ class DiskCache(Cache):
 
     def getCacheStatistics(self):
         ''' returns statistics regarding the cache's hit/miss ratio '''
-        return {'cache_hits': self._cache_hit, 'cache_misses': self._cache_miss}
+        statistics = {'cache_hits': self._cache_hit,
+                      'cache_misses': self._cache_miss}
+        if self._index is not None:
+            statistics['cache_entries'], statistics['cache_bytes'] = \
+                self._index.get_statistics()
+        return statistics
+
+    def _get_path(self, obj_id):
+        ''' returns the full path of the given object's cache file '''
+        return join(self.cache_dir, *obj_id[:self.cache_nesting_level],
+                    obj_id + self.cache_file_suffix)
 
     def _get_fname(self, obj_id):
         ''' Computes the filename of the file with the given
@@ -251,21 +563,219 @@ class DiskCached(object):
     '''
     __slots__ = ('cache',)
 
-    def __init__(self, cache_dir, cache_nesting_level=0, cache_file_suffix=""):
+    def __init__(self, cache_dir, cache_nesting_level=0, cache_file_suffix="",
+                 max_cache_size=0, max_cache_bytes=0, ttl=None):
         ''' initializes the Cache object
             ::param fn:                  the function to cache
             ::param cache_dir:           the cache base directory
             ::param cache_nesting_level: optional number of nesting level (0)
             ::param cache_file_suffix:   optional suffix for cache files
+            ::param max_cache_size:      optional maximum number of cache files
+            ::param max_cache_bytes:     optional maximum size of the cache
+                                         files
+            ::param ttl:                 optional time to live of the cache
+                                         files (timedelta)
         '''
         self.cache = DiskCache(
-            cache_dir, cache_nesting_level, cache_file_suffix)
+            cache_dir, cache_nesting_level, cache_file_suffix,
+            max_cache_size=max_cache_size, max_cache_bytes=max_cache_bytes,
+            ttl=ttl)
 
     def __call__(self, fn):
         self.cache.fn = fn
         return self.cache
 
 
+class LRUPolicy(object):
+    ''' evicts the least recently used key '''
+    __slots__ = ('_keys', )
+
+    def __init__(self, max_cache_size=0):
+        self._keys = OrderedDict()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def hit(self, key):
+        ''' marks the key as used '''
+        try:
+            self._keys.move_to_end(key)
+        except KeyError:
+            self._keys[key] = None
+
+    insert = hit
+
+    def evict(self):
+        ''' :returns: the key to evict '''
+        return self._keys.popitem(last=False)[0]
+
+    def remove(self, key):
+        self._keys.pop(key, None)
+
+
+class LFUPolicy(object):
+    ''' evicts the least frequently used key (ties are broken by recency) '''
+    __slots__ = ('_frequencies', '_keys', '_min_frequency')
+
+    def __init__(self, max_cache_size=0):
+        self._frequencies = {}
+        # frequency -> keys with that frequency in the order of their usage
+        self._keys = defaultdict(OrderedDict)
+        self._min_frequency = 0
+
+    def __len__(self):
+        return len(self._frequencies)
+
+    def hit(self, key):
+        ''' marks the key as used '''
+        frequency = self._frequencies.get(key)
+        if frequency is None:
+            self._frequencies[key] = self._min_frequency = 1
+            self._keys[1][key] = None
+            return
+
+        self._remove_key(key, frequency)
+        if self._min_frequency not in self._keys:
+            self._min_frequency = frequency + 1
+        self._frequencies[key] = frequency + 1
+        self._keys[frequency + 1][key] = None
+
+    insert = hit
+
+    def evict(self):
+        ''' :returns: the key to evict '''
+        key = next(iter(self._keys[self._min_frequency]))
+        self.remove(key)
+        return key
+
+    def remove(self, key):
+        frequency = self._frequencies.pop(key, None)
+        if frequency is not None:
+            self._remove_key(key, frequency)
+            if self._min_frequency not in self._keys:
+                self._min_frequency = min(self._keys, default=0)
+
+    def _remove_key(self, key, frequency):
+        keys = self._keys[frequency]
+        del keys[key]
+        if not keys:
+            del self._keys[frequency]
+
+
+class ARCPolicy(object):
+    '''
+    Adaptive replacement cache (Megiddo and Modha, 2003): balances between
+    recently and frequently used keys based on the hits on recently evicted
+    keys.
+    '''
+    __slots__ = ('max_cache_size', '_target', '_recent', '_frequent',
+                 '_recent_ghosts', '_frequent_ghosts')
+
+    def __init__(self, max_cache_size=0):
+        self.max_cache_size = max_cache_size
+        # target size of the recently used keys
+        self._target = 0.
+        self._recent = OrderedDict()
+        self._frequent = OrderedDict()
+        # keys evicted from the recent and frequent lists
+        self._recent_ghosts = OrderedDict()
+        self._frequent_ghosts = OrderedDict()
+
+    def __len__(self):
+        return len(self._recent) + len(self._frequent)
+
+    def hit(self, key):
+        ''' marks a cached key as used '''
+        if key in self._frequent:
+            self._frequent.move_to_end(key)
+        elif key in self._recent:
+            del self._recent[key]
+            self._frequent[key] = None
+        else:
+            self.insert(key)
+
+    def insert(self, key):
+        ''' adds a key to the cache '''
+        recent_ghosts, frequent_ghosts = (self._recent_ghosts,
+                                          self._frequent_ghosts)
+        if key in recent_ghosts:
+            self._target = min(self.max_cache_size, self._target + max(
+                len(frequent_ghosts) / len(recent_ghosts), 1))
+            del recent_ghosts[key]
+            self._frequent[key] = None
+        elif key in frequent_ghosts:
+            self._target = max(0, self._target - max(
+                len(recent_ghosts) / len(frequent_ghosts), 1))
+            del frequent_ghosts[key]
+            self._frequent[key] = None
+        elif key in self._recent or key in self._frequent:
+            self.hit(key)
+        else:
+            self._recent[key] = None
+            if len(self._recent) + len(recent_ghosts) > self.max_cache_size \
+                    and recent_ghosts:
+                recent_ghosts.popitem(last=False)
+            if len(self) + len(recent_ghosts) + len(frequent_ghosts) > \
+                    2 * self.max_cache_size and frequent_ghosts:
+                frequent_ghosts.popitem(last=False)
+
+    def evict(self):
+        ''' :returns: the key to evict '''
+        if self._recent and (len(self._recent) > self._target or
+                             not self._frequent):
+            key = self._recent.popitem(last=False)[0]
+            self._recent_ghosts[key] = None
+        else:
+            key = self._frequent.popitem(last=False)[0]
+            self._frequent_ghosts[key] = None
+        return key
+
+    def remove(self, key):
+        for keys in (self._recent, self._frequent, self._recent_ghosts,
+                     self._frequent_ghosts):
+            keys.pop(key, None)
+
+
+EVICTION_POLICIES = {'lru': LRUPolicy, 'lfu': LFUPolicy, 'arc': ARCPolicy}
+
+# objects which do not refer to other objects
+_ATOMIC_TYPES = (str, bytes, bytearray, int, float, complex, bool, type(None))
+# shared objects which are not part of the size of the objects referring to
+# them
+_SHARED_TYPES = (type, ModuleType, FunctionType, BuiltinFunctionType,
+                 MethodType)
+
+
+def get_deep_size(obj):
+    ''' :returns: the approximate memory consumption of the object and the
+                  objects it refers to in bytes '''
+    size = 0
+    seen = set()
+    objects = [obj]
+    while objects:
+        obj = objects.pop()
+        if id(obj) in seen or isinstance(obj, _SHARED_TYPES):
+            continue
+        seen.add(id(obj))
+        size += getsizeof(obj)
+        if isinstance(obj, _ATOMIC_TYPES):
+            continue
+        elif isinstance(obj, dict):
+            objects.extend(obj.keys())
+            objects.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            objects.extend(obj)
+        else:
+            if hasattr(obj, '__dict__'):
+                objects.append(obj.__dict__)
+            for cls in type(obj).__mro__:
+                slots = cls.__dict__.get('__slots__', ())
+                for name in (slots, ) if isinstance(slots, str) else slots:
+                    if name not in ('__dict__', '__weakref__'):
+                        objects.append(getattr(obj, name, None))
+    return size
+
+
 class MemoryCache(Cache):
     '''
         @class MemoryCached
@@ -273,33 +783,69 @@ class MemoryCache(Cache):
         Caches abitrary functions based on the function's arguments (fetch) or
         on a user defined key (fetchObjectId)
     '''
-    __slots__ = ('max_cache_size', '_cacheData', '_usage')
+    __slots__ = ('max_cache_size', 'max_cache_bytes', 'sizer', '_cacheData',
+                 '_usage', '_sizes', '_bytes', '_cache_hit', '_cache_miss',
+                 '_lock', '_single_flight')
 
-    def __init__(self, max_cache_size=0, fn=None):
-        ''' initializes the Cache object '''
+    def __init__(self, max_cache_size=0, fn=None, policy='lru',
+                 max_cache_bytes=0, sizer=get_deep_size):
+        ''' initializes the Cache object
+            ::param max_cache_size: the maximum number of cached objects
+                                    (0 for an unbounded cache)
+            ::param fn: function to cache (optional)
+            ::param policy: the eviction policy ('lru', 'lfu' or 'arc')
+            ::param max_cache_bytes: the maximum size of the cached objects
+                                     in bytes (0 for an unbounded cache)
+            ::param sizer: function returning the size of an object in bytes
+        '''
         Cache.__init__(self, fn)
+        try:
+            policy_class = EVICTION_POLICIES[policy]
+        except KeyError:
+            raise ValueError('Unsupported eviction policy %r.' % policy)
         self._cacheData = {}
-        self._usage = {}
+        self._usage = policy_class(max_cache_size)
         self.max_cache_size = max_cache_size
+        self.max_cache_bytes = max_cache_bytes
+        self.sizer = sizer
+        # the sizes of the cached objects are only tracked for byte budgets
+        self._sizes = {} if max_cache_bytes else None
+        self._bytes = 0
+        self._cache_hit = 0
+        self._cache_miss = 0
+        self._lock = RLock()
+        self._single_flight = SingleFlight()
 
     def fetch(self, fetch_function, *args, **kargs):
         key = self.getKey(*args, **kargs)
         return self.fetchObjectId(key, fetch_function, *args, **kargs)
 
     def fetchObjectId(self, key, fetch_function, *args, **kargs):
-        # update the object's last usage time stamp
         key = self.getObjectId(key)
-        self._usage[key] = time()
-        try:
-            return self._cacheData[key]
-        except KeyError:
-            return self.fetch_with_fetch_function(key, fetch_function, *args, **kargs)
+        with self._lock:
+            try:
+                obj = self._cacheData[key]
+            except KeyError:
+                self._cache_miss += 1
+            else:
+                self._cache_hit += 1
+                self._usage.hit(key)
+                return obj
+        return self._single_flight.do(key, lambda: self._fetch_missing(
+            key, fetch_function, args, kargs))
+
+    def _fetch_missing(self, key, fetch_function, args, kargs):
+        ''' computes a missing object, unless another thread has stored it
+            in the meantime '''
+        with self._lock:
+            if key in self._cacheData:
+                return self._cacheData[key]
+        return self.fetch_with_fetch_function(key, fetch_function, *args, **kargs)
 
     def fetch_with_fetch_function(self, key, fetch_function, *args, **kargs):
         obj = fetch_function(*args, **kargs)
-        if obj != None:
-            self.garbage_collect_cache()
-            self._cacheData[key] = obj
+        if obj is not None:
+            self._store(key, obj)
         return obj
 
     def __contains__(self, key):
@@ -308,19 +854,96 @@ class MemoryCache(Cache):
 
     def __delitem__(self, key):
         ''' removes the given item from the cache '''
-        del self._cacheData[self.getObjectId(key)]
-
-    def garbage_collect_cache(self):
-        ''' removes the object which have not been in use for the
-            longest time '''
-        if self.max_cache_size == 0 or len(
-                self._cacheData) <= self.max_cache_size:
-            return
+        key = self.getObjectId(key)
+        with self._lock:
+            if key not in self._cacheData:
+                raise KeyError(key)
+            self._evict(key)
+            self._usage.remove(key)
 
-        (key, _) = sorted(list(self._usage.items()),
-                          key=itemgetter(1), reverse=True).pop()
-        del self._usage[key]
-        del self._cacheData[key]
+    def getCacheStatistics(self):
+        ''' returns statistics regarding the cache's hit/miss ratio and
+            size '''
+        with self._lock:
+            if self._sizes is None:
+                cached_objects = list(self._cacheData.values())
+            else:
+                cached_objects = None
+                cache_bytes = self._bytes
+        if cached_objects is not None:
+            # sizing all objects is expensive and must not block cache hits
+            cache_bytes = sum(map(self.sizer, cached_objects))
+        return {'cache_hits': self._cache_hit,
+                'cache_misses': self._cache_miss,
+                'cache_entries': len(self._cacheData),
+                'cache_bytes': cache_bytes}
+
+    def _store(self, key, obj):
+        ''' stores the object, evicting other objects if necessary
+            ::returns: whether the object has been stored '''
+        size = self.sizer(obj) if self._sizes is not None else 0
+        with self._lock:
+            if key in self._cacheData:
+                self._evict(key)
+            if size > self.max_cache_bytes > 0:
+                logger.debug('Not caching %s (%d bytes exceed the cache '
+                             'size).', key, size)
+                self._usage.remove(key)
+                return False
+
+            self.garbage_collect_cache(size)
+            self._cacheData[key] = obj
+            if size:
+                self._sizes[key] = size
+                self._bytes += size
+            self._usage.insert(key)
+            return True
+
+    def _update(self, cache_data, overwrite=False):
+        ''' adds the objects of the given dictionary to the free space of the
+            cache without evicting cached objects or changing their usage
+            ::param cache_data: a dictionary of keys and objects
+            ::param overwrite: replace the objects of keys which are already
+                               cached
+        '''
+        with self._lock:
+            for key, obj in cache_data.items():
+                cached = key in self._cacheData
+                if cached:
+                    if not overwrite or self._cacheData[key] is obj:
+                        continue
+                elif 0 < self.max_cache_size <= len(self._cacheData):
+                    continue
+                if self._sizes is not None:
+                    size = self.sizer(obj)
+                    size_delta = size - self._sizes.get(key, 0)
+                    if 0 < self.max_cache_bytes < self._bytes + size_delta:
+                        continue
+                    self._sizes[key] = size
+                    self._bytes += size_delta
+                self._cacheData[key] = obj
+                if not cached:
+                    self._usage.insert(key)
+
+    def _evict(self, key):
+        ''' removes the object selected by the eviction policy '''
+        self._cacheData.pop(key, None)
+        if self._sizes is not None:
+            self._bytes -= self._sizes.pop(key, 0)
+
+    def _is_full(self, size=0):
+        ''' returns whether a new object of the given size exceeds the
+            maximum cache size '''
+        return 0 < self.max_cache_size <= len(self._cacheData) or \
+            0 < self.max_cache_bytes < self._bytes + size
+
+    def garbage_collect_cache(self, size=0):
+        ''' evicts objects until there is room for a new object of the
+            given size '''
+        while self._cacheData and self._is_full(size):
+            # objects added to _cacheData directly are not tracked
+            self._evict(self._usage.evict() if self._usage
+                        else next(iter(self._cacheData)))
 
 
 class MemoryCached(MemoryCache):
@@ -330,15 +953,22 @@ class MemoryCached(MemoryCache):
           def myfunction(*args):            ...
     '''
 
-    def __init__(self, arg):
+    def __init__(self, arg=0, policy='lru', max_cache_bytes=0,
+                 sizer=get_deep_size):
         """initializes the MemoryCache object
             ::param arg: either the max_cache_size or the function to call
+            ::param policy: the eviction policy ('lru', 'lfu' or 'arc')
+            ::param max_cache_bytes: the maximum size of the cached objects
+                                     in bytes (0 for an unbounded cache)
+            ::param sizer: function returning the size of an object in bytes
         """
         if hasattr(arg, '__call__'):
-            MemoryCache.__init__(self)
+            MemoryCache.__init__(self, policy=policy,
+                                 max_cache_bytes=max_cache_bytes, sizer=sizer)
             self._fn = arg
         else:
-            MemoryCache.__init__(self, max_cache_size=arg)
+            MemoryCache.__init__(self, max_cache_size=arg, policy=policy,
+                                 max_cache_bytes=max_cache_bytes, sizer=sizer)
             self._fn = None
 
     def __call__(self, *args, **kargs):
@@ -356,35 +986,130 @@ class MemoryCached(MemoryCache):
 class TTLMemoryCached(MemoryCached):
     """Decorator based on Memory cache for caching function calls with
     a specified time to live, results older than which will be ignored
+
+    Expired results are purged in small batches on every access based on a
+    heap of expiry times. Optionally, expired results are returned for a
+    grace period (`stale_ttl`) while they are refreshed in the background.
     """
+    # maximum number of expired objects purged per access
+    purge_batch_size = 8
 
-    def __init__(self, ttl, max_cache_size=0):
-        MemoryCache.__init__(self, max_cache_size=max_cache_size)
+    def __init__(self, ttl, max_cache_size=0, policy='lru', stale_ttl=None,
+                 get_ttl=None, max_cache_bytes=0, sizer=get_deep_size):
+        """
+            ::param ttl: the time to live of cached results (timedelta)
+            ::param max_cache_size: the maximum number of cached objects
+                                    (0 for an unbounded cache)
+            ::param policy: the eviction policy ('lru', 'lfu' or 'arc')
+            ::param stale_ttl: optional period (timedelta) after the expiry,
+                               in which the expired result is returned while
+                               it is refreshed in a background thread
+            ::param get_ttl: optional function returning the time to live
+                             (timedelta) of the given result or None for the
+                             default ttl
+            ::param max_cache_bytes: the maximum size of the cached objects
+                                     in bytes (0 for an unbounded cache)
+            ::param sizer: function returning the size of an object in bytes
+        """
+        MemoryCache.__init__(self, max_cache_size=max_cache_size,
+                             policy=policy, max_cache_bytes=max_cache_bytes,
+                             sizer=sizer)
         self._fn = None
         self.ttl = ttl.total_seconds()
-        self._last_updated = {}
+        self.stale_ttl = stale_ttl.total_seconds() if stale_ttl else 0.
+        self.get_ttl = get_ttl
+        self._expires = {}
+        # (purge time, key) tuples; outdated tuples are skipped on purging
+        self._expiry_heap = []
+        self._refreshing = set()
 
     def fetchObjectId(self, key, fetch_function, *args, **kargs):
-        # update the object's last usage time stamp
         key = self.getObjectId(key)
-        self._usage[key] = time()
+        now = time()
+        with self._lock:
+            self._purge_expired(now, self.purge_batch_size)
+            expires = self._expires.get(key)
+            if expires is not None:
+                if now <= expires + self.stale_ttl:
+                    obj = self._cacheData[key]
+                    self._cache_hit += 1
+                    self._usage.hit(key)
+                    if now > expires:
+                        self._refresh(key, fetch_function, args, kargs)
+                    return obj
+                self._discard(key)
+            self._cache_miss += 1
+        return self._single_flight.do(key, lambda: self._fetch_missing(
+            key, fetch_function, args, kargs))
+
+    def __contains__(self, key):
+        ''' returns whether a valid result is stored in the cache '''
+        expires = self._expires.get(self.getObjectId(key))
+        return expires is not None and time() <= expires
+
+    def __delitem__(self, key):
+        with self._lock:
+            MemoryCache.__delitem__(self, key)
+            self._expires.pop(self.getObjectId(key), None)
+
+    def _store(self, key, obj):
+        ttl = self.get_ttl(obj) if self.get_ttl else None
+        expires = time() + (self.ttl if ttl is None else ttl.total_seconds())
+        with self._lock:
+            if not MemoryCache._store(self, key, obj):
+                return False
+            self._expires[key] = expires
+            heappush(self._expiry_heap, (expires + self.stale_ttl, key))
+            if len(self._expiry_heap) > 2 * len(self._expires) + 100:
+                self._expiry_heap = [(expires + self.stale_ttl, key) for
+                                     key, expires in self._expires.items()]
+                heapify(self._expiry_heap)
+            return True
+
+    def _evict(self, key):
+        MemoryCache._evict(self, key)
+        self._expires.pop(key, None)
+
+    def _discard(self, key):
+        ''' removes an expired object '''
+        self._evict(key)
+        self._usage.remove(key)
+
+    def garbage_collect_cache(self, size=0):
+        ''' purges expired objects before evicting valid ones '''
+        if self._is_full(size):
+            self._purge_expired(time())
+        MemoryCache.garbage_collect_cache(self, size)
+
+    def _purge_expired(self, now, max_objects=None):
+        ''' removes up to max_objects objects, whose purge time has passed '''
+        heap = self._expiry_heap
+        while heap and heap[0][0] < now and max_objects != 0:
+            purge_time, key = heappop(heap)
+            expires = self._expires.get(key)
+            if expires is not None and expires + self.stale_ttl == purge_time:
+                self._discard(key)
+                if max_objects:
+                    max_objects -= 1
+
+    def _refresh(self, key, fetch_function, args, kargs):
+        ''' refreshes the result in a background thread '''
+        if key not in self._refreshing:
+            self._refreshing.add(key)
+            Thread(target=self._refresh_result, daemon=True,
+                   args=(key, fetch_function, args, kargs)).start()
+
+    def _refresh_result(self, key, fetch_function, args, kargs):
         try:
-            stored_result = self._cacheData[key]
-            valid_from = self._last_updated[key]
-            if time() - valid_from <= self.ttl:
-                return self._cacheData[key]
-            else:
-                del self._usage[key]
-                del self._cacheData[key]
-                del self._last_updated[key]
-                raise KeyError
-        except KeyError:
             obj = fetch_function(*args, **kargs)
-            if obj != None:
-                self.garbage_collect_cache()
-                self._cacheData[key] = obj
-                self._last_updated[key] = time()
-            return obj
+            if obj is not None:
+                self._store(key, obj)
+        except Exception:
+            logger.warning('Cannot refresh the cached result %s.', key,
+                           exc_info=True)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
 
 
 class IterableCache(DiskCache):
@@ -450,11 +1175,17 @@ class RedisCache(Cache):
 
     def __init__(self, max_cache_size=0, fn=None, host=DEFAULT_REDIS_HOST,
                  port=DEFAULT_REDIS_PORT,
-                 db=0):
-        ''' initializes the Cache object '''
+                 db=0, lock_timeout=None):
+        ''' initializes the Cache object
+            ::param lock_timeout: optional lease (in seconds) of a Redis lock,
+                                  which prevents other processes from
+                                  computing the same result concurrently
+        '''
         Cache.__init__(self, fn)
         self._cacheData = redis.StrictRedis(host=host, port=port, db=db)
         self._usage = redis.StrictRedis(host=host, port=port, db=1)
+        self.lock_timeout = lock_timeout
+        self._single_flight = SingleFlight()
         try:
             self._cacheData.ping()
             self.max_cache_size = max_cache_size
@@ -474,12 +1205,40 @@ class RedisCache(Cache):
         try:
             return (pickle.loads(self._cacheData[key]))
         except KeyError:
-            obj = fetch_function(*args, **kargs)
-            if obj != None:
-                self.garbage_collect_cache()
-                p_obj = pickle.dumps(obj)
-                self._cacheData[key] = p_obj
-            return (obj)
+            return self._single_flight.do(key, lambda: self._fetch_missing(
+                key, fetch_function, args, kargs))
+
+    def _fetch_missing(self, key, fetch_function, args, kargs):
+        ''' computes and caches a missing object, unless another thread or
+            process (lock_timeout) has cached it in the meantime '''
+        if not self.lock_timeout:
+            return self._fetch_uncached(key, fetch_function, args, kargs)
+
+        lock = self._cacheData.lock('lock:%s' % key, timeout=self.lock_timeout,
+                                    blocking_timeout=self.lock_timeout)
+        if not lock.acquire():
+            logger.warning('Timeout waiting for the Redis lock of %s.', key)
+            return self._fetch_uncached(key, fetch_function, args, kargs)
+        try:
+            return self._fetch_uncached(key, fetch_function, args, kargs)
+        finally:
+            try:
+                lock.release()
+            except redis.exceptions.LockError:
+                logger.warning('The Redis lock of %s expired before the '
+                               'object has been computed.', key)
+
+    def _fetch_uncached(self, key, fetch_function, args, kargs):
+        p_obj = self._cacheData.get(key)
+        if p_obj is not None:
+            return pickle.loads(p_obj)
+
+        obj = fetch_function(*args, **kargs)
+        if obj != None:
+            self.garbage_collect_cache()
+            p_obj = pickle.dumps(obj)
+            self._cacheData[key] = p_obj
+        return (obj)
 
     def garbage_collect_cache(self):
         ''' removes the object which have not been in use for the
@@ -526,8 +1285,10 @@ class RedisCached(RedisCache):
 class HybridMemoryCached(MemoryCached):
 
     def __init__(self, key: str, max_cache_size: int=0,
-                 group: Optional[List]=None):
-        MemoryCache.__init__(self, max_cache_size=max_cache_size)
+                 group: Optional[List]=None, max_cache_bytes: int=0,
+                 sizer: Callable[[Any], int]=get_deep_size):
+        MemoryCache.__init__(self, max_cache_size=max_cache_size,
+                             max_cache_bytes=max_cache_bytes, sizer=sizer)
         self.key = key
         self._fn = None
         self.group: List[HybridMemoryCached] = group
@@ -539,10 +1300,14 @@ class HybridMemoryCached(MemoryCached):
             self.group.append(self)
 
     def fetch_with_fetch_function(self, key, fetch_function, *args, **kargs):
-        self._dirty.add(key)
-        return MemoryCached.fetch_with_fetch_function(self,
+        obj = MemoryCached.fetch_with_fetch_function(self,
             key, fetch_function, *args, **kargs
         )
+        # mark the key after storing the object, so that a concurrent
+        # sync_upstream does not miss it
+        with self._lock:
+            self._dirty.add(key)
+        return obj
 
     def sync_upstream(self, priority='local', bulk_write=False):
         raise NotImplementedError
@@ -562,12 +1327,15 @@ class HybridMemRedisCached(HybridMemoryCached):
 
     def __init__(self, key: str, host: str=DEFAULT_REDIS_HOST,
                  port: int=DEFAULT_REDIS_PORT, max_cache_size: int=0,
-                 group: Optional[List]=None):
+                 group: Optional[List]=None, max_cache_bytes: int=0,
+                 sizer: Callable[[Any], int]=get_deep_size):
         group = group if group is not None else REDIS_CACHE_BATCH
         HybridMemoryCached.__init__(self, max_cache_size=max_cache_size,
-                                    key=key, group=group)
+                                    key=key, group=group,
+                                    max_cache_bytes=max_cache_bytes,
+                                    sizer=sizer)
         self.redis = redis.StrictRedis(host=host, port=port)
-        self._cacheData = self.decode_cache_data()
+        self._update(self.decode_cache_data())
 
     def decode_cache_data(self):
         """load redis data, unpickle values, convert keys from bytes to str"""
@@ -600,32 +1368,28 @@ class HybridMemRedisCached(HybridMemoryCached):
         :return:
         """
         upstream_data = self.decode_cache_data()
-        if priority == 'local':
+        with self._lock:
+            self._update(upstream_data, overwrite=priority != 'local')
             upstream_data.update(self._cacheData)
-        self._cacheData.update(upstream_data)
-        upstream_data.update(self._cacheData)
+            dirty_data = {k: self._cacheData[k] for k in self._dirty
+                          if k in self._cacheData}
+            self._dirty = set()
         if bulk_write:
             self.redis.hmset(
                 self.key,
                 {k: pickle.dumps(v) for k, v in upstream_data.items()}
             )
         else:
-            for k in self._dirty:
-                try:
-                    v = self._cacheData[k]
-                    self.redis_set_value(k, v)
-                except KeyError:
-                    continue
-            self._dirty = set()
+            for k, v in dirty_data.items():
+                self.redis_set_value(k, v)
 
 
 class RealtimeRedisMemCached(HybridMemRedisCached):
 
     def fetch_with_fetch_function(self, key, fetch_function, *args, **kargs):
         obj = fetch_function(*args, **kargs)
-        if obj != None:
-            self.garbage_collect_cache()
-            self._cacheData[key] = obj
+        if obj is not None:
+            self._store(key, obj)
             self.redis_set_value(key, obj)
         return obj
 
@@ -639,20 +1403,23 @@ class HybridMemDiskCached(HybridMemoryCached):
 
     def __init__(self, key: str, max_cache_size: int=0,
                  group: Optional[List]=None,
-                 cache_dir_path: str='/opt/weblyzard/cache'):
+                 cache_dir_path: str='/opt/weblyzard/cache',
+                 max_cache_bytes: int=0,
+                 sizer: Callable[[Any], int]=get_deep_size):
         group = group if group is not None else DISK_CACHE_BATCH
         HybridMemoryCached.__init__(self, max_cache_size=max_cache_size,
-                                    key=key, group=group)
+                                    key=key, group=group,
+                                    max_cache_bytes=max_cache_bytes,
+                                    sizer=sizer)
         self.cache_dir_path = cache_dir_path
         self.cache_file_name = f'{self.cache_dir_path}/{self.key}.pkl'
         try:
             with GzipFile(f'{self.cache_file_name}') as f:
-                self._cacheData = load(f)
+                self._update(load(f))
         except Exception as e:
             logger.warn('No disk cached data found during initialization,'
                         'this is expected at first instantiation',
                         exc_info=True)
-            self._cacheData = {}
 
     def sync_upstream(self, priority: str='local',
                       bulk_write: bool=True) -> None:
@@ -673,12 +1440,11 @@ class HybridMemDiskCached(HybridMemoryCached):
         except Exception as e:
             logger.info(e, exc_info=True)
             upstream_data = {}
-        if priority == 'local':
+        with self._lock:
+            self._update(upstream_data, overwrite=priority != 'local')
             upstream_data.update(self._cacheData)
-        self._cacheData.update(upstream_data)
-        upstream_data.update(self._cacheData)
         with GzipFile(self.cache_file_name, 'w') as f:
-            pickle.dump(self._cacheData, f)
+            pickle.dump(upstream_data, f)
 
 
 def update_hybrid_cache_group(
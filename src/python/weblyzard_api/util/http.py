@@ -22,13 +22,19 @@ from future import standard_library
 from typing import Dict
 standard_library.install_aliases()
 
+import os
 import time
 import io
+import queue
+import threading
+import http.client
 import urllib.request
 
+from base64 import b64encode
 from gzip import GzipFile
-from random import randint
-from urllib.parse import urlsplit, urlunsplit
+from urllib.parse import urlsplit, urlunsplit, urljoin
+
+from weblyzard_api.util.retry import RetryPolicy
 
 # logging
 import logging
@@ -38,9 +44,22 @@ USER_AGENT = 'eWRT Version/0.1; Module %s +http://p.semanticlab.net/eWRT'
 DEFAULT_WEB_REQUEST_SLEEP_TIME = 1
 PROXY_SERVER = ''
 
-RETRY_WAIT_TIME_RANGE = (2, 10)  # in seconds
 # error codes which might trigger a retry:
 HTTP_TEMPORARY_ERROR_CODES = (500, 503, 504)
+# the number of attempts is determined by Retrieve.open's `retry` parameter
+RETRY_POLICY = RetryPolicy(base_delay=2, max_delay=10,
+                           retryable_status_codes=HTTP_TEMPORARY_ERROR_CODES,
+                           retryable_exceptions=())
+# redirects which are followed by the connection pool
+HTTP_REDIRECT_CODES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 10
+# credentials which are not forwarded to another scheme, host or port
+CREDENTIAL_HEADERS = ('authorization', 'cookie')
+DEFAULT_PORTS = {'http': http.client.HTTP_PORT,
+                 'https': http.client.HTTPS_PORT}
+
+# number of idle keep-alive connections retained per host
+DEFAULT_POOL_SIZE = 10
 
 # set default socket timeout (otherwise urllib might hang!)
 from socket import setdefaulttimeout
@@ -50,6 +69,280 @@ DEFAULT_TIMEOUT = 60
 def getHostName(x): return "://".join(urlsplit(x)[:2])
 
 
+def get_origin(url: str):
+    """ :returns: the scheme, host and port of the given url """
+    split_url = urlsplit(url)
+    return (split_url.scheme, split_url.hostname,
+            split_url.port or DEFAULT_PORTS.get(split_url.scheme))
+
+
+class GzipResponse(GzipFile):
+    """ A :class:`GzipFile` decompressing a response stream on the fly,
+        which closes the response together with itself.
+    """
+
+    def __init__(self, response):
+        GzipFile.__init__(self, fileobj=response, mode='rb')
+        self.response = response
+        self.headers = response.headers
+
+    def close(self):
+        try:
+            GzipFile.close(self)
+        finally:
+            self.response.close()
+
+
+class PooledResponse(object):
+    """ A file-like wrapper around an :class:`http.client.HTTPResponse`
+        which hands the underlying connection back to its pool, once the
+        response has been read completely.
+
+        Connections of responses that are closed before reaching the end
+        of the body are discarded, since they still carry unread data.
+    """
+
+    def __init__(self, response, connection, pool, url):
+        self._response = response
+        self._connection = connection
+        self._pool = pool
+        self.url = url
+        self.code = self.status = response.status
+        self.msg = self.reason = response.reason
+        self.headers = response.headers
+
+    def read(self, amt=None):
+        data = self._response.read(amt)
+        if self._response.isclosed():
+            self._release()
+        return data
+
+    def readline(self, limit=-1):
+        line = self._response.readline(limit)
+        if self._response.isclosed():
+            self._release()
+        return line
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def readable(self):
+        return True
+
+    def info(self):
+        return self.headers
+
+    def geturl(self):
+        return self.url
+
+    def getcode(self):
+        return self.code
+
+    def close(self):
+        """ closes the response and returns (or discards) its connection """
+        if self._connection is None:
+            return
+        if not self._response.isclosed() and self._response.length == 0:
+            self._response.read()
+        if self._response.isclosed():
+            self._release()
+        else:
+            self._response.close()
+            self._connection.close()
+            self._connection = None
+
+    @property
+    def closed(self):
+        return self._connection is None
+
+    def _release(self):
+        if self._connection is not None:
+            self._pool.release(self._connection)
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class HTTPConnectionPool(object):
+    """ A thread-safe pool of persistent (keep-alive) connections to a
+        single host.
+
+        .. remarks:
+           requests never block on the pool - if all retained connections
+           are in use a new connection is opened and discarded after use,
+           if the pool is already full.
+    """
+
+    def __init__(self, scheme: str, host: str, port: int=None,
+                 max_size: int=DEFAULT_POOL_SIZE):
+        """
+        :param scheme: 'http' or 'https'
+        :param host: the host name
+        :param port: optional port
+        :param max_size: maximum number of idle connections to retain
+        """
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.max_size = max_size
+        self._idle = queue.LifoQueue(maxsize=max_size)
+
+    def _new_connection(self, timeout):
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port,
+                                               timeout=timeout)
+        return http.client.HTTPConnection(self.host, self.port,
+                                          timeout=timeout)
+
+    def get_connection(self, timeout=DEFAULT_TIMEOUT):
+        """ :returns: a tuple (connection, reused) """
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            return self._new_connection(timeout), False
+
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection, connection.sock is not None
+
+    def release(self, connection):
+        """ returns a connection to the pool """
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def close(self):
+        """ closes all idle connections """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def urlopen(self, method: str, url: str, body=None, headers: Dict=None,
+                timeout=DEFAULT_TIMEOUT) -> PooledResponse:
+        """ Sends a request over a pooled connection.
+        :param method: the HTTP method
+        :param url: the full request url
+        :param body: optional request body (bytes)
+        :param headers: optional request headers
+        :param timeout: socket timeout for the request
+        :returns: a :class:`PooledResponse`
+        """
+        split_url = urlsplit(url)
+        selector = urlunsplit(('', '', split_url.path or '/',
+                               split_url.query, ''))
+        while True:
+            connection, reused = self.get_connection(timeout)
+            try:
+                connection.request(method, selector, body, headers or {})
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError,
+                    BrokenPipeError) as e:
+                connection.close()
+                # the server dropped an idle keep-alive connection
+                if reused:
+                    continue
+                raise urllib.error.URLError(e)
+            except OSError as e:
+                connection.close()
+                raise urllib.error.URLError(e)
+            return PooledResponse(response, connection, self, url)
+
+
+class HTTPPoolManager(object):
+    """ Maintains one :class:`HTTPConnectionPool` per scheme, host and port.
+    """
+
+    def __init__(self, pool_size: int=DEFAULT_POOL_SIZE):
+        """
+        :param pool_size: number of idle connections retained per host
+        """
+        self.pool_size = pool_size
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def connection_pool(self, url: str) -> HTTPConnectionPool:
+        """ :returns: the connection pool responsible for the given url """
+        split_url = urlsplit(url)
+        key = (split_url.scheme, split_url.hostname, split_url.port)
+        try:
+            return self._pools[key]
+        except KeyError:
+            with self._lock:
+                if key not in self._pools:
+                    self._pools[key] = HTTPConnectionPool(
+                        *key, max_size=self.pool_size)
+                return self._pools[key]
+
+    def urlopen(self, method: str, url: str, body=None, headers: Dict=None,
+                timeout=DEFAULT_TIMEOUT) -> PooledResponse:
+        """ Sends a request to the given url, following redirects and
+            translating error codes into :class:`urllib.error.HTTPError`
+            (analogous to :func:`urllib.request.urlopen`). Authorization
+            and Cookie headers are dropped on redirects to another origin.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self.connection_pool(url).urlopen(
+                method, url, body, headers, timeout)
+            location = response.headers.get('Location')
+            if response.code in HTTP_REDIRECT_CODES and location:
+                response.read()
+                response.close()
+                redirect_url = urljoin(url, location)
+                if get_origin(redirect_url) != get_origin(url):
+                    headers = {k: v for k, v in (headers or {}).items()
+                               if k.lower() not in CREDENTIAL_HEADERS}
+                url = redirect_url
+                if response.code == 303 or (response.code in (301, 302)
+                                            and method == 'POST'):
+                    method, body = ('HEAD', None) if method == 'HEAD' \
+                        else ('GET', None)
+                    headers = {k: v for k, v in (headers or {}).items()
+                               if k.lower() not in ('content-type',
+                                                    'content-length')}
+                continue
+
+            if response.code >= 400:
+                fp = io.BytesIO(response.read())
+                response.close()
+                raise urllib.error.HTTPError(url, response.code,
+                                             response.reason,
+                                             response.headers, fp)
+            return response
+
+        raise urllib.error.HTTPError(url, response.code,
+                                     'too many redirects',
+                                     response.headers, None)
+
+    def clear(self):
+        """ closes all pooled connections """
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools = {}
+
+
+# default pool manager shared by all Retrieve objects
+POOL_MANAGER = HTTPPoolManager()
+
+
+def _reset_pool_manager():
+    # pooled sockets must not be shared with forked worker processes
+    POOL_MANAGER._pools = {}
+    POOL_MANAGER._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pool_manager)
+
+
 class Retrieve(object):
     """ @class Retrieve
         retrieves URLs using HTTP
@@ -70,14 +363,32 @@ class Retrieve(object):
     """
 
     __slots__ = ('module', 'sleep_time', 'last_access_time', 'user_agent',
+                 'default_timeout', 'pool_manager', 'retry_policy', '_openers',
                  '_supported_http_authentification_methods')
 
     def __init__(self, module, sleep_time=DEFAULT_WEB_REQUEST_SLEEP_TIME,
-                 user_agent=USER_AGENT, default_timeout=DEFAULT_TIMEOUT):
+                 user_agent=USER_AGENT, default_timeout=DEFAULT_TIMEOUT,
+                 pool_manager: HTTPPoolManager=None,
+                 retry_policy: RetryPolicy=RETRY_POLICY):
+        """
+        :param module: the module name to add to the user agent
+        :param sleep_time: throttling delay between requests
+        :param user_agent: the user agent to use
+        :param default_timeout: the socket timeout
+        :param pool_manager: an optional :class:`HTTPPoolManager` for keeping
+                             connections alive (defaults to the module wide
+                             POOL_MANAGER)
+        :param retry_policy: the :class:`~weblyzard_api.util.retry.RetryPolicy`
+                             applied to temporary errors
+        """
         setdefaulttimeout(default_timeout)
         self.module = module
         self.sleep_time = sleep_time
         self.last_access_time = 0
+        self.default_timeout = default_timeout
+        self.pool_manager = pool_manager or POOL_MANAGER
+        self.retry_policy = retry_policy
+        self._openers = {}
 
         self._supported_http_authentification_methods = {
             'basic': Retrieve._getHTTPBasicAuthOpener,
@@ -97,56 +408,108 @@ class Retrieve(object):
             :param data: optional data to submit
             :param headers: a dictionary of optional headers
             :param retry: number of retries in case of an temporary error
+                        (see :attr:`retry_policy`)
             :param authentification_method: the used authentification_method
                         ('basic'*, 'digest')
             :param accept_gzip: flag to change the accepted encoding, gzip
                         or not
             :param head_only: if True: only execute a HEAD request
             :returns a file object for reading the url
+
+            .. remarks:
+               requests are sent over pooled keep-alive connections, unless
+               a proxy or digest authentification is used.
         """
-        auth_handler = self._supported_http_authentification_methods[
-            authentification_method]
-        urlObj = None
-        tries = 0
+        if authentification_method not in \
+                self._supported_http_authentification_methods:
+            raise KeyError(authentification_method)
         if isinstance(data, str):
             data = data.encode('utf-8')
-        while not urlObj:
-            request = urllib.request.Request(url, data, headers)
-
-            if head_only:
-                request.get_method = lambda: 'HEAD'
-
-            request.add_header('User-Agent', self.user_agent)
-
-            if accept_gzip:
-                request.add_header('Accept-encoding', 'gzip')
+        use_opener = PROXY_SERVER or (
+            user and pwd and authentification_method != 'basic')
 
+        def open_url():
             self._throttle()
+            if use_opener:
+                return self._open_with_opener(
+                    url, user, pwd, data, headers, authentification_method,
+                    accept_gzip, head_only)
+            return self._open_pooled(url, user, pwd, data, headers,
+                                     accept_gzip, head_only)
+
+        urlObj = self.retry_policy.replace(max_attempts=retry + 1).call(
+            open_url)
+
+        # check whether the data stream is compressed
+        if urlObj.headers.get('Content-Encoding') == 'gzip':
+            return self._getUncompressedStream(urlObj)
+        return urlObj
 
-            opener = []
-            if PROXY_SERVER:
-                opener.append(urllib.request.ProxyHandler({"http": PROXY_SERVER}))
-            if user and pwd:
-                opener.append(auth_handler(url, user, pwd))
-
-            urllib.request.install_opener(urllib.request.build_opener(*opener))
-            try:
-                urlObj = urllib.request.urlopen(request)
-            except urllib.error.HTTPError as e:
-                if e.code in HTTP_TEMPORARY_ERROR_CODES and tries < retry:
-                    sleep_time = randint(*RETRY_WAIT_TIME_RANGE)
-                    log.info(f'retrying in {sleep_time}; received {e.code}')
-                    time.sleep(sleep_time)
-                    tries += 1
-                    continue
-                else:
-                    raise e
-
-            # check whether the data stream is compressed
-            if urlObj.headers.get('Content-Encoding') == 'gzip':
-                return self._getUncompressedStream(urlObj)
+    def _open_pooled(self, url, user, pwd, data, headers, accept_gzip,
+                     head_only):
+        """ Sends the request over a pooled keep-alive connection. """
+        request_headers = {'User-Agent': self.user_agent}
+        if accept_gzip:
+            request_headers['Accept-encoding'] = 'gzip'
+        if user and pwd:
+            request_headers['Authorization'] = self._get_basic_auth_header(
+                user, pwd)
+        if data is not None and not any(
+                key.lower() == 'content-type' for key in headers):
+            request_headers['Content-Type'] = \
+                'application/x-www-form-urlencoded'
+        request_headers.update(headers)
+
+        if head_only:
+            method = 'HEAD'
+        else:
+            method = 'GET' if data is None else 'POST'
+        return self.pool_manager.urlopen(method, url, body=data,
+                                         headers=request_headers,
+                                         timeout=self.default_timeout)
+
+    def _open_with_opener(self, url, user, pwd, data, headers,
+                          authentification_method, accept_gzip, head_only):
+        """ Sends the request using urllib (required for proxies and
+            digest authentification). """
+        request = urllib.request.Request(url, data, headers)
+
+        if head_only:
+            request.get_method = lambda: 'HEAD'
+
+        request.add_header('User-Agent', self.user_agent)
+
+        if accept_gzip:
+            request.add_header('Accept-encoding', 'gzip')
+
+        return self._get_opener(url, user, pwd, authentification_method).open(
+            request, timeout=self.default_timeout)
+
+    def _get_opener(self, url, user, pwd, authentification_method):
+        """ :returns: a cached urllib opener for the given host and
+                      credentials """
+        host = getHostName(url)
+        key = (host, user, pwd, authentification_method, PROXY_SERVER)
+        try:
+            return self._openers[key]
+        except KeyError:
+            pass
+
+        handlers = []
+        if PROXY_SERVER:
+            handlers.append(urllib.request.ProxyHandler({"http": PROXY_SERVER}))
+        if user and pwd:
+            handlers.append(self._supported_http_authentification_methods[
+                authentification_method](host, user, pwd))
+        opener = urllib.request.build_opener(*handlers)
+        self._openers[key] = opener
+        return opener
 
-        return urlObj
+    @staticmethod
+    def _get_basic_auth_header(user: str, pwd: str):
+        """ :returns: the value of the HTTP basic authorization header """
+        credentials = ('%s:%s' % (user, pwd)).encode('utf-8')
+        return 'Basic %s' % b64encode(credentials).decode('ascii')
 
     @staticmethod
     def _getHTTPBasicAuthOpener(url: str, user: str, pwd: str):
@@ -177,9 +540,11 @@ class Retrieve(object):
         """ Transparently uncompress a given data stream.
         :param urlObj:
         :returns: an urlObj containing the uncompressed data
+
+        .. remarks:
+           the data is decompressed on the fly while reading from urlObj.
         """
-        compressedStream = io.BytesIO(urlObj.read())
-        return GzipFile(fileobj=compressedStream)
+        return GzipResponse(urlObj)
 
     def _throttle(self):
         """ delays web access according to the content provider's policy """
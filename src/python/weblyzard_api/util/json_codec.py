@@ -0,0 +1,220 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+JSON encoding and decoding for clients, models and parsers.
+
+The codec uses the fastest available backend - `orjson`, `ujson` or
+`simdjson` (pysimdjson), if installed - and falls back to the standard
+library's :mod:`json` module for input which the backend rejects (e.g.
+integers exceeding 64 bit or non-strict JSON).
+
+ * :func:`loads` accepts `str` and `bytes`, i.e. responses do not need to
+   be decoded prior to parsing;
+ * :func:`dumps_bytes` returns UTF-8 encoded JSON, which is the format
+   required for request bodies;
+ * objects providing a `__json__` method are serialized by the JSON
+   structure it returns.
+
+.. note::
+   orjson writes the non-finite floats NaN and (-)Infinity as `null`,
+   whereas the other backends write the (non-standard) literals `NaN` and
+   `Infinity` as :func:`json.dumps` does. Other types that the standard
+   library does not serialize (e.g. :class:`datetime.datetime` and
+   dataclasses) are rejected by all backends.
+
+usage::
+
+    from weblyzard_api.util import json_codec
+
+    body = json_codec.dumps_bytes({'documents': documents})
+    result = json_codec.loads(response.read())
+
+The backend may be chosen explicitly with :func:`set_backend` or the
+`WEBLYZARD_JSON_BACKEND` environment variable.
+'''
+import json
+import os
+
+import logging
+log = logging.getLogger(__name__)
+
+# backends in the order of preference
+PREFERRED_BACKENDS = ('orjson', 'ujson', 'simdjson', 'json')
+JSON_BACKEND_ENV = 'WEBLYZARD_JSON_BACKEND'
+
+
+def default(obj):
+    ''' serializes objects providing a `__json__` method '''
+    try:
+        to_json = obj.__class__.__json__
+    except AttributeError:
+        raise TypeError('Object of type %s is not JSON serializable'
+                        % obj.__class__.__name__) from None
+    return to_json(obj)
+
+
+class StdlibBackend(object):
+    ''' the standard library's json module '''
+
+    name = 'json'
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(default=default)
+        self._compact_encoder = json.JSONEncoder(default=default,
+                                                 separators=(',', ':'))
+
+    def loads(self, data, strict: bool=True):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data).decode('utf-8')
+        return json.loads(data, strict=strict)
+
+    def dumps(self, obj, compact: bool=False) -> str:
+        return (self._compact_encoder if compact else
+                self._encoder).encode(obj)
+
+    def dumps_bytes(self, obj, compact: bool=False) -> bytes:
+        return self.dumps(obj, compact).encode('utf-8')
+
+
+class OrjsonBackend(StdlibBackend):
+    ''' orjson - writes non-finite floats as `null` '''
+
+    name = 'orjson'
+
+    def __init__(self):
+        StdlibBackend.__init__(self)
+        import orjson
+        self._loads = orjson.loads
+        self._dumps = orjson.dumps
+        # datetimes and dataclasses are passed to `default`, which rejects
+        # them like the standard library does
+        self._option = (orjson.OPT_NON_STR_KEYS |
+                        orjson.OPT_PASSTHROUGH_DATETIME |
+                        orjson.OPT_PASSTHROUGH_DATACLASS)
+
+    def loads(self, data, strict: bool=True):
+        return self._loads(data)
+
+    def dumps_bytes(self, obj, compact: bool=False) -> bytes:
+        return self._dumps(obj, default=default, option=self._option)
+
+    def dumps(self, obj, compact: bool=False) -> str:
+        return self.dumps_bytes(obj).decode('utf-8')
+
+
+class UjsonBackend(StdlibBackend):
+
+    name = 'ujson'
+
+    def __init__(self):
+        StdlibBackend.__init__(self)
+        import ujson
+        self._loads = ujson.loads
+        self._dumps = ujson.dumps
+
+    def loads(self, data, strict: bool=True):
+        return self._loads(data)
+
+    def dumps(self, obj, compact: bool=False) -> str:
+        return self._dumps(obj, default=default, ensure_ascii=False,
+                           escape_forward_slashes=False, reject_bytes=True)
+
+    def dumps_bytes(self, obj, compact: bool=False) -> bytes:
+        return self.dumps(obj).encode('utf-8')
+
+
+class SimdjsonBackend(StdlibBackend):
+    ''' uses simdjson for decoding only '''
+
+    name = 'simdjson'
+
+    def __init__(self):
+        StdlibBackend.__init__(self)
+        import simdjson
+        self._loads = simdjson.loads
+
+    def loads(self, data, strict: bool=True):
+        return self._loads(data)
+
+
+BACKENDS = {'json': StdlibBackend,
+            'orjson': OrjsonBackend,
+            'ujson': UjsonBackend,
+            'simdjson': SimdjsonBackend}
+
+
+def get_backend(name: str=None):
+    '''
+    :param name: the backend's name or None for the fastest available one
+    :returns: the backend
+    :raises ImportError: if the requested backend is not installed
+    '''
+    if name == StdlibBackend.name:
+        return _stdlib
+    if name is not None:
+        return BACKENDS[name]()
+
+    for name in PREFERRED_BACKENDS:
+        try:
+            return get_backend(name)
+        except ImportError:
+            continue
+
+
+# fallback for input rejected by the (faster) backends
+_stdlib = StdlibBackend()
+BACKEND = get_backend(os.environ.get(JSON_BACKEND_ENV) or None)
+log.debug('Using the %s JSON backend.', BACKEND.name)
+
+
+def set_backend(name: str=None):
+    '''
+    Select the JSON backend used by the codec.
+    :param name: the backend's name or None for the fastest available one
+    '''
+    global BACKEND
+    BACKEND = get_backend(name)
+    log.debug('Using the %s JSON backend.', BACKEND.name)
+
+
+def loads(data, strict: bool=True):
+    '''
+    :param data: the JSON document (str or bytes)
+    :param strict: if False, control characters are allowed in strings
+    :returns: the decoded object
+    :raises ValueError: if the data is not valid JSON
+    '''
+    try:
+        return BACKEND.loads(data, strict)
+    except ValueError:
+        if BACKEND is _stdlib:
+            raise
+    # the standard library also accepts e.g. arbitrary large integers, NaN
+    # and (if not strict) control characters
+    return _stdlib.loads(data, strict)
+
+
+def dumps(obj, compact: bool=False) -> str:
+    '''
+    :param obj: the object to encode
+    :param compact: omit whitespace (implied by some backends)
+    :returns: the JSON representation of the object
+    :raises TypeError: if the object is not serializable
+    '''
+    try:
+        return BACKEND.dumps(obj, compact)
+    except (TypeError, OverflowError):
+        if BACKEND is _stdlib:
+            raise
+    return _stdlib.dumps(obj, compact)
+
+
+def dumps_bytes(obj, compact: bool=False) -> bytes:
+    ''' :returns: the UTF-8 encoded JSON representation of the object
+        (see :func:`dumps`) '''
+    try:
+        return BACKEND.dumps_bytes(obj, compact)
+    except (TypeError, OverflowError):
+        if BACKEND is _stdlib:
+            raise
+    return _stdlib.dumps_bytes(obj, compact)
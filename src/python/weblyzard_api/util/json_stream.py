@@ -0,0 +1,187 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+Incremental decoding of JSON arrays from file-like objects.
+
+Yields the elements of a (potentially very large) JSON array one by one,
+so that only the currently decoded element needs to be kept in memory.
+:class:`ObservedIterator` reports when such a stream has been consumed.
+'''
+import codecs
+
+from json import JSONDecoder, JSONDecodeError
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+
+class JSONArrayStream(object):
+    ''' Iterates over the elements of a JSON array read from a stream.
+
+        usage::
+
+            for document in JSONArrayStream(handle):
+                ...
+    '''
+
+    def __init__(self, stream, chunk_size=DEFAULT_CHUNK_SIZE, decoder=None):
+        '''
+        :param stream: a file-like object providing the (utf-8 encoded)
+                       JSON array
+        :param chunk_size: number of bytes to read at once
+        :param decoder: an optional :class:`json.JSONDecoder`
+        '''
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = decoder or JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, min_size):
+        ''' reads at least min_size bytes (if available) into the buffer
+        :returns: False, if the end of the stream has been reached
+        '''
+        if self._eof:
+            return False
+
+        # discard data that has already been decoded
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+
+        read = 0
+        while read < min_size:
+            chunk = self.stream.read(self.chunk_size)
+            if not chunk:
+                self._buffer += self._text_decoder.decode(b'', final=True)
+                self._eof = True
+                break
+            read += len(chunk)
+            if isinstance(chunk, str):
+                self._buffer += chunk
+            else:
+                self._buffer += self._text_decoder.decode(chunk)
+        return read > 0
+
+    def _next_char(self):
+        ''' :returns: the next non-whitespace character (without consuming
+                      it) or None at the end of the stream '''
+        while True:
+            while self._pos < len(self._buffer) and \
+                    self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill(1):
+                return None
+
+    def _decode_value(self):
+        ''' decodes the next value, reading additional data until the value
+            is complete '''
+        read_size = self.chunk_size
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self._buffer, self._pos)
+                # numbers and literals may continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return obj
+            except JSONDecodeError:
+                if self._eof:
+                    raise
+            # grow the read size to avoid re-parsing large partial values
+            self._fill(read_size)
+            read_size *= 2
+
+    def __iter__(self):
+        char = self._next_char()
+        if char is None:
+            return
+        if char != '[':
+            raise ValueError('Expected a JSON array but got %r.' % char)
+        self._pos += 1
+
+        if self._next_char() == ']':
+            return
+
+        while True:
+            if self._next_char() is None:
+                raise ValueError('Unterminated JSON array.')
+            yield self._decode_value()
+
+            char = self._next_char()
+            self._pos += 1
+            if char == ']':
+                return
+            elif char != ',':
+                raise ValueError('Expected "," or "]" but got %r.' % char)
+
+
+def iter_json_array(stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    ''' Yields the elements of the JSON array provided by the given stream.
+
+    :param stream: a file-like object
+    :param chunk_size: number of bytes to read at once
+    '''
+    try:
+        for obj in JSONArrayStream(stream, chunk_size=chunk_size):
+            yield obj
+    finally:
+        stream.close()
+
+
+class ObservedIterator(object):
+    ''' Wraps an iterator (e.g. a streamed response) and reports its outcome
+        exactly once by calling `on_close` with
+
+         * None, if the iterator has been exhausted,
+         * the exception raised by the iterator, or
+         * a :class:`GeneratorExit`, if it has been closed (or garbage
+           collected) before it was exhausted.
+    '''
+
+    __slots__ = ('iterator', 'on_close')
+
+    def __init__(self, iterator, on_close):
+        '''
+        :param iterator: the iterator to observe
+        :param on_close: the callback receiving the outcome
+        '''
+        self.iterator = iterator
+        self.on_close = on_close
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.on_close is None:
+            raise StopIteration
+        try:
+            return next(self.iterator)
+        except StopIteration:
+            self._finish(None)
+            raise
+        except Exception as e:
+            self._finish(e)
+            raise
+
+    def _finish(self, error):
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close(error)
+
+    def close(self):
+        ''' closes the underlying iterator '''
+        if self.on_close is None:
+            return
+        close = getattr(self.iterator, 'close', None)
+        try:
+            if close is not None:
+                close()
+        finally:
+            self._finish(GeneratorExit())
+
+    def __del__(self):
+        self.close()
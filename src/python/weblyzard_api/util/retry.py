@@ -0,0 +1,228 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+Retry policies shared by the web service clients.
+
+A :class:`RetryPolicy` decides whether a failed request is retried and how
+long to wait before the next attempt:
+
+ * exponential backoff with (full) jitter, so that clients which failed
+   at the same time do not retry in lockstep;
+ * an optional deadline which bounds the total time spent on a request,
+   including all retries;
+ * classification of retryable errors (HTTP status codes and exception
+   types) - e.g. a 400 response is never retried;
+ * `Retry-After` headers sent with 429 and 503 responses are honored
+   (up to `max_delay`).
+
+usage::
+
+    policy = RetryPolicy(max_attempts=5, deadline=60)
+    result = policy.call(client.request, 'status')
+
+    @policy
+    def fetch():
+        ...
+'''
+import asyncio
+import copy
+import functools
+import socket
+import time
+import urllib.error
+
+from random import uniform
+
+import logging
+log = logging.getLogger(__name__)
+
+# HTTP status codes indicating a temporary error
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+# exceptions indicating a (potentially) temporary failure
+RETRYABLE_EXCEPTIONS = (urllib.error.URLError, socket.timeout,
+                        ConnectionError)
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 0.5  # in seconds
+DEFAULT_MAX_DELAY = 20.  # in seconds
+DEFAULT_MULTIPLIER = 2.
+
+
+class RetryPolicy(object):
+    ''' An immutable retry policy which may be shared between threads. '''
+
+    __slots__ = ('max_attempts', 'base_delay', 'max_delay', 'multiplier',
+                 'jitter', 'deadline', 'retryable_status_codes',
+                 'retryable_exceptions')
+
+    def __init__(self, max_attempts: int=DEFAULT_MAX_ATTEMPTS,
+                 base_delay: float=DEFAULT_BASE_DELAY,
+                 max_delay: float=DEFAULT_MAX_DELAY,
+                 multiplier: float=DEFAULT_MULTIPLIER,
+                 jitter: bool=True,
+                 deadline: float=None,
+                 retryable_status_codes=RETRYABLE_STATUS_CODES,
+                 retryable_exceptions=RETRYABLE_EXCEPTIONS):
+        '''
+        :param max_attempts: maximum number of attempts (including the
+                             first one)
+        :param base_delay: the delay before the first retry
+        :param max_delay: the maximum delay between two attempts
+        :param multiplier: growth factor of the delay
+        :param jitter: draw the delay uniformly from [0, delay]
+        :param deadline: optional maximum number of seconds spent on all
+                         attempts
+        :param retryable_status_codes: HTTP status codes which are retried
+        :param retryable_exceptions: exception types which are retried
+                                     (HTTP errors are classified by their
+                                     status code)
+        '''
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+        self.retryable_status_codes = frozenset(retryable_status_codes)
+        self.retryable_exceptions = tuple(retryable_exceptions)
+
+    def replace(self, **kwargs) -> 'RetryPolicy':
+        ''' :returns: a copy of the policy with the given attributes
+                      replaced (None values are ignored) '''
+        policy = copy.copy(self)
+        for name, value in kwargs.items():
+            if name not in self.__slots__:
+                raise TypeError('Unknown retry policy attribute %s' % name)
+            if value is None:
+                continue
+            if name == 'retryable_status_codes':
+                value = frozenset(value)
+            elif name == 'retryable_exceptions':
+                value = tuple(value)
+            setattr(policy, name, value)
+        return policy
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(
+            '%s=%r' % (name, getattr(self, name)) for name in self.__slots__))
+
+    def is_retryable_status(self, code: int) -> bool:
+        return code in self.retryable_status_codes
+
+    def is_retryable(self, e: Exception) -> bool:
+        ''' :returns: whether the given exception warrants a retry '''
+        if isinstance(e, urllib.error.HTTPError):
+            return self.is_retryable_status(e.code)
+        return isinstance(e, self.retryable_exceptions)
+
+    def get_delay(self, attempt: int) -> float:
+        ''' :returns: the backoff delay after the given (1-based) attempt '''
+        delay = min(self.max_delay,
+                    self.base_delay * self.multiplier ** (attempt - 1))
+        return uniform(0, delay) if self.jitter else delay
+
+    def get_deadline(self) -> float:
+        ''' :returns: the absolute deadline of a request started now '''
+        return None if self.deadline is None else time.time() + self.deadline
+
+    def next_delay(self, attempt: int, deadline: float=None,
+                   error: Exception=None) -> float:
+        ''' :param attempt: the number of attempts made so far
+            :param deadline: the absolute deadline (see :meth:`get_deadline`)
+            :param error: the exception raised by the last attempt
+            :returns: the delay before the next attempt or None if the
+                      request should not be retried
+        '''
+        if attempt >= self.max_attempts:
+            return None
+        if error is not None and not self.is_retryable(error):
+            return None
+        delay = max(self.get_delay(attempt),
+                    min(self.max_delay, _get_retry_after(error)))
+        if deadline is not None and time.time() + delay >= deadline:
+            return None
+        return delay
+
+    def attempts(self):
+        ''' yields the attempt numbers (starting with 1) and sleeps between
+            the attempts - for loops which decide on retries themselves::
+
+                for attempt in policy.attempts():
+                    if try_request():
+                        break
+        '''
+        deadline = self.get_deadline()
+        attempt = 1
+        while True:
+            yield attempt
+            delay = self.next_delay(attempt, deadline)
+            if delay is None:
+                return
+            time.sleep(delay)
+            attempt += 1
+
+    def call(self, fn, *args, **kwargs):
+        ''' calls fn and retries it according to the policy
+            :returns: fn's result
+            :raises: the last exception, if no attempt succeeded
+        '''
+        deadline = self.get_deadline()
+        attempt = 1
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                delay = self.next_delay(attempt, deadline, e)
+                if delay is None:
+                    raise
+                log.info('Attempt %d of %s failed (%s); retrying in %.2fs',
+                         attempt, _get_name(fn), e, delay)
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, fn, *args, **kwargs):
+        ''' awaits the coroutine function fn and retries it according to
+            the policy '''
+        deadline = self.get_deadline()
+        attempt = 1
+        while True:
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                delay = self.next_delay(attempt, deadline, e)
+                if delay is None:
+                    raise
+                log.info('Attempt %d of %s failed (%s); retrying in %.2fs',
+                         attempt, _get_name(fn), e, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def __call__(self, fn):
+        ''' decorator which retries the decorated function '''
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                return await self.call_async(fn, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return self.call(fn, *args, **kwargs)
+        return wrapper
+
+
+def _get_name(fn):
+    return getattr(fn, '__name__', repr(fn))
+
+
+def _get_retry_after(error) -> float:
+    ''' :returns: the delay requested by a `Retry-After` header (in
+                  seconds) or 0 '''
+    headers = getattr(error, 'headers', None)
+    if not headers:
+        return 0.
+    try:
+        return max(0., float(headers.get('Retry-After') or 0))
+    except ValueError:
+        # HTTP dates are not supported
+        return 0.